@@ -0,0 +1,69 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from MODELS import model_registry, compiled_model, fast_vectorizer
+
+# Checks that the compiled scorer and fast vectorizer reproduce sklearn's output
+# on the pinned model version and times single-row scoring on both paths.
+#
+#   python -m MODELS.benchmark_compiled_model --rows 5000
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare compiled and sklearn scoring.')
+    parser.add_argument('--rows', type=int, default=5000, help='Rows of SQLiV3.csv to compare')
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per timing sample')
+    args = parser.parse_args()
+
+    version = model_registry.active_version()
+    forest = model_registry.load_artifact('random_forest_model.pkl', version)
+    logreg = model_registry.load_artifact('logistic_regression_model.pkl', version)
+    vectorizer = model_registry.load_artifact('tfidf_vectorizer.pkl', version)
+    compiled_path = model_registry.artifact_path(compiled_model.COMPILED_MODEL_NAME, version)
+    compiled_forest, compiled_logreg = compiled_model.load(compiled_path)
+    fast = fast_vectorizer.load(compiled_path)
+
+    df = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1')
+    texts = df['Sentence'].fillna('').iloc[:args.rows].tolist()
+    X = vectorizer.transform(texts)
+    X_fast = fast.transform(texts)
+    identical = (np.array_equal(X.indptr, X_fast.indptr) and np.array_equal(X.indices, X_fast.indices)
+                 and np.array_equal(X.data, X_fast.data))
+    print(f"Fast vectorizer output bit-identical over {len(texts)} rows: {identical}")
+    if not identical:
+        raise SystemExit("Fast vectorizer does not match TfidfVectorizer")
+
+    forest_diff = np.abs(forest.predict_proba(X) - compiled_forest.predict_proba(X)).max()
+    logreg_diff = np.abs(logreg.predict_proba(X) - compiled_logreg.predict_proba(X)).max()
+    print(f"Max probability difference over {X.shape[0]} rows: "
+          f"random forest {forest_diff:.3g}, logistic regression {logreg_diff:.3g}")
+    if forest_diff > 1e-9 or logreg_diff > 1e-9:
+        raise SystemExit("Compiled model does not match sklearn")
+
+    samples = ['user@example.com', 'hunter2!', "' or '1'='1", "admin' --", 'select * from users']
+    print(f"{'input':<22}{'sklearn RF':>13}{'compiled RF':>13}{'sklearn LR':>13}{'compiled LR':>13}"
+          f"{'tfidf':>13}{'fast tfidf':>13}")
+    for text in samples:
+        row = vectorizer.transform([text])
+        timings = [
+            time_per_call(lambda: forest.predict_proba(row), args.repeat),
+            time_per_call(lambda: compiled_forest.predict_row(row.indices, row.data), args.repeat),
+            time_per_call(lambda: logreg.predict_proba(row), args.repeat),
+            time_per_call(lambda: compiled_logreg.predict_row(row.indices, row.data), args.repeat),
+            time_per_call(lambda: vectorizer.transform([text]), args.repeat),
+            time_per_call(lambda: fast.transform_row(text), args.repeat),
+        ]
+        print(f"{text:<22}" + ''.join(f"{t * 1e3:>11.3f}ms" for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import multiprocessing
+import os
+
+from memory_report import process_memory
+
+# What the loaded model costs per worker. Forks --workers processes (as
+# gunicorn does), has each load the pinned model and score a few strings, and
+# reports the private memory (USS) the model added and each worker's PSS, with
+# the arrays memory-mapped and read into every worker.
+#
+#   python -m MODELS.benchmark_shared_memory --workers 4
+
+SAMPLE = ["' or 1=1 --", "admin@example.com", "x union select password from users", "Passw0rd-1"]
+
+
+def _worker(mmap, barrier, results):
+    from MODELS import compiled_model, random_forest_model
+    compiled_model.MODEL_MMAP = mmap
+    before = process_memory()
+    random_forest_model.load_model()
+    random_forest_model.score_inputs(SAMPLE)
+    after = process_memory()
+    # PSS splits shared pages between the processes mapping them, so measure with every worker alive
+    barrier.wait()
+    results.put((after['uss'] - before['uss'], process_memory()['pss']))
+    barrier.wait()
+
+
+def measure(mmap, workers):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(mmap, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-worker model memory with and without MODEL_MMAP.')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        raise SystemExit("Needs /proc/self/smaps_rollup (Linux 4.14+)")
+    # The modules are imported before forking, like the preloaded app, so only the model itself is counted
+    os.environ['MODEL_RELOAD_INTERVAL'] = '0'
+    from MODELS import random_forest_model  # noqa: F401
+
+    print(f"{args.workers} workers")
+    print(f"{'MODEL_MMAP':>10} {'model USS/worker':>17} {'PSS/worker':>11}")
+    for mmap in (False, True):
+        samples = measure(mmap, args.workers)
+        model_uss = sum(uss for uss, _ in samples) / len(samples)
+        pss = sum(pss for _, pss in samples) / len(samples)
+        print(f"{int(mmap):>10} {model_uss / (1 << 20):14.1f} MB {pss / (1 << 20):8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
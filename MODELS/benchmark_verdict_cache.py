@@ -0,0 +1,53 @@
+import argparse
+import random
+import time
+import numpy as np
+import pandas as pd
+
+from MODELS import random_forest_model, prefilter
+from MODELS.verdict_cache import VerdictCache
+
+# Replays a scanner-like stream (a few payloads repeated many times, the rest
+# drawn from SQLiV3.csv) through score_inputs with and without the verdict
+# cache, checks both give the same probabilities and reports hit rate and speed.
+#
+#   python -m MODELS.benchmark_verdict_cache --requests 20000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the verdict cache on replayed payloads.')
+    parser.add_argument('--requests', type=int, default=20000, help='Login attempts (two fields each) to replay')
+    parser.add_argument('--hot-payloads', type=int, default=200, help='Distinct payloads replayed by scanners')
+    parser.add_argument('--hot-share', type=float, default=0.8, help='Fraction of attempts using a hot payload')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sentences = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1')['Sentence'].fillna('').astype(str).tolist()
+    hot = rng.sample(sentences, args.hot_payloads)
+    stream = []
+    for _ in range(args.requests):
+        pool = hot if rng.random() < args.hot_share else sentences
+        stream.append([rng.choice(pool), rng.choice(pool)])
+
+    random_forest_model.load_model()
+    results = {}
+    for label, cache in (('no cache', None), ('verdict cache', VerdictCache(100000))):
+        random_forest_model.server.verdict_cache = cache
+        before = prefilter.tier_stats()
+        start = time.perf_counter()
+        results[label] = np.array([random_forest_model.score_inputs(fields) for fields in stream])
+        elapsed = time.perf_counter() - start
+        after = prefilter.tier_stats()
+        tiers = ', '.join(f'{tier} {after[tier] - before[tier]}' for tier in after)
+        print(f"{label:14s} {elapsed / len(stream) * 1e6:8.1f}us per attempt  ({tiers})")
+        if cache is not None:
+            print(f"{'':14s} {cache.stats}")
+
+    if not np.array_equal(results['no cache'], results['verdict cache']):
+        raise SystemExit("Cached probabilities differ from the model's")
+    print("Cached and uncached probabilities are identical")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from MODELS import model_registry
+from MODELS.train_model import peak_rss_mb
+
+# Offline scoring of captured form submissions and WAF logs. Records are read
+# from CSV or JSONL as a stream, grouped into batches, and each batch is
+# scored in a worker process that loads the pinned model once. Verdicts are
+# written in input order as soon as each batch finishes, and at most a few
+# batches per worker are in flight, so memory stays flat however large the
+# input is.
+#
+#   python -m MODELS.bulk_scan submissions.jsonl --output verdicts.jsonl
+#   python -m MODELS.bulk_scan waf.csv --fields uri,body --id-field request_id --output verdicts.csv
+#   zcat waf.jsonl.gz | python -m MODELS.bulk_scan - --format jsonl > verdicts.jsonl
+
+_model = None
+
+
+def _init_worker(version):
+    global _model
+    # Every worker scores with the version the scan started with. MODEL_VERSION is read on each
+    # load, but the parent may already have imported the model module (and its reload interval)
+    os.environ['MODEL_VERSION'] = version
+    from MODELS import random_forest_model
+    random_forest_model.server.reload_interval = 0
+    random_forest_model.load_model()
+    _model = random_forest_model
+
+
+def _score_batch(texts):
+    return _model.score_inputs(texts)
+
+
+class BadRows:
+    """Counts input rows skipped by reason, keeping the first few line numbers of each."""
+
+    def __init__(self, examples=5):
+        self.examples = examples
+        self.counts = collections.Counter()
+        self.lines = collections.defaultdict(list)
+
+    def add(self, reason, line_number):
+        self.counts[reason] += 1
+        if len(self.lines[reason]) < self.examples:
+            self.lines[reason].append(line_number)
+
+    def report(self):
+        return '; '.join(f"{count} {reason} (lines {', '.join(map(str, self.lines[reason]))}"
+                         f"{', ...' if count > len(self.lines[reason]) else ''})"
+                         for reason, count in self.counts.most_common())
+
+
+def read_records(stream, fmt, fields, bad_rows):
+    """Yield the records that have every field to score; the rest are counted in `bad_rows`."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = [field for field in fields if field not in (reader.fieldnames or [])]
+        if missing:
+            raise SystemExit(f"CSV header has no column {', '.join(missing)}")
+        for record in reader:
+            # Short rows leave trailing columns as None
+            if any(record.get(field) is None for field in fields):
+                bad_rows.add('missing field', reader.line_num)
+                continue
+            yield record
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            bad_rows.add('invalid JSON', line_number)
+            continue
+        if not isinstance(record, dict):
+            bad_rows.add('not an object', line_number)
+            continue
+        if any(field not in record for field in fields):
+            bad_rows.add('missing field', line_number)
+            continue
+        yield record
+
+
+def batches(records, fields, batch_size):
+    """Yield (records, texts): `texts` holds each record's fields, len(fields) per record."""
+    batch, texts = [], []
+    for record in records:
+        batch.append(record)
+        for field in fields:
+            value = record.get(field)
+            texts.append('' if value is None else str(value))
+        if len(batch) >= batch_size:
+            yield batch, texts
+            batch, texts = [], []
+    if batch:
+        yield batch, texts
+
+
+class VerdictWriter:
+    def __init__(self, stream, fmt, id_field, fields):
+        self.stream = stream
+        self.id_field = id_field
+        self.fields = fields
+        self.count = 0
+        self.verdicts = collections.Counter()
+        self.csv = None
+        if fmt == 'csv':
+            columns = ['record'] + ([id_field] if id_field else []) + ['verdict', 'probability', 'field']
+            self.csv = csv.DictWriter(stream, columns)
+            self.csv.writeheader()
+
+    def write(self, records, probabilities, verdict_for):
+        per_record = np.asarray(probabilities).reshape(len(records), len(self.fields))
+        worst = per_record.argmax(axis=1)
+        for record, row, index in zip(records, per_record, worst):
+            self.count += 1
+            probability = float(row[index])
+            verdict = verdict_for(probability)
+            self.verdicts[verdict] += 1
+            result = {'record': self.count}
+            if self.id_field:
+                result[self.id_field] = record.get(self.id_field)
+            result.update(verdict=verdict, probability=round(probability, 6), field=self.fields[index])
+            if self.csv:
+                self.csv.writerow(result)
+            else:
+                self.stream.write(json.dumps(result) + '\n')
+        self.stream.flush()
+
+
+def scan(records, writer, fields, batch_size, workers, version, progress_interval=5.0):
+    from MODELS.random_forest_model import verdict
+
+    started = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - started
+        rss = peak_rss_mb()
+        line = (f"{'Scanned' if final else '  scanned'} {writer.count} records in {elapsed:.1f}s "
+                f"({writer.count / elapsed if elapsed else 0:.0f} records/s), peak RSS {f'{rss:.0f} MB' if rss else 'n/a'}")
+        if final and workers > 0 and rss:
+            # Worker usage is only known once the pool has shut down
+            line += f", largest worker {peak_rss_mb(children=True):.0f} MB"
+        print(line, file=sys.stderr)
+
+    if workers <= 0:
+        _init_worker(version)
+        for batch, texts in batches(records, fields, batch_size):
+            writer.write(batch, _score_batch(texts), verdict)
+            if time.perf_counter() - last_report >= progress_interval:
+                report()
+                last_report = time.perf_counter()
+        report(final=True)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(version,)) as pool:
+        # Batches are submitted in order and written in order; a bounded queue keeps memory flat
+        pending = collections.deque()
+        for batch, texts in batches(records, fields, batch_size):
+            pending.append((batch, pool.submit(_score_batch, texts)))
+            while len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                writer.write(done, future.result(), verdict)
+            if time.perf_counter() - last_report >= progress_interval:
+                report()
+                last_report = time.perf_counter()
+        while pending:
+            done, future = pending.popleft()
+            writer.write(done, future.result(), verdict)
+    report(final=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score captured login submissions or WAF logs for SQL injection.')
+    parser.add_argument('input', help='CSV or JSONL file, or - for stdin')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+    parser.add_argument('--fields', default='email,password', help='Comma-separated fields to score in each record')
+    parser.add_argument('--id-field', help='Field copied into the output to identify each record')
+    parser.add_argument('--output', help='Verdicts file, .csv or .jsonl (default: JSONL on stdout)')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Records scored per worker call')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Scoring processes (0 = in this process)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    version = model_registry.active_version()
+    if version is None:
+        raise SystemExit("No model version promoted; run `python -m MODELS.train_model --promote` first")
+    print(f"Scanning {args.input} with model version {version}, {args.workers} workers", file=sys.stderr)
+
+    bad_rows = BadRows()
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8', errors='replace')
+    out_fmt = 'csv' if args.output and args.output.lower().endswith('.csv') else 'jsonl'
+    sink = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = VerdictWriter(sink, out_fmt, args.id_field, fields)
+        scan(read_records(source, fmt, fields, bad_rows), writer, fields, args.batch_size, args.workers, version)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(', '.join(f'{verdict}: {count}' for verdict, count in sorted(writer.verdicts.items())), file=sys.stderr)
+    if bad_rows.counts:
+        print(f"Skipped {sum(bad_rows.counts.values())} rows: {bad_rows.report()}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import io
+import os
+import struct
+import zipfile
+import numpy as np
+
+# Compact NumPy representation of the fitted models for request-time scoring
+# without sklearn.
+#
+# TF-IDF rows are very sparse and every tree split has a non-negative
+# threshold, so an absent feature (value 0) always goes left. Each tree is
+# therefore cut into "chains": start at the root (or at any right child) and
+# keep following left children down to a leaf. Scoring a row only has to find,
+# on each chain it enters, the first split whose feature is present in the row
+# with a value above its threshold, and jump to the chain starting at that
+# split's right child. That is a handful of dict lookups per tree instead of a
+# walk down several hundred nodes.
+
+COMPILED_MODEL_NAME = 'compiled_model.npz'
+# Written by MODELS.online_learning next to the compiled model
+ONLINE_MODEL_NAME = 'online_model.npz'
+
+# Map arrays straight from the artifact file so every worker shares the same
+# read-only pages through the OS page cache; MODEL_MMAP=0 reads private copies
+MODEL_MMAP = os.getenv('MODEL_MMAP', '1') != '0'
+
+
+def _split_into_chains(tree, chain_offset):
+    children_left = tree.children_left
+    children_right = tree.children_right
+    node_count = tree.node_count
+
+    chain_of = np.empty(node_count, dtype=np.int64)
+    position = np.empty(node_count, dtype=np.int64)
+    chain_leaf = []
+    heads = [0]
+    while heads:
+        node = heads.pop()
+        chain = chain_offset + len(chain_leaf)
+        pos = 0
+        while children_left[node] != -1:
+            chain_of[node] = chain
+            position[node] = pos
+            heads.append(children_right[node])
+            node = children_left[node]
+            pos += 1
+        chain_of[node] = chain
+        position[node] = pos
+        chain_leaf.append(node)
+    return chain_of, position, np.array(chain_leaf, dtype=np.int64)
+
+
+def export_forest(model):
+    """Flatten a fitted RandomForestClassifier into chain-indexed arrays."""
+    features, thresholds, chains, positions, next_chains = [], [], [], [], []
+    chain_values = []
+    root_chains = []
+    chain_count = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        internal = tree.children_left != -1
+        if (tree.threshold[internal] < 0).any():
+            raise ValueError("Forest has negative split thresholds; inputs must be non-negative TF-IDF features")
+
+        chain_of, position, chain_leaf = _split_into_chains(tree, chain_count)
+        leaf_counts = tree.value[chain_leaf, 0, :]
+        chain_values.append(leaf_counts[:, 1] / leaf_counts.sum(axis=1))
+        root_chains.append(chain_of[0])
+
+        features.append(tree.feature[internal])
+        thresholds.append(tree.threshold[internal])
+        chains.append(chain_of[internal])
+        positions.append(position[internal])
+        next_chains.append(chain_of[tree.children_right[internal]])
+        chain_count += len(chain_leaf)
+
+    features = np.concatenate(features)
+    order = np.argsort(features, kind='stable')
+    feature_ptr = np.searchsorted(features[order], np.arange(model.n_features_in_ + 1))
+
+    return {
+        'forest_feature_ptr': feature_ptr.astype(np.int64),
+        'forest_threshold': np.concatenate(thresholds)[order],
+        'forest_chain': np.concatenate(chains)[order].astype(np.int32),
+        'forest_position': np.concatenate(positions)[order].astype(np.int32),
+        'forest_next_chain': np.concatenate(next_chains)[order].astype(np.int32),
+        'forest_chain_value': np.concatenate(chain_values),
+        'forest_root_chain': np.array(root_chains, dtype=np.int32),
+    }
+
+
+def export_logistic(model):
+    """Flatten a fitted binary LogisticRegression into a weight vector."""
+    return {
+        'logistic_coef': model.coef_[0].astype(np.float64),
+        'logistic_intercept': np.array([model.intercept_[0]], dtype=np.float64),
+    }
+
+
+def load_arrays(path, mmap=None):
+    """
+    Arrays of an .npz file by name.
+
+    np.savez stores members uncompressed, so each array's data sits at a fixed
+    offset in the file and can be memory-mapped read-only instead of copied
+    into this process. Compressed or object members are read normally.
+    """
+    if not (MODEL_MMAP if mmap is None else mmap):
+        with np.load(path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # The member's data follows its local header, whose name and extra fields vary in length
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject or not shape:
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[name] = np.lib.format.read_array(f)
+                continue
+            mapped = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                               order='F' if fortran_order else 'C')
+            # A plain ndarray over the mapping; slicing np.memmap objects is markedly slower
+            arrays[name] = mapped.view(np.ndarray)
+    return arrays
+
+
+def dumps(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+class CompiledForest:
+    def __init__(self, arrays):
+        self.feature_ptr = arrays['forest_feature_ptr'].tolist()
+        self.threshold = arrays['forest_threshold']
+        self.chain = arrays['forest_chain']
+        self.position = arrays['forest_position']
+        self.next_chain = arrays['forest_next_chain']
+        # Stays a (memory-mapped) array: it has an entry per chain, too many to copy into every worker
+        self.chain_value = arrays['forest_chain_value']
+        self.root_chain = arrays['forest_root_chain'].tolist()
+        self.n_features = len(self.feature_ptr) - 1
+
+    def predict_row(self, indices, values):
+        """Malicious probability of one sparse row given as (indices, values)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        values = np.asarray(values, dtype=np.float32).astype(np.float64)
+        feature_ptr = self.feature_ptr
+        hit_chain, hit_position, hit_next = [], [], []
+        for feature, value in zip(indices, values):
+            start, end = feature_ptr[feature], feature_ptr[feature + 1]
+            taken = self.threshold[start:end] < value
+            if taken.any():
+                hit_chain.append(self.chain[start:end][taken])
+                hit_position.append(self.position[start:end][taken])
+                hit_next.append(self.next_chain[start:end][taken])
+
+        jumps = {}
+        if hit_chain:
+            hit_chain = np.concatenate(hit_chain)
+            hit_next = np.concatenate(hit_next)
+            # Write the deepest splits first so the one nearest the chain head wins
+            order = np.argsort(np.concatenate(hit_position))[::-1]
+            jumps = dict(zip(hit_chain[order].tolist(), hit_next[order].tolist()))
+
+        leaves = []
+        for chain in self.root_chain:
+            while chain in jumps:
+                chain = jumps[chain]
+            leaves.append(chain)
+        # Summed one by one in tree order, as sklearn averages the trees
+        total = 0.0
+        for value in self.chain_value[leaves].tolist():
+            total += value
+        return total / len(self.root_chain)
+
+    def predict_proba(self, X):
+        """Class probabilities for each row of a CSR matrix, shaped like sklearn's."""
+        indptr, indices, data = X.indptr, X.indices, X.data
+        malicious = np.array([
+            self.predict_row(indices[indptr[i]:indptr[i + 1]], data[indptr[i]:indptr[i + 1]])
+            for i in range(X.shape[0])
+        ])
+        return np.column_stack((1.0 - malicious, malicious))
+
+
+class CompiledLogistic:
+    def __init__(self, arrays):
+        self.coef = arrays['logistic_coef']
+        self.intercept = float(arrays['logistic_intercept'][0])
+
+    def predict_row(self, indices, values):
+        z = float(np.dot(values, self.coef[indices])) + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def predict_proba(self, X):
+        z = X @ self.coef + self.intercept
+        malicious = 1.0 / (1.0 + np.exp(-z))
+        return np.column_stack((1.0 - malicious, malicious))
+
+
+class CompiledOnline(CompiledLogistic):
+    """Linear model updated from labelled login attempts, blended into the base model's probability."""
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.weight = float(arrays['online_weight'])
+
+    def blend(self, probabilities, online_probabilities):
+        return (1.0 - self.weight) * probabilities + self.weight * online_probabilities
+
+
+def load_online(path):
+    return CompiledOnline(load_arrays(path))
+
+
+def load(path):
+    arrays = load_arrays(path)
+    forest = CompiledForest(arrays) if 'forest_root_chain' in arrays else None
+    logistic = CompiledLogistic(arrays) if 'logistic_coef' in arrays else None
+    return forest, logistic
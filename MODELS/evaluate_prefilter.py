@@ -0,0 +1,87 @@
+import argparse
+import time
+import numpy as np
+
+from MODELS import model_registry, compiled_model, fast_vectorizer, prefilter
+from MODELS.train_model import load_dataset, test_mask, DATASET_PATH
+
+# Offline check that the prefilter tier does not clear inputs the model alone
+# would have caught. Runs the pinned model over SQLiV3.csv with and without
+# the prefilter and compares recall and tier usage on the 20% train_model.py
+# holds out. Keywords (pinned or rebuilt here) only ever come from the other
+# 80%, where the escalation step guarantees no loss by construction, so the
+# held-out rows are the ones that show whether the prefilter generalises.
+#
+#   python -m MODELS.evaluate_prefilter
+#   python -m MODELS.evaluate_prefilter --min-count 2 --min-ratio 0.5   # try other keyword settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the prefilter cascade against the model alone.')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--min-count', type=int, help='Rebuild keywords with this min malicious count')
+    parser.add_argument('--min-ratio', type=float, help='Rebuild keywords with this min malicious ratio')
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--model', choices=['random_forest', 'logistic_regression'], default='random_forest')
+    parser.add_argument('--max-recall-loss', type=float, default=0.0,
+                        help='Held-out recall the cascade may lose against the model alone')
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.dataset)
+    sentences = X.tolist()
+    labels = y.to_numpy()
+    # The same split train_model.py uses, so the pinned models never saw the held-out rows
+    is_test = test_mask(len(sentences))
+
+    version = model_registry.active_version()
+    compiled_path = model_registry.artifact_path(compiled_model.COMPILED_MODEL_NAME, version)
+    forest, logistic = compiled_model.load(compiled_path)
+    model = forest if args.model == 'random_forest' else logistic
+    vectorizer = fast_vectorizer.load(compiled_path)
+
+    start = time.perf_counter()
+    model_probs = np.array([model.predict_row(*vectorizer.transform_row(text)) for text in sentences])
+    model_time = time.perf_counter() - start
+
+    if args.min_count is not None or args.min_ratio is not None:
+        train_rows = np.flatnonzero(~is_test)
+        keywords = prefilter.build_keywords(
+            [sentences[i] for i in train_rows], labels[train_rows], args.min_count or 1, args.min_ratio or 0.0,
+            model_probs[train_rows])
+        tier = prefilter.Prefilter(prefilter.export_prefilter(keywords, args.max_length))
+    else:
+        tier = prefilter.load(compiled_path)
+        if tier is None:
+            raise SystemExit("Pinned model version has no prefilter; pass --min-count/--min-ratio")
+    print(f"Prefilter keywords: {len(tier.keywords)}")
+
+    start = time.perf_counter()
+    cleared = np.array([tier.is_benign(text) for text in sentences])
+    prefilter_time = time.perf_counter() - start
+
+    # The login flow treats a field as malicious at or above this probability
+    threshold = 0.7
+    model_flags = model_probs >= threshold
+    cascade_flags = model_flags & ~cleared
+    positives = labels == 1
+
+    recall = {}
+    for split, rows in (('train', ~is_test), ('held-out', is_test)):
+        split_positives = positives & rows
+        recall[split] = ((model_flags & split_positives).sum() / split_positives.sum(),
+                         (cascade_flags & split_positives).sum() / split_positives.sum())
+        print(f"{split}: rows {rows.sum()}  malicious {split_positives.sum()}  "
+              f"cleared {(cleared & rows).sum()} ({cleared[rows].mean():.1%})  "
+              f"cleared malicious {(cleared & split_positives).sum()}  "
+              f"cleared but model flags {(cleared & model_flags & rows).sum()}")
+        print(f"{split}: recall  model only {recall[split][0]:.4f}  cascade {recall[split][1]:.4f}")
+    print(f"Time per row  prefilter: {prefilter_time / len(sentences) * 1e6:.1f}us  "
+          f"model: {model_time / len(sentences) * 1e6:.1f}us")
+
+    model_recall, cascade_recall = recall['held-out']
+    if model_recall - cascade_recall > args.max_recall_loss:
+        raise SystemExit(f"Prefilter loses {model_recall - cascade_recall:.4f} held-out recall")
+
+
+if __name__ == '__main__':
+    main()
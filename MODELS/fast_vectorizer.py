@@ -0,0 +1,87 @@
+import math
+import re
+import numpy as np
+import scipy.sparse as sp
+
+# Drop-in replacement for the fitted TfidfVectorizer.transform on the login
+# hot path. The vocabulary and IDF weights are folded into one dict lookup per
+# token, and each string is turned straight into sorted (indices, values) with
+# the same arithmetic sklearn uses, so the output is bit-identical.
+
+
+def export_vectorizer(vectorizer):
+    """Flatten a fitted TfidfVectorizer into arrays for FastVectorizer."""
+    unsupported = {
+        'analyzer': vectorizer.analyzer != 'word',
+        'ngram_range': tuple(vectorizer.ngram_range) != (1, 1),
+        'lowercase': not vectorizer.lowercase,
+        'strip_accents': vectorizer.strip_accents is not None,
+        'preprocessor': vectorizer.preprocessor is not None,
+        'tokenizer': vectorizer.tokenizer is not None,
+        'stop_words': vectorizer.stop_words is not None,
+        'binary': vectorizer.binary,
+        'norm': vectorizer.norm != 'l2',
+        'use_idf': not vectorizer.use_idf,
+        'sublinear_tf': vectorizer.sublinear_tf,
+    }
+    bad = [name for name, flag in unsupported.items() if flag]
+    if bad:
+        raise ValueError(f"FastVectorizer does not support these TfidfVectorizer settings: {', '.join(bad)}")
+
+    return {
+        'vectorizer_terms': np.asarray(vectorizer.get_feature_names_out(), dtype=str),
+        'vectorizer_idf': np.asarray(vectorizer.idf_, dtype=np.float64),
+        'vectorizer_token_pattern': np.asarray(vectorizer.token_pattern, dtype=str),
+    }
+
+
+class FastVectorizer:
+    def __init__(self, arrays):
+        terms = arrays['vectorizer_terms'].tolist()
+        idf = arrays['vectorizer_idf'].tolist()
+        self.n_features = len(terms)
+        self.scanner = re.compile(str(arrays['vectorizer_token_pattern']))
+        # term -> (column, idf) in a single lookup
+        self.table = {term: (index, idf[index]) for index, term in enumerate(terms)}
+
+    def transform_row(self, text):
+        """Return the L2-normalized TF-IDF row of `text` as (indices, values)."""
+        table = self.table
+        counts = {}
+        for token in self.scanner.findall(text.lower()):
+            entry = table.get(token)
+            if entry is not None:
+                counts[entry] = counts.get(entry, 0) + 1
+        if not counts:
+            return [], []
+
+        entries = sorted(counts)
+        indices = [index for index, _ in entries]
+        values = [float(counts[entry]) * entry[1] for entry in entries]
+        sum_squares = 0.0
+        for value in values:
+            sum_squares += value * value
+        norm = math.sqrt(sum_squares)
+        return indices, [value / norm for value in values]
+
+    def transform(self, texts):
+        """CSR matrix of the given strings, matching TfidfVectorizer.transform."""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            row_indices, row_values = self.transform_row(text)
+            indices.extend(row_indices)
+            data.extend(row_values)
+            indptr.append(len(indices))
+        return sp.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+            shape=(len(texts), self.n_features),
+        )
+
+
+def load(path):
+    with np.load(path) as npz:
+        if 'vectorizer_terms' not in npz.files:
+            return None
+        return FastVectorizer({name: npz[name] for name in npz.files if name.startswith('vectorizer_')})
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalesce scoring calls from concurrent requests into one model call.
+
+    Callers submit a list of strings and block until their slice of the
+    result is ready. A background thread gathers submissions until either
+    `max_batch` strings are queued or the oldest submission has waited
+    `max_wait` seconds, then runs `score_fn` once over all of them.
+    """
+
+    def __init__(self, score_fn, max_batch=64, max_wait=0.002):
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []
+        self._pending_size = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        with self._cond:
+            self._pending.append((texts, future, time.monotonic()))
+            self._pending_size += len(texts)
+            self._cond.notify()
+        return future
+
+    def score(self, texts):
+        return self.submit(texts).result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.max_wait
+            while self._pending_size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending
+            self._pending = []
+            self._pending_size = 0
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            texts = [text for item_texts, _, _ in batch for text in item_texts]
+            try:
+                probabilities = self.score_fn(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for item_texts, future, _ in batch:
+                future.set_result(probabilities[offset:offset + len(item_texts)])
+                offset += len(item_texts)
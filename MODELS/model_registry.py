@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+# Versioned model artifacts live under MODELS/artifacts/<version>/ and the
+# version served by the app is pinned in MODELS/artifacts/CURRENT.
+# The MODEL_VERSION environment variable overrides the pinned version.
+REGISTRY_DIR = os.path.join('MODELS', 'artifacts')
+CURRENT_FILE = os.path.join(REGISTRY_DIR, 'CURRENT')
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def version_dir(version):
+    return os.path.join(REGISTRY_DIR, version)
+
+
+def list_versions():
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    versions = []
+    for name in os.listdir(REGISTRY_DIR):
+        if os.path.isfile(os.path.join(REGISTRY_DIR, name, MANIFEST_NAME)):
+            versions.append(name)
+    return sorted(versions, key=lambda v: read_manifest(v).get('created_at', ''))
+
+
+def read_manifest(version):
+    with open(os.path.join(version_dir(version), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def publish(artifacts, manifest):
+    """
+    Write a new model version to the registry.
+
+    `artifacts` maps file names to raw bytes. The version id is derived from
+    the artifact contents, so publishing identical artifacts twice is a no-op.
+    The version directory is staged under a temporary name and renamed into
+    place, so readers never see a half-written version.
+    """
+    hashes = {name: hashlib.sha256(data).hexdigest() for name, data in artifacts.items()}
+    version = hashlib.sha256(
+        ''.join(f'{name}:{hashes[name]}\n' for name in sorted(hashes)).encode()
+    ).hexdigest()[:12]
+
+    target = version_dir(version)
+    if os.path.isdir(target):
+        print(f"Model version {version} already published")
+        return version
+
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=REGISTRY_DIR)
+    try:
+        for name, data in artifacts.items():
+            with open(os.path.join(staging, name), 'wb') as f:
+                f.write(data)
+        manifest = dict(manifest)
+        manifest['version'] = version
+        manifest['created_at'] = datetime.now(timezone.utc).isoformat()
+        manifest['artifacts'] = hashes
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        # mkdtemp creates the directory 0700; the app may run as another user than training
+        for name in os.listdir(staging):
+            os.chmod(os.path.join(staging, name), 0o644)
+        os.chmod(staging, 0o755)
+        os.rename(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    print(f"Published model version {version}")
+    return version
+
+
+def promote(version):
+    """Atomically pin `version` as the one served by the app."""
+    if not os.path.isfile(os.path.join(version_dir(version), MANIFEST_NAME)):
+        raise ValueError(f"Unknown model version: {version}")
+    fd, tmp_path = tempfile.mkstemp(prefix='.CURRENT-', dir=REGISTRY_DIR)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.chmod(tmp_path, 0o644)  # mkstemp creates it 0600
+    os.replace(tmp_path, CURRENT_FILE)
+    print(f"Promoted model version {version}")
+
+
+def active_version():
+    """Return the pinned model version, or None if nothing has been promoted."""
+    version = os.getenv('MODEL_VERSION')
+    if version:
+        return version
+    try:
+        with open(CURRENT_FILE) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def artifact_path(name, version=None):
+    version = version or active_version()
+    if version is None:
+        # Fall back to the flat pickles written by older training runs
+        path = os.path.join('MODELS', name)
+        if os.path.exists(path):
+            return path
+        raise FileNotFoundError(
+            f"No model version promoted and no legacy {path}; "
+            "run `python -m MODELS.train_model --promote` first"
+        )
+    return os.path.join(version_dir(version), name)
+
+
+def has_artifact(name, version=None):
+    try:
+        return os.path.exists(artifact_path(name, version))
+    except FileNotFoundError:
+        return False
+
+
+def read_artifacts(version):
+    """Raw bytes of every artifact in a published version, for deriving a new one from it."""
+    artifacts = {}
+    for name in read_manifest(version)['artifacts']:
+        with open(os.path.join(version_dir(version), name), 'rb') as f:
+            artifacts[name] = f.read()
+    return artifacts
+
+
+def load_artifact(name, version=None):
+    with open(artifact_path(name, version), 'rb') as f:
+        return pickle.load(f)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect and promote model versions.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='List published versions')
+    promote_parser = subparsers.add_parser('promote', help='Pin a published version')
+    promote_parser.add_argument('version')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        current = active_version()
+        for version in list_versions():
+            manifest = read_manifest(version)
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}  {manifest['created_at']}  features={manifest.get('feature_count')}")
+    else:
+        promote(args.version)
@@ -0,0 +1,219 @@
+import collections
+import os
+import threading
+import time
+import numpy as np
+
+from MODELS import model_registry, compiled_model, fast_vectorizer, prefilter
+from MODELS.micro_batcher import MicroBatcher
+from MODELS.verdict_cache import VerdictCache
+from timing import span
+
+# Serving side shared by random_forest_model and logistic_regression_model,
+# which differ only in the artifact they score with. The model and vectorizer
+# are loaded lazily from the pinned registry version on first use, so
+# importing this module never touches the disk.
+
+vectorizer_name = 'tfidf_vectorizer.pkl'
+
+malicious_threshold = 0.7
+suspicious_threshold = 0.3
+
+# Login velocity at this fraction of the rate limit marks an attempt suspicious
+velocity_suspicious_pressure = 0.5
+
+# Set MODEL_BATCH_WAIT_MS > 0 to coalesce concurrent logins into one model call
+batch_wait_ms = float(os.getenv('MODEL_BATCH_WAIT_MS', '0'))
+batch_max_size = int(os.getenv('MODEL_BATCH_MAX_SIZE', '64'))
+
+# Set PREFILTER_ENABLED=0 to send every string to the model
+prefilter_enabled = os.getenv('PREFILTER_ENABLED', '1') != '0'
+
+# Model probabilities for repeated payloads; VERDICT_CACHE_SIZE=0 disables the cache
+verdict_cache_size = int(os.getenv('VERDICT_CACHE_SIZE', '100000'))
+
+# Workers re-read the pinned version this often and swap in a newly promoted one; 0 disables
+reload_interval = float(os.getenv('MODEL_RELOAD_INTERVAL', '30'))
+
+# Everything a request scores with, swapped as one object on reload so a request
+# never mixes the prefilter or case folding of one version with the model of another
+LoadedModel = collections.namedtuple('LoadedModel', 'model vectorizer online model_key prefilter fold_case')
+
+
+class ModelServer:
+    """
+    One served model: `model_name` is its pickle in the registry and
+    `compiled_index` its position in compiled_model.load()'s result.
+    """
+
+    def __init__(self, model_name, compiled_index):
+        self.model_name = model_name
+        self.compiled_index = compiled_index
+        self.reload_interval = reload_interval
+        self.verdict_cache = VerdictCache(verdict_cache_size) if verdict_cache_size > 0 else None
+        self._load_lock = threading.Lock()
+        self._loaded = None
+        self._loaded_version = None
+        self._checked_at = 0.0
+        self._batcher = None
+
+    def _install(self):
+        version = model_registry.active_version()
+        model = vectorizer = new_prefilter = None
+        if model_registry.has_artifact(compiled_model.COMPILED_MODEL_NAME, version):
+            # Prefer the flattened arrays; they score without sklearn
+            compiled_path = model_registry.artifact_path(compiled_model.COMPILED_MODEL_NAME, version)
+            model = compiled_model.load(compiled_path)[self.compiled_index]
+            vectorizer = fast_vectorizer.load(compiled_path)
+            new_prefilter = prefilter.load(compiled_path)
+        if model is None:
+            model = model_registry.load_artifact(self.model_name, version)
+        if vectorizer is None:
+            vectorizer = model_registry.load_artifact(vectorizer_name, version)
+        # Updates learned from labelled login attempts, if this version has any
+        online = None
+        if version is not None and model_registry.has_artifact(compiled_model.ONLINE_MODEL_NAME, version):
+            online = compiled_model.load_online(model_registry.artifact_path(compiled_model.ONLINE_MODEL_NAME, version))
+        # Cached verdicts belong to exactly this model; legacy pickles are told apart by mtime
+        model_key = version or f'legacy-{os.stat(model_registry.artifact_path(self.model_name)).st_mtime_ns}'
+        # Inputs differing only in case vectorize identically when the vectorizer lowercases
+        fold_case = getattr(vectorizer, 'lowercase', True)
+        self._loaded_version = version
+        self._checked_at = time.monotonic()
+        self._loaded = LoadedModel(model, vectorizer, online, model_key, new_prefilter, fold_case)
+
+    def load_model(self):
+        if self._loaded is None:
+            with self._load_lock:
+                if self._loaded is None:
+                    self._install()
+        elif self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval:
+            with self._load_lock:
+                if time.monotonic() - self._checked_at >= self.reload_interval:
+                    if model_registry.active_version() != self._loaded_version:
+                        self._install()
+                    else:
+                        self._checked_at = time.monotonic()
+        return self._loaded
+
+    def loaded_version(self):
+        """Version of the model in use, or None before the first login loads it."""
+        loaded = self._loaded
+        return loaded.model_key if loaded else None
+
+    def score_inputs(self, texts):
+        """Return the malicious probability of each string from a single model call."""
+        loaded = self.load_model()
+        probabilities = np.zeros(len(texts))
+        escalated = list(range(len(texts)))
+        if loaded.prefilter is not None and prefilter_enabled:
+            # Strings the prefilter clears never reach the model
+            escalated = [i for i, text in enumerate(texts) if not loaded.prefilter.is_benign(text)]
+            prefilter.record('prefilter', len(texts) - len(escalated))
+        if not escalated:
+            return probabilities
+        misses = escalated
+        verdict_cache = self.verdict_cache
+        if verdict_cache is not None:
+            normalized = [texts[i].lower() if loaded.fold_case else texts[i] for i in escalated]
+            cached, keys = verdict_cache.get_many(loaded.model_key, normalized)
+            misses = []
+            miss_keys = []
+            for i, key, probability in zip(escalated, keys, cached):
+                if probability is None:
+                    misses.append(i)
+                    miss_keys.append(key)
+                else:
+                    probabilities[i] = probability
+            prefilter.record('cache', len(escalated) - len(misses))
+        if misses:
+            prefilter.record('model', len(misses))
+            scored = model_proba(loaded, [texts[i] for i in misses])
+            probabilities[misses] = scored
+            if verdict_cache is not None:
+                verdict_cache.put_many(loaded.model_key, miss_keys, scored)
+        return probabilities
+
+    def score_fields(self, texts):
+        # Route through the shared micro-batcher when batching is enabled
+        if batch_wait_ms <= 0:
+            return self.score_inputs(texts)
+        if self._batcher is None:
+            with self._load_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(self.score_inputs, max_batch=batch_max_size,
+                                                 max_wait=batch_wait_ms / 1000)
+        return self._batcher.score(texts)
+
+    def flagged_fields(self, request):
+        """
+        Redacted copies of the login fields that score as malicious, as (field, text)
+        pairs, so admins can label them and online learning can train on them. See
+        prefilter.redact: a password keeps only its SQL words and metacharacters.
+        """
+        fields = [('email', request.form.get('email', '')), ('password', request.form.get('password', ''))]
+        probabilities = self.score_fields([text for _, text in fields])
+        return [(field, prefilter.redact(text, mask_single=field == 'password'))
+                for (field, text), probability in zip(fields, probabilities) if probability >= malicious_threshold]
+
+    def check_login_attempt(self, user, request, velocity=None, password_valid=False):
+        # Use the email and password fields from the login form
+        email_input = request.form.get('email', '')
+        password_input = request.form.get('password', '')
+
+        # First check for SQL injection patterns in both inputs, scored together
+        probabilities = self.score_fields([email_input, password_input])
+        max_malicious_prob = max(probabilities)
+
+        # If SQL injection is detected, mark as malicious regardless of credentials
+        if max_malicious_prob >= malicious_threshold:
+            return 'malicious'
+
+        # Bursts of attempts from one IP, subnet or against one account look like brute force
+        # even when every individual input is clean. `velocity` comes from LoginRateLimiter.record
+        if velocity and velocity['pressure'] >= velocity_suspicious_pressure:
+            return 'suspicious'
+
+        # If no SQL injection, then check credentials
+        if not user:
+            return 'suspicious'
+
+        # The caller verifies the password hash once and passes the result in
+        if not password_valid:
+            return 'suspicious'
+
+        # If we get here, it's a valid login with no SQL injection
+        return 'safe'
+
+
+def model_proba(loaded, texts):
+    model, vectorizer, online = loaded.model, loaded.vectorizer, loaded.online
+    if isinstance(vectorizer, fast_vectorizer.FastVectorizer) and hasattr(model, 'predict_row'):
+        # Fully compiled path: no sparse matrix is built at all
+        with span('vectorize'):
+            rows = [vectorizer.transform_row(text) for text in texts]
+        with span('predict'):
+            probabilities = np.array([model.predict_row(*row) for row in rows])
+            if online is not None:
+                probabilities = online.blend(probabilities, np.array([online.predict_row(*row) for row in rows]))
+            return probabilities
+    with span('vectorize'):
+        login_vectors = vectorizer.transform(texts)
+    with span('predict'):
+        if hasattr(model, 'predict_proba'):
+            probabilities = model.predict_proba(login_vectors)[:, 1]
+        else:
+            # fallback: use decision_function or predict
+            probabilities = model.predict(login_vectors).astype(float)
+        if online is not None:
+            probabilities = online.blend(probabilities, online.predict_proba(login_vectors)[:, 1])
+        return probabilities
+
+
+def verdict(probability):
+    """Verdict for one string's probability, on the same thresholds the login check uses."""
+    if probability >= malicious_threshold:
+        return 'malicious'
+    if probability >= suspicious_threshold:
+        return 'suspicious'
+    return 'safe'
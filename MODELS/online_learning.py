@@ -0,0 +1,248 @@
+import argparse
+import io
+import re
+import time
+from datetime import datetime, timezone
+import numpy as np
+import scipy.sparse as sp
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import train_test_split
+
+from MODELS import model_registry, compiled_model, fast_vectorizer, prefilter
+from MODELS.train_model import load_dataset, DATASET_PATH
+
+# Incremental updates from flagged login inputs an admin labelled as an attack
+# or a false positive on /admin/flagged. A log-loss linear model over the served
+# TF-IDF features is updated with partial_fit, starting from the previous
+# update (or the version's logistic model), and served next to the model the
+# app uses (the forest or the logistic model, whichever app.py imports) as
+#
+#   probability = (1 - weight) * base model + weight * online model
+#
+# Each update is checked against the held-out 20% of SQLiV3.csv and against
+# its own labels before it is published as a new registry version and
+# promoted; workers pick the new version up within MODEL_RELOAD_INTERVAL
+# seconds without a restart.
+#
+#   python -m MODELS.online_learning                 # one update
+#   python -m MODELS.online_learning --interval 900  # keep polling
+
+def export_online(model, weight):
+    return compiled_model.dumps({
+        **compiled_model.export_logistic(model),
+        'online_weight': np.array(weight, dtype=np.float64),
+    })
+
+
+def extend_prefilter(compiled_bytes, texts):
+    """Add the tokens of confirmed attacks to the prefilter keywords, so they always reach the model."""
+    with np.load(io.BytesIO(compiled_bytes)) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    if 'prefilter_keywords' not in arrays:
+        return compiled_bytes
+    tokenizer = re.compile(prefilter.TOKEN_PATTERN)
+    keywords = set(arrays['prefilter_keywords'].tolist())
+    for text in texts:
+        keywords.update(tokenizer.findall(text.lower()))
+    arrays['prefilter_keywords'] = np.asarray(sorted(keywords), dtype=str)
+    return compiled_model.dumps(arrays)
+
+
+def load_online(version):
+    """The online model of a registry version, or None if it has no updates."""
+    if version is None or not model_registry.has_artifact(compiled_model.ONLINE_MODEL_NAME, version):
+        return None
+    return compiled_model.load_online(model_registry.artifact_path(compiled_model.ONLINE_MODEL_NAME, version))
+
+
+def load_vectorizer(version):
+    path = model_registry.artifact_path(compiled_model.COMPILED_MODEL_NAME, version)
+    vectorizer = fast_vectorizer.load(path) if model_registry.has_artifact(compiled_model.COMPILED_MODEL_NAME, version) else None
+    return vectorizer or model_registry.load_artifact('tfidf_vectorizer.pkl', version)
+
+
+def starting_model(version, eta0):
+    """An SGD classifier warm-started from the version's online model, or its logistic model."""
+    online = load_online(version)
+    if online is not None:
+        coef, intercept = online.coef, online.intercept
+    else:
+        logistic = model_registry.load_artifact('logistic_regression_model.pkl', version)
+        coef, intercept = logistic.coef_[0], logistic.intercept_[0]
+    model = SGDClassifier(loss='log_loss', alpha=1e-5, learning_rate='constant', eta0=eta0, random_state=42)
+    model.coef_ = np.array([coef], dtype=np.float64)
+    model.intercept_ = np.array([intercept], dtype=np.float64)
+    model.classes_ = np.array([0, 1])
+    return model
+
+
+def update(model, X_labelled, y_labelled, X_replay, y_replay, label_weight=5.0, epochs=5, seed=42):
+    """
+    partial_fit the labelled inputs mixed with a replay sample of the
+    training corpus, so a handful of new examples cannot drag the model away
+    from everything it learned before.
+    """
+    X = sp.vstack([X_labelled, X_replay], format='csr')
+    y = np.concatenate([y_labelled, y_replay])
+    weights = np.concatenate([np.full(len(y_labelled), label_weight), np.ones(len(y_replay))])
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        model.partial_fit(X[order], y[order], sample_weight=weights[order])
+    return model
+
+
+def accuracy(probabilities, labels, threshold):
+    predicted = probabilities >= threshold
+    positives = labels == 1
+    return {
+        'accuracy': float((predicted == positives).mean()),
+        'recall': float(predicted[positives].mean()) if positives.any() else 1.0,
+        'false_positive_rate': float(predicted[~positives].mean()) if (~positives).any() else 0.0,
+    }
+
+
+def base_probabilities(version, X, served):
+    """Probabilities of the model `served` (a ModelServer) scores with, without any online update."""
+    if model_registry.has_artifact(compiled_model.COMPILED_MODEL_NAME, version):
+        path = model_registry.artifact_path(compiled_model.COMPILED_MODEL_NAME, version)
+        model = compiled_model.load(path)[served.compiled_index]
+        if model is not None:
+            return model.predict_proba(X)[:, 1]
+    return model_registry.load_artifact(served.model_name, version).predict_proba(X)[:, 1]
+
+
+def rejection(before, after, agreement, args):
+    """Why an update must not be promoted, or None if it passes every check."""
+    if after['accuracy'] < before['accuracy'] - args.max_accuracy_drop:
+        return f"held-out accuracy dropped by more than {args.max_accuracy_drop}"
+    if after['recall'] < before['recall'] - args.max_recall_drop:
+        return f"held-out recall dropped by more than {args.max_recall_drop}"
+    if after['false_positive_rate'] > before['false_positive_rate'] + args.max_fpr_increase:
+        return f"held-out false positive rate rose by more than {args.max_fpr_increase}"
+    if agreement < args.min_label_agreement:
+        return f"only {agreement:.1%} of the labelled inputs are classified as labelled (minimum {args.min_label_agreement:.0%})"
+    return None
+
+
+def fetch_labelled(session, FlaggedInput, since):
+    query = session.query(FlaggedInput.payload, FlaggedInput.label, FlaggedInput.labelled_at).filter(
+        FlaggedInput.label.isnot(None))
+    if since is not None:
+        query = query.filter(FlaggedInput.labelled_at > since)
+    return query.order_by(FlaggedInput.labelled_at).all()
+
+
+def run_once(session, FlaggedInput, args, holdout, replay, served):
+    version = model_registry.active_version()
+    if version is None:
+        raise SystemExit("No model version promoted; run `python -m MODELS.train_model --promote` first")
+    manifest = model_registry.read_manifest(version)
+    online_info = manifest.get('online', {})
+    since = online_info.get('labelled_through')
+    rows = fetch_labelled(session, FlaggedInput, since and datetime.fromisoformat(since).replace(tzinfo=None))
+    if not rows:
+        print(f"No newly labelled inputs since {since or 'the start'}")
+        return None
+
+    texts = [row.payload for row in rows]
+    labels = np.array([row.label for row in rows])
+    print(f"Updating {version} with {len(rows)} labelled inputs "
+          f"({int(labels.sum())} malicious, {int((labels == 0).sum())} false positives)")
+
+    vectorizer = load_vectorizer(version)
+    X_holdout, y_holdout = vectorizer.transform(holdout[0]), holdout[1]
+    base = base_probabilities(version, X_holdout, served)
+
+    X_labelled = vectorizer.transform(texts)
+    model = update(starting_model(version, args.eta0), X_labelled, labels,
+                   vectorizer.transform(replay[0]), replay[1], args.label_weight, args.epochs)
+    online = compiled_model.CompiledOnline({**compiled_model.export_logistic(model), 'online_weight': np.array(args.weight)})
+    after = online.blend(base, online.predict_proba(X_holdout)[:, 1])
+
+    # Measured against the served model alone, so successive updates cannot drift away from it step by step
+    before_metrics = accuracy(base, y_holdout, args.threshold)
+    after_metrics = accuracy(after, y_holdout, args.threshold)
+    labelled_after = online.blend(base_probabilities(version, X_labelled, served), online.predict_proba(X_labelled)[:, 1])
+    agreement = float(((labelled_after >= args.threshold) == (labels == 1)).mean())
+    print(f"Held-out {served.model_name} alone -> with the update: "
+          f"accuracy {before_metrics['accuracy']:.4f} -> {after_metrics['accuracy']:.4f}, "
+          f"recall {before_metrics['recall']:.4f} -> {after_metrics['recall']:.4f}, "
+          f"false positive rate {before_metrics['false_positive_rate']:.4f} -> {after_metrics['false_positive_rate']:.4f}; "
+          f"labelled inputs now classified as labelled: {agreement:.1%}")
+
+    reason = rejection(before_metrics, after_metrics, agreement, args)
+    if reason:
+        print(f"Rejected: {reason}")
+        return None
+    if args.dry_run:
+        return None
+
+    artifacts = model_registry.read_artifacts(version)
+    artifacts[compiled_model.ONLINE_MODEL_NAME] = export_online(model, args.weight)
+    if compiled_model.COMPILED_MODEL_NAME in artifacts:
+        attacks = [text for text, label in zip(texts, labels) if label == 1]
+        artifacts[compiled_model.COMPILED_MODEL_NAME] = extend_prefilter(
+            artifacts[compiled_model.COMPILED_MODEL_NAME], attacks)
+    manifest = {key: value for key, value in manifest.items() if key not in ('version', 'created_at', 'artifacts')}
+    manifest['online'] = {
+        'base_version': online_info.get('base_version', version),
+        'previous_version': version,
+        'weight': args.weight,
+        'examples': online_info.get('examples', 0) + len(rows),
+        'labelled_through': max(row.labelled_at for row in rows).isoformat(),
+        'base_model': served.model_name,
+        'holdout': after_metrics,
+        'labelled_agreement': agreement,
+    }
+    new_version = model_registry.publish(artifacts, manifest)
+    model_registry.promote(new_version)
+    return new_version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the served model from labelled login inputs.')
+    parser.add_argument('--interval', type=float, default=0, help='Poll for new labels every N seconds (0 = run once)')
+    # Above 1 - threshold (0.3) the online model can clear inputs the forest is certain about
+    parser.add_argument('--weight', type=float, default=0.4, help='Share of the online model in the served probability')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--eta0', type=float, default=0.01, help='SGD learning rate')
+    parser.add_argument('--label-weight', type=float, default=5.0, help='Sample weight of a labelled attempt')
+    parser.add_argument('--replay', type=int, default=2000, help='Training rows from the dataset mixed into each update')
+    parser.add_argument('--threshold', type=float, default=0.7, help='Probability counted as malicious when validating')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.002,
+                        help='Largest held-out accuracy loss an update may cause and still be promoted')
+    parser.add_argument('--max-recall-drop', type=float, default=0.002,
+                        help='Largest held-out recall loss an update may cause and still be promoted')
+    parser.add_argument('--max-fpr-increase', type=float, default=0.002,
+                        help='Largest held-out false positive rate rise an update may cause and still be promoted')
+    parser.add_argument('--min-label-agreement', type=float, default=0.9,
+                        help='Share of the new labelled inputs the update must classify as labelled')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--dry-run', action='store_true', help='Validate without publishing')
+    args = parser.parse_args()
+
+    # Same split as training, so the held-out slice was never trained on
+    X, y = load_dataset(args.dataset)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    holdout = (X_test.tolist(), y_test.to_numpy())
+
+    from app import app, db, FlaggedInput, check_login_attempt
+    # The twin module app.py imports decides which model the update is blended with
+    served = check_login_attempt.__self__
+
+    rng = np.random.default_rng()
+    while True:
+        picks = rng.choice(len(X_train), size=min(args.replay, len(X_train)), replace=False)
+        replay = (X_train.iloc[picks].tolist(), y_train.iloc[picks].to_numpy())
+        with app.app_context():
+            version = run_once(db.session, FlaggedInput, args, holdout, replay, served)
+        if version:
+            print(f"Promoted {version} at {datetime.now(timezone.utc).isoformat()}")
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import re
+import threading
+from collections import Counter
+import numpy as np
+
+# First tier of the detector. Almost every real login field is a plain email
+# address or password, so before paying for the model we check whether the
+# string contains any SQL metacharacter or any token that occurs in injection
+# payloads from the training data. Strings with neither are cleared as benign;
+# everything else is escalated to the model.
+
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+META_PATTERN = r"['\"`;=()<>|\\*%#]|--|/\*"
+
+
+class KeywordCounter:
+    """
+    Accumulates per-token malicious and benign document frequencies chunk by
+    chunk, so keywords can be built from a corpus that is streamed from disk.
+    """
+
+    def __init__(self):
+        self.tokenizer = re.compile(TOKEN_PATTERN)
+        self.meta = re.compile(META_PATTERN)
+        self.malicious = Counter()
+        self.benign = Counter()
+
+    def add(self, sentences, labels):
+        for sentence, label in zip(sentences, labels):
+            (self.malicious if label == 1 else self.benign).update(set(self.tokenizer.findall(sentence.lower())))
+
+    def keywords(self, min_count=1, min_ratio=0.0):
+        return {
+            token for token, count in self.malicious.items()
+            if count >= min_count and count / (count + self.benign[token]) >= min_ratio
+        }
+
+    def escalate(self, keywords, sentences, probabilities, escalate_at=0.5):
+        """Add the tokens of sentences the model flags but `keywords` would clear."""
+        for sentence, probability in zip(sentences, probabilities):
+            if probability >= escalate_at and not self.meta.search(sentence):
+                tokens = set(self.tokenizer.findall(sentence.lower()))
+                if keywords.isdisjoint(tokens):
+                    keywords.update(tokens)
+        return keywords
+
+
+def build_keywords(sentences, labels, min_count=1, min_ratio=0.0, probabilities=None, escalate_at=0.5):
+    """
+    Collect tokens that appear in at least `min_count` malicious sentences and
+    whose share of malicious document frequency is at least `min_ratio`.
+
+    If the model's `probabilities` for the sentences are given, any sentence
+    scored at or above `escalate_at` that those keywords would still clear
+    contributes its tokens too, so the prefilter never clears a training
+    string the model would flag.
+    """
+    counter = KeywordCounter()
+    counter.add(sentences, labels)
+    keywords = counter.keywords(min_count, min_ratio)
+    if probabilities is not None:
+        counter.escalate(keywords, sentences, probabilities, escalate_at)
+    return sorted(keywords)
+
+
+def export_prefilter(keywords, max_length=128):
+    return {
+        'prefilter_keywords': np.asarray(keywords, dtype=str),
+        'prefilter_meta_pattern': np.asarray(META_PATTERN, dtype=str),
+        'prefilter_max_length': np.asarray(max_length),
+    }
+
+
+class Prefilter:
+    def __init__(self, arrays):
+        self.keywords = frozenset(arrays['prefilter_keywords'].tolist())
+        self.meta = re.compile(str(arrays['prefilter_meta_pattern']))
+        self.tokenizer = re.compile(TOKEN_PATTERN)
+        self.max_length = int(arrays['prefilter_max_length'])
+
+    def is_benign(self, text):
+        """True if `text` can be cleared without consulting the model."""
+        if len(text) > self.max_length or self.meta.search(text):
+            return False
+        return self.keywords.isdisjoint(self.tokenizer.findall(text.lower()))
+
+
+# Words of SQL itself, the only tokens redact() keeps. Keywords learned from the
+# training data are not enough: they include names and other ordinary words.
+SQL_TOKENS = frozenset("""
+    select union all distinct from where and or not xor like in is null between exists having group
+    order by limit offset as on join into values insert update set delete drop create alter truncate
+    table tables column columns database schema information_schema exec execute declare procedure
+    case when then else end if cast convert char chr concat concat_ws substring substr mid ascii ord
+    hex unhex length count sleep pg_sleep benchmark waitfor delay load_file outfile dumpfile version
+    user current_user system_user session_user sysobjects syscolumns xp_cmdshell shutdown grant
+    extractvalue updatexml floor rand name_const dbms_pipe receive_message sqlite_master utl_inaddr
+    true false asc desc
+""".split())
+
+_tokenizer = re.compile(TOKEN_PATTERN)
+_word = re.compile(r"(?u)\w+")
+
+
+def redact(text, mask_single=False):
+    """
+    `text` with every token that is not SQL replaced by 'x'.
+
+    Metacharacters, SQL words and single characters are kept, so the result
+    still vectorizes like the attack it came from, but names, addresses and
+    other words typed into a login form are not. With `mask_single` single
+    characters are masked too, leaving only the SQL skeleton of a password.
+    """
+    pattern = _word if mask_single else _tokenizer
+    return pattern.sub(lambda match: match.group() if match.group().lower() in SQL_TOKENS else 'x', text)
+
+
+def load(path):
+    with np.load(path) as npz:
+        if 'prefilter_keywords' not in npz.files:
+            return None
+        return Prefilter({name: npz[name] for name in npz.files if name.startswith('prefilter_')})
+
+
+# How many strings each tier has decided since the process started
+_stats_lock = threading.Lock()
+tier_counts = {'prefilter': 0, 'cache': 0, 'model': 0}
+
+
+def record(tier, count=1):
+    with _stats_lock:
+        tier_counts[tier] += count
+
+
+def tier_stats():
+    with _stats_lock:
+        return dict(tier_counts)
@@ -3,65 +3,340 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+import sklearn
+import argparse
+import contextlib
+import csv
+import math
 import pickle
 import os
+import sys
+import tempfile
+import time
+from collections import Counter
 
-# Load the dataset
-print("Loading dataset...")
-df = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1')
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-# Clean the data
-print("Cleaning data...")
-df['Sentence'] = df['Sentence'].fillna('')  # Replace NaN with empty string
-df['Label'] = pd.to_numeric(df['Label'], errors='coerce').fillna(0).astype(int)  # Convert to int and handle NaN
+from MODELS import model_registry, compiled_model, fast_vectorizer, prefilter
 
-# Prepare the data
-X = df['Sentence']
-y = df['Label']
+DATASET_PATH = os.path.join('MODELS', 'SQLiV3.csv')
+MAX_FEATURES = 5000
 
-# Split the data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Create and fit the vectorizer
-print("Creating TF-IDF vectorizer...")
-vectorizer = TfidfVectorizer(max_features=5000)
-X_train_tfidf = vectorizer.fit_transform(X_train)
-X_test_tfidf = vectorizer.transform(X_test)
+def peak_rss_mb(children=False):
+    """Peak RSS of this process, or of its largest finished child process."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
 
-# Train the model
-print("Training Random Forest model...")
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train_tfidf, y_train)
 
-# Evaluate the model
-print("Evaluating model...")
-train_score = model.score(X_train_tfidf, y_train)
-test_score = model.score(X_test_tfidf, y_test)
-print(f"Training accuracy: {train_score:.4f}")
-print(f"Testing accuracy: {test_score:.4f}")
+@contextlib.contextmanager
+def stage(name, stages):
+    """Time a training stage and record the process's peak RSS at its end."""
+    print(f"{name}...")
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    rss = peak_rss_mb()
+    stages.append({'stage': name, 'seconds': round(elapsed, 3), 'peak_rss_mb': rss and round(rss, 1)})
+    print(f"  {name}: {elapsed:.1f}s, peak RSS {f'{rss:.0f} MB' if rss else 'n/a'}")
 
-# Train and save Logistic Regression model
-print("Training Logistic Regression model...")
-logreg_model = LogisticRegression(max_iter=1000, random_state=42)
-logreg_model.fit(X_train_tfidf, y_train)
 
-logreg_train_score = logreg_model.score(X_train_tfidf, y_train)
-logreg_test_score = logreg_model.score(X_test_tfidf, y_test)
-print(f"Logistic Regression Training accuracy: {logreg_train_score:.4f}")
-print(f"Logistic Regression Testing accuracy: {logreg_test_score:.4f}")
+def load_dataset(path=DATASET_PATH):
+    # Load the dataset
+    df = pd.read_csv(path, encoding='latin1')
 
-# Save the model and vectorizer
-print("Saving model and vectorizer...")
-os.makedirs('MODELS/models', exist_ok=True)
+    # Clean the data
+    df['Sentence'] = df['Sentence'].fillna('')  # Replace NaN with empty string
+    df['Label'] = pd.to_numeric(df['Label'], errors='coerce').fillna(0).astype(int)  # Convert to int and handle NaN
+    return df['Sentence'], df['Label']
 
-with open('MODELS/random_forest_model.pkl', 'wb') as model_file:
-    pickle.dump(model, model_file)
 
-with open('MODELS/tfidf_vectorizer.pkl', 'wb') as vectorizer_file:
-    pickle.dump(vectorizer, vectorizer_file)
+def count_rows(path, chunk_size):
+    return sum(len(chunk) for chunk in pd.read_csv(path, encoding='latin1', usecols=['Label'], chunksize=chunk_size))
 
-with open('MODELS/logistic_regression_model.pkl', 'wb') as logreg_model_file:
-    pickle.dump(logreg_model, logreg_model_file)
 
-print("Model training and saving completed successfully!") 
\ No newline at end of file
+def test_mask(n_rows, test_size=0.2, seed=42):
+    """
+    The rows train_test_split(test_size, random_state=seed) puts in the test split.
+
+    Streaming mode holds out exactly the rows the in-memory mode does, so
+    online_learning's held-out slice was never trained on in either mode.
+    Costs one byte per row.
+    """
+    _, test_rows = train_test_split(np.arange(n_rows), test_size=test_size, random_state=seed)
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[test_rows] = True
+    return mask
+
+
+def iter_chunks(path, chunk_size, is_test):
+    """Yield (sentences, labels, is_test) for successive chunks of the CSV, with `is_test` sliced from the mask."""
+    start = 0
+    for chunk in pd.read_csv(path, encoding='latin1', usecols=['Sentence', 'Label'], chunksize=chunk_size):
+        sentences = chunk['Sentence'].fillna('').astype(str).tolist()
+        labels = pd.to_numeric(chunk['Label'], errors='coerce').fillna(0).astype(int).to_numpy()
+        yield sentences, labels, is_test[start:start + len(sentences)]
+        start += len(sentences)
+
+
+def read_bucket(path):
+    with open(path, newline='', encoding='utf-8') as bucket:
+        rows = list(csv.reader(bucket))
+    return [sentence for sentence, _ in rows], np.array([int(label) for _, label in rows])
+
+
+def build_vectorizer(term_counts, doc_counts, n_documents, max_features=MAX_FEATURES):
+    """
+    A TfidfVectorizer equivalent to fit() on the counted documents.
+
+    Keeps the `max_features` most frequent terms and sets the smoothed IDF
+    weights sklearn would compute, so the result exports to FastVectorizer
+    like any other fitted vectorizer.
+    """
+    terms = sorted(term_counts)
+    frequencies = np.array([term_counts[term] for term in terms])
+    # Same selection (and tie-breaking) as TfidfVectorizer's max_features
+    vocabulary = sorted(terms[index] for index in (-frequencies).argsort()[:max_features])
+    vectorizer = TfidfVectorizer(vocabulary=vocabulary)
+    vectorizer.fit([''])
+    vectorizer.idf_ = np.array([math.log((1 + n_documents) / (1 + doc_counts[term])) + 1 for term in vocabulary])
+    return vectorizer
+
+
+def train(dataset_path=DATASET_PATH, prefilter_min_count=2, prefilter_min_ratio=0.05, n_jobs=-1):
+    stages = []
+    with stage("Loading dataset", stages):
+        X, y = load_dataset(dataset_path)
+
+        # Split the data
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Create and fit the vectorizer
+    with stage("Fitting TF-IDF vectorizer", stages):
+        vectorizer = TfidfVectorizer(max_features=MAX_FEATURES)
+        X_train_tfidf = vectorizer.fit_transform(X_train)
+        X_test_tfidf = vectorizer.transform(X_test)
+
+    # Train the model
+    with stage("Training Random Forest model", stages):
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        model.fit(X_train_tfidf, y_train)
+
+    # Train Logistic Regression model
+    with stage("Training Logistic Regression model", stages):
+        logreg_model = LogisticRegression(max_iter=1000, random_state=42)
+        logreg_model.fit(X_train_tfidf, y_train)
+
+    # Evaluate the models
+    with stage("Evaluating models", stages):
+        metrics = {
+            'random_forest': {'train_accuracy': model.score(X_train_tfidf, y_train),
+                              'test_accuracy': model.score(X_test_tfidf, y_test)},
+            'logistic_regression': {'train_accuracy': logreg_model.score(X_train_tfidf, y_train),
+                                    'test_accuracy': logreg_model.score(X_test_tfidf, y_test)},
+        }
+
+    # Keywords for the prefilter tier come from the training split's malicious class
+    # plus anything either model finds suspicious there; the test split stays unseen
+    # so evaluate_prefilter can measure recall on it
+    with stage("Building prefilter keywords", stages):
+        probabilities = np.maximum(model.predict_proba(X_train_tfidf)[:, 1],
+                                   logreg_model.predict_proba(X_train_tfidf)[:, 1])
+        keywords = prefilter.build_keywords(
+            X_train.tolist(), y_train.to_numpy(), prefilter_min_count, prefilter_min_ratio, probabilities)
+
+    return package(model, logreg_model, vectorizer, keywords, dataset_path, len(X), metrics,
+                   prefilter_min_count, prefilter_min_ratio, {'mode': 'in-memory', 'n_jobs': n_jobs, 'stages': stages})
+
+
+def train_streaming(dataset_path=DATASET_PATH, prefilter_min_count=2, prefilter_min_ratio=0.05, n_jobs=-1,
+                    chunk_size=50000, epochs=5, forest_sample=200000):
+    """
+    Train from a CSV too large to load as a DataFrame.
+
+    Rows and vectorized matrices are held at most `chunk_size` (plus the
+    `forest_sample` rows the forest is fitted on) at a time. The term and
+    document counts and the prefilter's per-token counts still grow with the
+    number of distinct tokens in the corpus, not with its rows.
+
+    A first pass counts rows, to hold out the same 20% as train_test_split.
+    The second counts terms (for the vocabulary and IDF weights) and prefilter
+    tokens, keeps a uniform reservoir sample of training rows for the forest,
+    and deals every training row into a random temporary bucket file of about
+    `chunk_size` rows. The logistic model is an SGD log-loss classifier fed
+    one shuffled bucket at a time with partial_fit, in a new bucket order each
+    epoch, so a CSV sorted by label trains like a shuffled one. A last pass
+    scores every row to measure accuracy and to find training strings the
+    models flag that the prefilter would clear.
+    """
+    stages = []
+    analyzer = TfidfVectorizer().build_analyzer()
+    keyword_counter = prefilter.KeywordCounter()
+    rng = np.random.default_rng(42)
+    bucket_dir = tempfile.TemporaryDirectory(prefix='train_buckets_')
+
+    with stage("Counting rows", stages):
+        rows = count_rows(dataset_path, chunk_size)
+        is_test = test_mask(rows)
+        train_rows = int((~is_test).sum())
+
+    with stage("Counting terms, sampling and bucketing rows", stages):
+        term_counts, doc_counts = Counter(), Counter()
+        sample_sentences, sample_labels = [], []
+        bucket_paths = [os.path.join(bucket_dir.name, f'{index}.csv') for index in range(max(1, -(-train_rows // chunk_size)))]
+        bucket_files = [open(path, 'w', newline='', encoding='utf-8') for path in bucket_paths]
+        writers = [csv.writer(bucket) for bucket in bucket_files]
+        seen = 0
+        for sentences, labels, chunk_is_test in iter_chunks(dataset_path, chunk_size, is_test):
+            for sentence, label, test in zip(sentences, labels, chunk_is_test):
+                if test:
+                    continue
+                terms = analyzer(sentence)
+                term_counts.update(terms)
+                doc_counts.update(set(terms))
+                writers[rng.integers(len(writers))].writerow((sentence, int(label)))
+                # Algorithm R: every training row ends up in the sample with the same probability
+                if seen < forest_sample:
+                    sample_sentences.append(sentence)
+                    sample_labels.append(label)
+                else:
+                    slot = rng.integers(seen + 1)
+                    if slot < forest_sample:
+                        sample_sentences[slot] = sentence
+                        sample_labels[slot] = label
+                seen += 1
+            train_sentences = [sentence for sentence, test in zip(sentences, chunk_is_test) if not test]
+            keyword_counter.add(train_sentences, labels[~chunk_is_test])
+        for bucket in bucket_files:
+            bucket.close()
+        vectorizer = build_vectorizer(term_counts, doc_counts, train_rows)
+        del term_counts, doc_counts
+
+    with stage("Training Random Forest model", stages):
+        X_sample = vectorizer.transform(sample_sentences)
+        del sample_sentences
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        model.fit(X_sample, np.array(sample_labels))
+        del X_sample, sample_labels
+
+    with stage("Training Logistic Regression model", stages):
+        logreg_model = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+        with bucket_dir:
+            for _ in range(epochs):
+                for index in rng.permutation(len(bucket_paths)):
+                    sentences, labels = read_bucket(bucket_paths[index])
+                    if not sentences:
+                        continue
+                    order = rng.permutation(len(sentences))
+                    logreg_model.partial_fit(vectorizer.transform([sentences[i] for i in order]), labels[order],
+                                             classes=[0, 1])
+
+    # Accuracy is accumulated chunk by chunk in the same pass that escalates prefilter keywords
+    with stage("Evaluating models and building prefilter keywords", stages):
+        keywords = keyword_counter.keywords(prefilter_min_count, prefilter_min_ratio)
+        correct = {'random_forest': [0, 0], 'logistic_regression': [0, 0]}
+        counted = [0, 0]
+        for sentences, labels, chunk_is_test in iter_chunks(dataset_path, chunk_size, is_test):
+            X_chunk = vectorizer.transform(sentences)
+            forest_probabilities = model.predict_proba(X_chunk)[:, 1]
+            logreg_probabilities = logreg_model.predict_proba(X_chunk)[:, 1]
+            for name, probabilities in (('random_forest', forest_probabilities),
+                                        ('logistic_regression', logreg_probabilities)):
+                # Same decision as predict(): the positive class wins only above 0.5
+                hits = (probabilities > 0.5) == (labels == 1)
+                correct[name][0] += int(hits[~chunk_is_test].sum())
+                correct[name][1] += int(hits[chunk_is_test].sum())
+            counted[0] += int((~chunk_is_test).sum())
+            counted[1] += int(chunk_is_test.sum())
+            keyword_counter.escalate(keywords, [sentence for sentence, test in zip(sentences, chunk_is_test) if not test],
+                                     np.maximum(forest_probabilities, logreg_probabilities)[~chunk_is_test])
+        keywords = sorted(keywords)
+        metrics = {name: {'train_accuracy': train / max(counted[0], 1), 'test_accuracy': test / max(counted[1], 1)}
+                   for name, (train, test) in correct.items()}
+
+    training = {'mode': 'streaming', 'n_jobs': n_jobs, 'chunk_size': chunk_size, 'epochs': epochs,
+                'forest_sample': min(forest_sample, train_rows), 'stages': stages}
+    return package(model, logreg_model, vectorizer, keywords, dataset_path, rows, metrics,
+                   prefilter_min_count, prefilter_min_ratio, training)
+
+
+def package(model, logreg_model, vectorizer, keywords, dataset_path, rows, metrics,
+            prefilter_min_count, prefilter_min_ratio, training):
+    for name, scores in metrics.items():
+        print(f"{name}: training accuracy {scores['train_accuracy']:.4f}, testing accuracy {scores['test_accuracy']:.4f}")
+
+    artifacts = {
+        'random_forest_model.pkl': pickle.dumps(model),
+        'tfidf_vectorizer.pkl': pickle.dumps(vectorizer),
+        'logistic_regression_model.pkl': pickle.dumps(logreg_model),
+        # Flattened arrays for sklearn-free scoring at request time
+        compiled_model.COMPILED_MODEL_NAME: compiled_model.dumps({
+            **compiled_model.export_forest(model),
+            **compiled_model.export_logistic(logreg_model),
+            **fast_vectorizer.export_vectorizer(vectorizer),
+            **prefilter.export_prefilter(keywords),
+        }),
+    }
+    manifest = {
+        'dataset': {
+            'path': dataset_path,
+            'sha256': model_registry.file_sha256(dataset_path),
+            'rows': int(rows),
+        },
+        'feature_count': int(len(vectorizer.vocabulary_)),
+        'prefilter': {
+            'keywords': len(keywords),
+            'min_count': prefilter_min_count,
+            'min_ratio': prefilter_min_ratio,
+        },
+        'sklearn_version': sklearn.__version__,
+        'metrics': metrics,
+        'training': training,
+    }
+    return artifacts, manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the SQL injection models and publish them to the registry.')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='Labelled CSV with Sentence and Label columns')
+    parser.add_argument('--promote', action='store_true', help='Pin the new version as the one served by the app')
+    parser.add_argument('--prefilter-min-count', type=int, default=2,
+                        help='Min malicious sentences a token must appear in to escalate to the model')
+    parser.add_argument('--prefilter-min-ratio', type=float, default=0.05,
+                        help='Min malicious share of a token\'s document frequency to escalate to the model')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Cores used to build the forest (-1 for all)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Read the dataset in chunks instead of loading it into memory')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per chunk in streaming mode')
+    parser.add_argument('--epochs', type=int, default=5, help='Passes of the streaming logistic model over the data')
+    parser.add_argument('--forest-sample', type=int, default=200000,
+                        help='Training rows sampled for the forest in streaming mode')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.streaming:
+        artifacts, manifest = train_streaming(args.dataset, args.prefilter_min_count, args.prefilter_min_ratio,
+                                              args.n_jobs, args.chunk_size, args.epochs, args.forest_sample)
+    else:
+        artifacts, manifest = train(args.dataset, args.prefilter_min_count, args.prefilter_min_ratio, args.n_jobs)
+    rss = peak_rss_mb()
+    print(f"Trained in {time.perf_counter() - started:.1f}s, peak RSS {f'{rss:.0f} MB' if rss else 'n/a'}")
+
+    # Save the model and vectorizer
+    print("Publishing model and vectorizer...")
+    version = model_registry.publish(artifacts, manifest)
+    if args.promote:
+        model_registry.promote(version)
+
+    print("Model training and saving completed successfully!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+
+class VerdictCache:
+    """
+    Bounded LRU cache of model probabilities for input strings.
+
+    Entries are keyed by an HMAC of the model key and the normalised input
+    under a random per-process secret, so neither passwords nor anything that
+    can be brute-forced offline are kept in memory. The same cache serves the
+    email and password fields. Passing a different `model_key` (a new model
+    version was loaded) empties the cache.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.model_key = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, model_key, text):
+        message = f'{model_key}\0{text}'.encode('utf-8', 'surrogatepass')
+        return hmac.new(self._secret, message, hashlib.sha256).digest()[:16]
+
+    def get_many(self, model_key, texts):
+        """Cached probability for each text (None on a miss) and the keys to `put` misses under."""
+        keys = [self.key(model_key, text) for text in texts]
+        with self._lock:
+            self._check_model(model_key)
+            found = []
+            for key in keys:
+                probability = self._entries.get(key)
+                if probability is None:
+                    self.stats['misses'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                found.append(probability)
+        return found, keys
+
+    def put_many(self, model_key, keys, probabilities):
+        with self._lock:
+            if model_key != self.model_key:
+                return  # scored by a model that has since been replaced
+            for key, probability in zip(keys, probabilities):
+                self._entries[key] = float(probability)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _check_model(self, model_key):
+        if model_key != self.model_key:
+            if self._entries:
+                self.stats['invalidations'] += 1
+            self._entries.clear()
+            self.model_key = model_key
+
+    def __len__(self):
+        return len(self._entries)
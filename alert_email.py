@@ -1,24 +1,188 @@
+import atexit
+import logging
+import os
+import queue
 import smtplib
+import threading
+import time
+from html import escape
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# Function to send email alert
-def send_email_alert(recipient_email, subject, body):
-    sender_email = 'websqlsentinel@gmail.com'
-    app_password = 'hhhr qfdx rtgr hjnm'
-    
-    try:
+from timing import span
+
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDispatcher:
+    """
+    Delivers alert emails from a background thread so requests never wait on SMTP.
+
+    Alerts go into a bounded queue; when it is full new alerts are dropped
+    rather than blocking the caller. The worker keeps one SMTP connection open
+    between messages, folds alerts for the same recipient that arrive within
+    `batch_window` seconds into one email, skips repeats of the same
+    (recipient, dedupe_key) within `dedupe_window` seconds, and retries failed
+    sends with exponential backoff.
+    """
+
+    def __init__(self, host, port, sender, username=None, password=None, use_tls=False, use_ssl=False,
+                 max_queue=1000, batch_window=2.0, dedupe_window=300, max_retries=5, backoff=1.0,
+                 idle_timeout=60, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.batch_window = batch_window
+        self.dedupe_window = dedupe_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._recent = {}
+        self._connection = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {'queued': 0, 'dropped': 0, 'deduplicated': 0, 'sent': 0, 'failed': 0}
+
+    def send(self, recipient, subject, html, dedupe_key=None):
+        """Queue an alert; returns False if the queue is full and it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((recipient, subject, html, dedupe_key, time.monotonic()))
+        except queue.Full:
+            self.stats['dropped'] += 1
+            logger.warning("Alert queue full, dropping alert for %s", recipient)
+            return False
+        self.stats['queued'] += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every queued alert has been handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _ensure_started(self):
+        # The first queued alert starts the sender in the worker that queued it; a thread
+        # started in the gunicorn master would not survive the fork
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush, 10)
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._deliver_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver_batch(self, batch):
+        now = time.monotonic()
+        self._recent = {key: seen for key, seen in self._recent.items() if now - seen < self.dedupe_window}
+
+        by_recipient = {}
+        for recipient, subject, html, dedupe_key, _ in batch:
+            if dedupe_key is not None:
+                key = (recipient, dedupe_key)
+                if key in self._recent:
+                    self.stats['deduplicated'] += 1
+                    continue
+                self._recent[key] = now
+            by_recipient.setdefault(recipient, []).append((subject, html))
+
+        for recipient, alerts in by_recipient.items():
+            subject = alerts[0][0]
+            if len(alerts) > 1:
+                subject = f"{subject} ({len(alerts)} alerts)"
+            html = '<hr>'.join(body for _, body in alerts)
+            self._send_with_retry(recipient, subject, html)
+
+    def _send_with_retry(self, recipient, subject, html):
         msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
+        msg['From'] = self.sender
+        msg['To'] = recipient
         msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
+        msg.attach(MIMEText(html, 'html'))
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span('smtp_send'):
+                    connection = self._connect()
+                    connection.sendmail(self.sender, [recipient], msg.as_string())
+                self.stats['sent'] += 1
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                self._disconnect()
+                if attempt == self.max_retries:
+                    break
+                delay = self.backoff * (2 ** attempt)
+                logger.warning("Failed to send alert to %s (%s); retrying in %.1fs", recipient, e, delay)
+                time.sleep(delay)
+        self.stats['failed'] += 1
+        logger.error("Giving up on alert to %s after %d attempts", recipient, self.max_retries + 1)
+        return False
 
-        server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-        server.login(sender_email, app_password)
-        server.sendmail(sender_email, recipient_email, msg.as_string())
-        server.quit()
+    def _connect(self):
+        if self._connection is None:
+            if self.use_ssl:
+                connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.use_tls:
+                    connection.starttls()
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+            self._connection = connection
+        return self._connection
 
-        print("Email sent successfully!")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._connection = None
+
+
+_default_dispatcher = None
+
+
+# Function to send email alert
+def send_email_alert(recipient_email, subject, body):
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        sender_email = os.getenv('EMAIL_USER', 'websqlsentinel@gmail.com')
+        _default_dispatcher = AlertDispatcher(
+            'smtp.gmail.com', 465, sender_email,
+            username=sender_email, password=os.getenv('EMAIL_PASSWORD'), use_ssl=True
+        )
+    return _default_dispatcher.send(recipient_email, subject, f'<pre>{escape(body)}</pre>')
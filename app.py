@@ -1,38 +1,83 @@
 from flask import Flask, render_template, redirect, url_for, request, flash, session, abort
 from flask_sqlalchemy import SQLAlchemy
-from flask_mail import Mail, Message  # type: ignore
 from flask_migrate import Migrate
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import logging
 from datetime import datetime, timedelta, timezone
-from MODELS.random_forest_model import check_login_attempt  # Import the model function
+from MODELS.random_forest_model import check_login_attempt, flagged_fields, loaded_version, verdict_cache  # Import the model function
+from MODELS import prefilter
 from dotenv import load_dotenv
-# from MODELS.logistic_regression_model import check_login_attempt
-# Retrain the model every time the server starts
-exec(open('MODELS/train_model.py').read())
+# from MODELS.logistic_regression_model import check_login_attempt, flagged_fields, loaded_version, verdict_cache
+# The model is trained offline with `python -m MODELS.train_model --promote`
+# and the pinned version is loaded on the first login attempt
 from werkzeug.middleware.proxy_fix import ProxyFix
 import pytz
+from blocklist import BlockListCache, BlockExpirySweeper, parse_network, format_network, utcnow
+from alert_email import AlertDispatcher
+from attempt_log import AttemptBuffer
+from attempt_storage import add_to_rollups
+from rate_limiter import LoginRateLimiter
+import passwords
+from passwords import hash_password, verify_password, HashPoolBusy
+from serving import run_cpu_bound
+import metrics
+import timing
+from timing import span, record
+from app_logging import configure_logging
+from memory_report import process_memory
+from client_ip import ClientIPResolver, DEFAULT_TRUSTED_PROXIES
+from flask import g, before_render_template, template_rendered, Response
+from sqlalchemy import insert, func, and_, or_, select, union_all
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.orm import aliased
 
 # Load environment variables from .env file
 load_dotenv()
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
-# Add ProxyFix middleware
-app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+# Add ProxyFix middleware; the client address is resolved by client_ip_resolver instead
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=0, x_proto=1, x_host=1)
+
+# Proxy headers are only trusted from these peers (comma-separated CIDRs)
+client_ip_resolver = ClientIPResolver(
+    os.getenv('TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES),
+    os.getenv('CLIENT_IP_HEADER', 'X-Forwarded-For')
+)
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your_secret_key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+# MAIL_SERVER/MAIL_PORT/MAIL_USE_TLS can point at a local SMTP stand-in for testing
+app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '587'))
+app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', '1') != '0'
 app.config['MAIL_USERNAME'] = os.getenv('EMAIL_USER')
 app.config['MAIL_PASSWORD'] = os.getenv('EMAIL_PASSWORD')
-mail = Mail(app)
+
+# Alerts are sent from a background thread over a reused SMTP connection
+alert_dispatcher = AlertDispatcher(
+    app.config['MAIL_SERVER'],
+    app.config['MAIL_PORT'],
+    sender='websqlsentinel@gmail.com',
+    username=app.config['MAIL_USERNAME'],
+    password=app.config['MAIL_PASSWORD'],
+    use_tls=app.config['MAIL_USE_TLS'],
+    batch_window=float(os.getenv('ALERT_BATCH_WINDOW', '2')),
+    dedupe_window=float(os.getenv('ALERT_DEDUPE_WINDOW', '300'))
+)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+def commit(stage):
+    # Every commit is timed as its own stage, e.g. commit_block_ip
+    with span(f'commit_{stage}'):
+        db.session.commit()
+
 # Ensure the database directory exists
 os.makedirs(os.path.join(basedir, 'database'), exist_ok=True)
 
@@ -52,31 +97,249 @@ class LoginAttempt(db.Model):
     is_malicious = db.Column(db.Boolean, default=False)
     is_suspicious = db.Column(db.Boolean, default=False)
     ip_address = db.Column(db.String(50), nullable=True)  # Made nullable initially
+    __table_args__ = (
+        # Serve the activity dashboard's per-user and per-IP keyset pages
+        db.Index('ix_login_attempts_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_login_attempts_ip_address_timestamp', 'ip_address', 'timestamp'),
+        # Retention deletes by age where the table is not partitioned
+        db.Index('ix_login_attempts_timestamp', 'timestamp'),
+    )
+
+class FlaggedInput(db.Model):
+    # Redacted login fields the model flagged as malicious, for admins to label; read by MODELS.online_learning
+    __tablename__ = 'flagged_inputs'
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    ip_address = db.Column(db.String(50), nullable=True)
+    # None when the login named no existing account, which is where most injections land
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    field = db.Column(db.String(20), nullable=False)  # 'email' or 'password'
+    payload = db.Column(db.Text, nullable=False)  # see prefilter.redact
+    # Set by an admin: 1 attack, 0 false positive
+    label = db.Column(db.Integer, nullable=True)
+    labelled_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class AttemptRollup:
+    # Attempt counts per user, IP ('' when unknown) and hour or day; see attempt_storage.py
+    user_id = db.Column(db.Integer, primary_key=True)
+    ip_address = db.Column(db.String(50), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True, index=True)  # UTC start of the hour or day
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    malicious = db.Column(db.Integer, nullable=False, default=0)
+    suspicious = db.Column(db.Integer, nullable=False, default=0)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+
+class LoginAttemptHourly(AttemptRollup, db.Model):
+    __tablename__ = 'login_attempt_rollups_hourly'
+
+class LoginAttemptDaily(AttemptRollup, db.Model):
+    __tablename__ = 'login_attempt_rollups_daily'
 
 class BlockedIP(db.Model):
     __tablename__ = 'blocked_ips'
     id = db.Column(db.Integer, primary_key=True)
-    ip_address = db.Column(db.String(50), unique=True, nullable=False)
+    ip_address = db.Column(db.String(50), unique=True, nullable=False)  # Address or CIDR block
+    prefix_length = db.Column(db.Integer, nullable=True)  # None if ip_address is not a valid address
     blocked_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     reason = db.Column(db.String(200), nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=True)  # None means permanent block
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # UTC; None means permanent block
+    # Blocks of this address still on record; each repeat makes the next temporary block longer
+    offences = db.Column(db.Integer, nullable=False, default=1)
+
+def load_blocked_ips():
+    # Started here so it runs in each worker, after gunicorn forks
+    block_expiry_sweeper.start()
+    # Expired rows stay in the table until purged, as history for escalation, but not in the cache
+    return db.session.query(BlockedIP.ip_address, BlockedIP.reason, BlockedIP.expires_at).filter(
+        or_(BlockedIP.expires_at.is_(None), BlockedIP.expires_at > utcnow())).all()
+
+# Block list served from memory; workers signal changes through a shared version file
+blocked_ip_cache = BlockListCache(
+    load_blocked_ips,
+    os.getenv('BLOCKLIST_VERSION_FILE', os.path.join(basedir, 'database', 'blocklist.version')),
+    ttl=float(os.getenv('BLOCKLIST_TTL', '30'))
+)
+
+# Temporary blocks last BLOCK_BASE_SECONDS (or RATE_LIMIT_BLOCK_SECONDS) times
+# BLOCK_ESCALATION_FACTOR per earlier offence still on record, up to BLOCK_MAX_SECONDS
+BLOCK_BASE_SECONDS = int(os.getenv('BLOCK_BASE_SECONDS', '3600'))
+BLOCK_ESCALATION_FACTOR = float(os.getenv('BLOCK_ESCALATION_FACTOR', '4'))
+BLOCK_MAX_SECONDS = int(os.getenv('BLOCK_MAX_SECONDS', str(30 * 86400)))
+# The model block after this many offences is permanent (0 never makes one permanent);
+# rate-limit blocks stay capped at BLOCK_MAX_SECONDS
+BLOCK_PERMANENT_AFTER = int(os.getenv('BLOCK_PERMANENT_AFTER', '5'))
+# Expired blocks are kept this long so repeat offenders escalate, then deleted
+BLOCK_HISTORY_DAYS = float(os.getenv('BLOCK_HISTORY_DAYS', '30'))
+# Broadest CIDR blocks users may add from the dashboard; a /0 would lock everyone out
+BLOCK_MIN_PREFIX = {4: int(os.getenv('BLOCK_MIN_PREFIX_V4', '24')), 6: int(os.getenv('BLOCK_MIN_PREFIX_V6', '48'))}
+
+def load_upcoming_expiries(after, limit):
+    with app.app_context():
+        return db.session.scalars(db.select(BlockedIP.expires_at).where(BlockedIP.expires_at > after)
+                                  .order_by(BlockedIP.expires_at).limit(limit)).all()
+
+def purge_expired_blocks(before):
+    with app.app_context():
+        purged = BlockedIP.query.filter(BlockedIP.expires_at < before).delete(synchronize_session=False)
+        commit('purge_blocks')
+        return purged
+
+# Wakes up as temporary blocks expire, so expired entries leave the cache and the table
+block_expiry_sweeper = BlockExpirySweeper(
+    load_upcoming_expiries,
+    purge_expired_blocks,
+    blocked_ip_cache.mark_stale,
+    history=BLOCK_HISTORY_DAYS * 86400,
+    refresh=float(os.getenv('BLOCK_SWEEP_INTERVAL', '300'))
+)
+
+def insert_login_attempts(rows):
+    # One executemany INSERT per flush instead of a commit per login; the rollups move in the same transaction
+    with app.app_context():
+        db.session.execute(insert(LoginAttempt), rows)
+        add_to_rollups(db.session, rows, LoginAttemptHourly.__table__, LoginAttemptDaily.__table__)
+        commit('login_attempts')
+
+# LoginAttempt rows are written in bulk by a background thread; block decisions stay synchronous
+attempt_buffer = AttemptBuffer(
+    insert_login_attempts,
+    os.getenv('ATTEMPT_SPOOL_FILE', os.path.join(basedir, 'database', 'login_attempts.spool.jsonl')),
+    max_rows=int(os.getenv('ATTEMPT_BUFFER_SIZE', '100')),
+    flush_interval=float(os.getenv('ATTEMPT_FLUSH_INTERVAL', '1')),
+    enabled=os.getenv('ATTEMPT_BUFFERING', '1') != '0',
+    # Rows the database rejects on their own merits are quarantined instead of replayed forever
+    bad_row_errors=(IntegrityError, DataError)
+)
+
+# Login velocity per IP, email and IP/24; set RATE_LIMIT_REDIS_URL to share counts between workers
+login_rate_limiter = LoginRateLimiter(
+    window=float(os.getenv('RATE_LIMIT_WINDOW', '60')),
+    ip_limit=int(os.getenv('RATE_LIMIT_IP', '20')),
+    email_limit=int(os.getenv('RATE_LIMIT_EMAIL', '10')),
+    subnet_limit=int(os.getenv('RATE_LIMIT_SUBNET', '100')),
+    max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', '1000000')),
+    redis_url=os.getenv('RATE_LIMIT_REDIS_URL')
+)
+RATE_LIMIT_BLOCK_SECONDS = int(os.getenv('RATE_LIMIT_BLOCK_SECONDS', '900'))
+
+# Prometheus metrics served on /metrics; every timing span feeds the stage histogram
+stage_seconds = metrics.Histogram('sentinel_stage_duration_seconds', 'Time spent in each request stage.', ['stage'])
+request_seconds = metrics.Histogram('sentinel_request_duration_seconds', 'Request latency by endpoint.', ['endpoint'])
+http_requests = metrics.Counter('sentinel_http_requests_total', 'Responses by endpoint and status code.', ['endpoint', 'status'])
+login_verdicts = metrics.Counter('sentinel_login_verdicts_total', 'Login attempts by model verdict.', ['verdict', 'model_version'])
+metrics.Gauge('sentinel_model_info', 'Model version serving logins (1 once loaded).',
+              lambda: [((loaded_version() or 'not loaded',), 1 if loaded_version() else 0)], ['model_version'])
+metrics.Gauge('sentinel_model_tier_decisions_total', 'Login fields decided by each tier (prefilter, cache, model).',
+              lambda: [((tier,), count) for tier, count in prefilter.tier_stats().items()], ['tier'], kind='counter')
+metrics.Gauge('sentinel_verdict_cache_events_total', 'Verdict cache hits, misses, evictions and invalidations.',
+              lambda: [((event,), count) for event, count in (verdict_cache.stats.items() if verdict_cache else ())],
+              ['event'], kind='counter')
+metrics.Gauge('sentinel_password_hashes_total', 'Password hash pool jobs by outcome.',
+              lambda: [((outcome,), count) for outcome, count in (passwords.hash_pool.stats.items() if passwords.hash_pool else ())],
+              ['outcome'], kind='counter')
+metrics.Gauge('sentinel_alerts_total', 'Alert emails by outcome.',
+              lambda: [((outcome,), count) for outcome, count in alert_dispatcher.stats.items()], ['outcome'], kind='counter')
+metrics.Gauge('sentinel_block_expiry_events_total', 'Temporary blocks expired and purged by the sweeper.',
+              lambda: [((event,), count) for event, count in block_expiry_sweeper.stats.items()], ['event'], kind='counter')
+metrics.Gauge('sentinel_process_memory_bytes', 'This worker\'s memory: rss, pss, uss (private) and shared.',
+              lambda: [((kind,), value) for kind, value in (process_memory() or {}).items()], ['kind'])
+timing.add_listener(lambda name, seconds: stage_seconds.observe((name,), seconds))
+
+# Accounts allowed to label attempts for online learning, comma separated
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def is_admin(user):
+    return user is not None and user.email.lower() in ADMIN_EMAILS
+
+# Set METRICS_TOKEN to require "Authorization: Bearer <token>" on /metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'unmatched'
+    if started is not None:
+        request_seconds.observe((endpoint,), time.perf_counter() - started)
+    http_requests.inc((endpoint, str(response.status_code)))
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.before_request
 def check_blocked_ip():
     # Skip check for static files and the blocked page itself
     if request.endpoint and 'static' not in request.endpoint and request.endpoint != 'blocked':
-        ip = get_client_ip()
-        blocked = BlockedIP.query.filter_by(ip_address=ip).first()
-        if blocked:
-            return render_template('blocked.html', reason=blocked.reason), 403
-
-def block_ip(ip_address, reason):
-    blocked = BlockedIP(
-        ip_address=ip_address,
-        reason=reason
-    )
-    db.session.add(blocked)
-    db.session.commit()
+        with span('check_blocked_ip'):
+            with span('client_ip'):
+                ip = get_client_ip()
+            with span('blocklist_lookup'):
+                reason = blocked_ip_cache.lookup(ip)
+        if reason:
+            return render_template('blocked.html', reason=reason), 403
+
+def _render_started(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+def _render_finished(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        record('render', time.perf_counter() - started)
+
+before_render_template.connect(_render_started, app)
+template_rendered.connect(_render_finished, app)
+
+def block_expiry(offences, base_seconds, now, can_be_permanent=True):
+    if base_seconds is None or base_seconds <= 0:
+        return None
+    if can_be_permanent and BLOCK_PERMANENT_AFTER and offences > BLOCK_PERMANENT_AFTER:
+        return None
+    seconds = min(base_seconds * BLOCK_ESCALATION_FACTOR ** (offences - 1), BLOCK_MAX_SECONDS)
+    return now + timedelta(seconds=seconds)
+
+def block_ip(ip_address, reason, base_seconds=None, can_be_permanent=True):
+    # Accepts single addresses as well as CIDR blocks such as 203.0.113.0/24.
+    # Without base_seconds the block is permanent; with it, it escalates for repeat offenders,
+    # becoming permanent after BLOCK_PERMANENT_AFTER offences unless can_be_permanent is False.
+    with span('block_ip'):
+        network = parse_network(ip_address)
+        ip_address = format_network(network) if network else ip_address
+        now = utcnow()
+        blocked = BlockedIP.query.filter_by(ip_address=ip_address).first()
+        if blocked is None:
+            expires_at = block_expiry(1, base_seconds, now, can_be_permanent)
+            blocked = BlockedIP(
+                ip_address=ip_address,
+                prefix_length=network.prefixlen if network else None,
+                reason=reason,
+                expires_at=expires_at,
+                offences=1
+            )
+            db.session.add(blocked)
+        else:
+            active = blocked.expires_at is None or blocked.expires_at > now
+            # A block still in force is only extended; blocking again after it ran out is a repeat offence
+            offences = blocked.offences if active else blocked.offences + 1
+            expires_at = block_expiry(offences, base_seconds, now, can_be_permanent)
+            if active and (blocked.expires_at is None or (expires_at is not None and expires_at <= blocked.expires_at)):
+                return
+            blocked.reason = reason
+            blocked.blocked_at = datetime.now(timezone.utc)
+            blocked.expires_at = expires_at
+            blocked.offences = offences
+        commit('block_ip')
+        blocked_ip_cache.invalidate()
+        if expires_at is not None:
+            block_expiry_sweeper.schedule(expires_at)
 
 @app.route('/')
 def index():
@@ -92,18 +355,20 @@ def register():
         if password != confirm_password:
             flash('Passwords do not match. Please try again.', 'danger')
             return render_template('index.html')
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = hash_password(password)
+        except HashPoolBusy:
+            # Shed load instead of queueing more hash work behind a saturated pool
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('index.html'), 429, {'Retry-After': '1'}
         new_user = User(email=email, username=username, password=hashed_password)
         db.session.add(new_user)
-        db.session.commit()
+        commit('register')
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('login'))
     return render_template('index.html')
 
-def send_email(to_email, attempt_info):
-    msg = Message('🔒 Security Alert: Suspicious Activity Detected',
-                  sender='websqlsentinel@gmail.com',
-                  recipients=[to_email])
+def send_email(to_email, attempt_info, dedupe_key=None):
     
     # HTML email template
     html_template = f"""
@@ -179,8 +444,24 @@ def send_email(to_email, attempt_info):
     </html>
     """
     
-    msg.html = html_template
-    mail.send(msg)
+    # Queued for the dispatcher thread; repeats for the same dedupe_key are suppressed
+    with span('alert_enqueue'):
+        alert_dispatcher.send(to_email, '🔒 Security Alert: Suspicious Activity Detected', html_template,
+                              dedupe_key=dedupe_key)
+
+MODEL_BLOCK_REASON = "Malicious login attempt detected"
+
+# Set STORE_FLAGGED_INPUTS=1 to keep redacted copies of flagged login fields for online learning
+STORE_FLAGGED_INPUTS = os.getenv('STORE_FLAGGED_INPUTS', '0') != '0'
+
+def record_flagged_inputs(user, ip_address):
+    # Whether or not the login named an account; the raw fields are never stored
+    if not STORE_FLAGGED_INPUTS:
+        return
+    for field, payload in flagged_fields(request):
+        db.session.add(FlaggedInput(user_id=user.id if user else None, ip_address=ip_address,
+                                    field=field, payload=payload))
+    commit('flagged_input')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -188,78 +469,146 @@ def login():
         email = request.form['email']
         password = request.form['password']
         
-        # Debug logging for login attempt
-        print("\n=== Login Attempt Debug Info ===")
-        ip_address = get_client_ip()
-        print(f"Final IP used for login attempt: {ip_address}")
-        
-        user = User.query.filter_by(email=email).first()
+        with span('client_ip'):
+            ip_address = get_client_ip()
+
+        with span('rate_limit'):
+            velocity = login_rate_limiter.record(ip_address, email)
+            limited = login_rate_limiter.exceeded(velocity)
+        if limited:
+            scope, key = limited
+            if scope in ('ip', 'subnet'):
+                # Rate-limit blocks may cover a whole /24 or /64 (shared NATs, carriers), so they
+                # escalate only up to BLOCK_MAX_SECONDS and never become permanent
+                block_ip(key, f"Too many login attempts from {key}",
+                         base_seconds=RATE_LIMIT_BLOCK_SECONDS, can_be_permanent=False)
+                logger.warning("Rate limit exceeded, temporarily blocked %s", key)
+            flash('Too many login attempts. Please try again later.', 'danger')
+            return render_template('login.html'), 429
+
+        with span('user_lookup'):
+            user = User.query.filter_by(email=email).first()
         if user:
-            # Use the Random Forest model to check the login attempt
-            result = check_login_attempt(user, request)
+            # The slow hash is verified once here; the model only gets the result
+            try:
+                with span('password_verify'):
+                    password_valid, upgraded_hash = verify_password(user.password, password)
+            except HashPoolBusy:
+                flash('The server is busy. Please try again in a moment.', 'warning')
+                return render_template('login.html'), 429, {'Retry-After': '1'}
+            # Use the Random Forest model to check the login attempt; off the event loop under gevent
+            with span('model'):
+                result = run_cpu_bound(check_login_attempt, user, request._get_current_object(), velocity, password_valid)
+            login_verdicts.inc((result, loaded_version()))
             is_malicious = result == 'malicious'
             is_suspicious = result == 'suspicious'
             
-            if check_password_hash(user.password, password):
+            if password_valid:
+                if upgraded_hash:
+                    # Stored with older hash parameters; re-hash now that we have the plaintext
+                    user.password = upgraded_hash
+                    commit('password_upgrade')
                 session['user_id'] = user.id
                 now_utc = datetime.now(timezone.utc)
-                new_attempt = LoginAttempt(
-                    user_id=user.id, 
-                    status='Success', 
-                    is_malicious=is_malicious,
-                    is_suspicious=is_suspicious,
-                    ip_address=ip_address,
-                    timestamp=now_utc
-                )
-                db.session.add(new_attempt)
-                db.session.commit()
-                print(f"Login attempt logged with IP: {ip_address}")
+                with span('attempt_log'):
+                    attempt_buffer.add(dict(
+                        user_id=user.id, 
+                        status='Success', 
+                        is_malicious=is_malicious,
+                        is_suspicious=is_suspicious,
+                        ip_address=ip_address,
+                        timestamp=now_utc
+                    ))
+                logger.debug("Login attempt logged with IP: %s", ip_address)
 
                 # Block IP if malicious
                 if is_malicious:
-                    block_ip(ip_address, "Malicious login attempt detected")
-                    attempt_info = f"User ID: {user.id}, Email: {user.email}, Time: {new_attempt.timestamp.strftime('%d-%m-%Y %I:%M:%S %p')}, IP: {ip_address}"
-                    send_email(user.email, attempt_info)
-                    print(f"Malicious attempt blocked for IP: {ip_address}")
+                    record_flagged_inputs(user, ip_address)
+                    block_ip(ip_address, MODEL_BLOCK_REASON, base_seconds=BLOCK_BASE_SECONDS)
+                    attempt_info = f"User ID: {user.id}, Email: {user.email}, Time: {now_utc.strftime('%d-%m-%Y %I:%M:%S %p')}, IP: {ip_address}"
+                    send_email(user.email, attempt_info, dedupe_key=ip_address)
+                    logger.warning("Malicious attempt blocked for IP: %s", ip_address)
                     return render_template('malicious_alert.html')
 
                 return redirect(url_for('activity'))
             else:
                 now_utc = datetime.now(timezone.utc)
-                new_attempt = LoginAttempt(
-                    user_id=user.id, 
-                    status='Failed', 
-                    is_malicious=is_malicious,
-                    is_suspicious=is_suspicious,
-                    ip_address=ip_address,
-                    timestamp=now_utc
-                )
-                db.session.add(new_attempt)
-                db.session.commit()
-                print(f"Failed login attempt logged with IP: {ip_address}")
+                with span('attempt_log'):
+                    attempt_buffer.add(dict(
+                        user_id=user.id, 
+                        status='Failed', 
+                        is_malicious=is_malicious,
+                        is_suspicious=is_suspicious,
+                        ip_address=ip_address,
+                        timestamp=now_utc
+                    ))
+                logger.debug("Failed login attempt logged with IP: %s", ip_address)
 
                 # Block IP if malicious
                 if is_malicious:
-                    block_ip(ip_address, "Malicious login attempt detected")
-                    attempt_info = f"User ID: {user.id if user else 'Unknown'}, Email: {email}, Time: {new_attempt.timestamp.strftime('%d-%m-%Y %I:%M:%S %p')}, IP: {ip_address}"
-                    send_email(user.email, attempt_info)
-                    print(f"Malicious attempt blocked for IP: {ip_address}")
+                    record_flagged_inputs(user, ip_address)
+                    block_ip(ip_address, MODEL_BLOCK_REASON, base_seconds=BLOCK_BASE_SECONDS)
+                    attempt_info = f"User ID: {user.id if user else 'Unknown'}, Email: {email}, Time: {now_utc.strftime('%d-%m-%Y %I:%M:%S %p')}, IP: {ip_address}"
+                    send_email(user.email, attempt_info, dedupe_key=ip_address)
+                    logger.warning("Malicious attempt blocked for IP: %s", ip_address)
                     return render_template('malicious_alert.html')
                 else:
                     flash('Invalid email or password.', 'danger')
         else:
             # Check for non-existent user
-            result = check_login_attempt(None, request)
+            with span('model'):
+                result = run_cpu_bound(check_login_attempt, None, request._get_current_object(), velocity)
+            login_verdicts.inc((result, loaded_version()))
             is_malicious = result == 'malicious'
             is_suspicious = result == 'suspicious'
             
             if is_malicious:
-                block_ip(ip_address, "Malicious login attempt detected")
+                record_flagged_inputs(None, ip_address)
+                block_ip(ip_address, MODEL_BLOCK_REASON, base_seconds=BLOCK_BASE_SECONDS)
+                logger.warning("Malicious attempt blocked for IP: %s", ip_address)
                 flash('Login failed. Check your email or password.', 'danger')
             else:
                 flash('Invalid email or password.', 'danger')
     return render_template('login.html')
 
+ACTIVITY_PAGE_SIZE = int(os.getenv('ACTIVITY_PAGE_SIZE', '20'))
+ACTIVITY_RECENT_ATTEMPTS = 10
+
+def encode_cursor(timestamp, key):
+    return f"{timestamp.isoformat()}|{key}"
+
+def decode_cursor(value):
+    # Cursors are "<timestamp>|<tie-breaker>" taken from the last row of the previous page
+    timestamp, sep, key = value.partition('|')
+    try:
+        if not sep:
+            raise ValueError
+        return datetime.fromisoformat(timestamp), key
+    except ValueError:
+        abort(400)
+
+def as_utc(timestamp):
+    if timestamp is not None and timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def recent_attempts_since(user_id, ips):
+    """
+    Per IP, the start of the oldest day still needed for its ACTIVITY_RECENT_ATTEMPTS
+    latest attempts, found by walking the daily rollups back from the newest day.
+    """
+    bucket = LoginAttemptDaily.bucket
+    running = func.sum(LoginAttemptDaily.attempts).over(
+        partition_by=LoginAttemptDaily.ip_address, order_by=bucket.desc()).label('running')
+    days = db.session.query(LoginAttemptDaily.ip_address, bucket, LoginAttemptDaily.attempts, running).filter(
+        LoginAttemptDaily.user_id == user_id,
+        LoginAttemptDaily.ip_address.in_(ips)
+    ).subquery()
+    # A day is needed while the newer days alone hold fewer attempts than will be shown
+    return dict(db.session.query(days.c.ip_address, func.min(days.c.bucket)).filter(
+        days.c.running - days.c.attempts < ACTIVITY_RECENT_ATTEMPTS
+    ).group_by(days.c.ip_address).all())
+
 @app.route('/activity')
 def activity():
     if 'user_id' not in session:
@@ -267,24 +616,120 @@ def activity():
         return redirect(url_for('login'))
     user_id = session['user_id']
     user = User.query.get(user_id)
-    attempts = LoginAttempt.query.filter_by(user_id=user_id).all()
-    blocked_ips = BlockedIP.query.all()
+    # Make this worker's pending attempts visible before reading them back
+    attempt_buffer.flush()
+
+    # One row per IP, newest activity first, summed from the daily rollups rather than raw attempts
+    ip_key = LoginAttemptDaily.ip_address
+    last_seen = func.max(LoginAttemptDaily.last_seen)
+    query = db.session.query(
+        ip_key.label('ip_address'),
+        func.sum(LoginAttemptDaily.attempts).label('attempts'),
+        func.min(LoginAttemptDaily.first_seen).label('first_seen'),
+        last_seen.label('last_seen'),
+        func.sum(LoginAttemptDaily.malicious).label('malicious'),
+        func.sum(LoginAttemptDaily.suspicious).label('suspicious')
+    ).filter(LoginAttemptDaily.user_id == user_id).group_by(ip_key)
+    after = request.args.get('after')
+    if after:
+        after_seen, after_ip = decode_cursor(after)
+        query = query.having(or_(last_seen < after_seen, and_(last_seen == after_seen, ip_key < after_ip)))
+    groups = query.order_by(last_seen.desc(), ip_key.desc()).limit(ACTIVITY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(groups) > ACTIVITY_PAGE_SIZE:
+        groups = groups[:ACTIVITY_PAGE_SIZE]
+        next_cursor = encode_cursor(groups[-1].last_seen, groups[-1].ip_address)
+
+    # Latest few attempts for each IP on this page, in a single query, and counts for the last 24 hours
+    recent = {}
+    last_day = {}
+    if groups:
+        ips = [group.ip_address for group in groups]
+        since = (datetime.now(timezone.utc) - timedelta(hours=24)).replace(tzinfo=None)
+        last_day = dict(db.session.query(LoginAttemptHourly.ip_address, func.sum(LoginAttemptHourly.attempts)).filter(
+            LoginAttemptHourly.user_id == user_id,
+            LoginAttemptHourly.ip_address.in_(ips),
+            LoginAttemptHourly.bucket >= since.replace(minute=0, second=0, microsecond=0)
+        ).group_by(LoginAttemptHourly.ip_address).all())
+
+        # Each IP's latest attempts come from their own ORDER BY ... LIMIT on the (ip_address, timestamp)
+        # index, bounded by the days the rollups say hold them, so neither the user's whole history
+        # nor partitions outside that range are read
+        oldest_day = recent_attempts_since(user_id, ips)
+        members = []
+        for group in groups:
+            member = select(LoginAttempt).filter(
+                LoginAttempt.user_id == user_id,
+                LoginAttempt.ip_address == group.ip_address if group.ip_address else LoginAttempt.ip_address.is_(None),
+                LoginAttempt.timestamp <= group.last_seen
+            )
+            if group.ip_address in oldest_day:
+                member = member.filter(LoginAttempt.timestamp >= oldest_day[group.ip_address])
+            members.append(select(member.order_by(LoginAttempt.timestamp.desc(), LoginAttempt.id.desc())
+                                  .limit(ACTIVITY_RECENT_ATTEMPTS).subquery()))
+        latest = union_all(*members).subquery()
+        recent_attempt = aliased(LoginAttempt, latest)
+        attempts = db.session.query(recent_attempt).order_by(
+            recent_attempt.timestamp.desc(), recent_attempt.id.desc()).all()
+        for attempt in attempts:
+            recent.setdefault(attempt.ip_address or '', []).append(attempt)
+
+    ist = pytz.timezone('Asia/Kolkata')
+    return render_template('activity.html', user=user, groups=groups, recent=recent, last_day=last_day, next_cursor=next_cursor,
+                           blocked_match=blocked_ip_cache.match, as_utc=as_utc, ist=ist, admin=is_admin(user))
+
+@app.route('/activity/ip')
+def activity_ip():
+    if 'user_id' not in session:
+        flash('Please log in first.', 'danger')
+        return redirect(url_for('login'))
+    user_id = session['user_id']
+    user = User.query.get(user_id)
+    ip_address = request.args.get('address', '')
+    attempt_buffer.flush()
+
+    # Keyset pagination on (timestamp, id) so deep pages cost the same as the first
+    query = LoginAttempt.query.filter(
+        LoginAttempt.user_id == user_id,
+        LoginAttempt.ip_address == ip_address if ip_address else LoginAttempt.ip_address.is_(None)
+    )
+    before = request.args.get('before')
+    if before:
+        before_time, before_id = decode_cursor(before)
+        if not before_id.isdigit():
+            abort(400)
+        query = query.filter(or_(
+            LoginAttempt.timestamp < before_time,
+            and_(LoginAttempt.timestamp == before_time, LoginAttempt.id < int(before_id))
+        ))
+    attempts = query.order_by(LoginAttempt.timestamp.desc(), LoginAttempt.id.desc()).limit(ACTIVITY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(attempts) > ACTIVITY_PAGE_SIZE:
+        attempts = attempts[:ACTIVITY_PAGE_SIZE]
+        next_cursor = encode_cursor(attempts[-1].timestamp, attempts[-1].id)
+
     ist = pytz.timezone('Asia/Kolkata')
-    # Ensure all timestamps are UTC-aware
-    for attempt in attempts:
-        if attempt.timestamp and attempt.timestamp.tzinfo is None:
-            attempt.timestamp = attempt.timestamp.replace(tzinfo=timezone.utc)
-    return render_template('activity.html', user=user, attempts=attempts, blocked_ips=blocked_ips, ist=ist)
+    return render_template('activity_ip.html', user=user, ip_address=ip_address, attempts=attempts,
+                           next_cursor=next_cursor, block=blocked_ip_cache.match(ip_address), as_utc=as_utc, ist=ist)
 
-@app.route('/block_ip/<ip_address>', methods=['POST'])
+@app.route('/block_ip/<path:ip_address>', methods=['POST'])
 def block_ip_route(ip_address):
     if 'user_id' not in session:
         flash('Please log in first.', 'danger')
         return redirect(url_for('login'))
     
-    # Check if IP is already blocked
+    network = parse_network(ip_address)
+    if network is None:
+        flash(f'{ip_address} is not a valid IP address or CIDR block.', 'danger')
+        return redirect(url_for('activity'))
+    if network.prefixlen < BLOCK_MIN_PREFIX[network.version]:
+        flash(f'{network} is too broad to block; use a /{BLOCK_MIN_PREFIX[network.version]} or narrower.', 'danger')
+        return redirect(url_for('activity'))
+    ip_address = format_network(network)
+
+    # A temporary or expired block is turned into a permanent one
     existing_block = BlockedIP.query.filter_by(ip_address=ip_address).first()
-    if existing_block:
+    if existing_block and existing_block.expires_at is None:
         flash('IP is already blocked.', 'warning')
         return redirect(url_for('activity'))
     
@@ -293,23 +738,81 @@ def block_ip_route(ip_address):
     flash(f'IP {ip_address} has been blocked.', 'success')
     return redirect(url_for('activity'))
 
-@app.route('/unblock_ip/<ip_address>', methods=['POST'])
+@app.route('/unblock_ip/<path:ip_address>', methods=['POST'])
 def unblock_ip_route(ip_address):
     if 'user_id' not in session:
         flash('Please log in first.', 'danger')
         return redirect(url_for('login'))
     
+    network = parse_network(ip_address)
+    if network:
+        ip_address = format_network(network)
+
     # Find and remove the block
     blocked = BlockedIP.query.filter_by(ip_address=ip_address).first()
     if blocked:
         db.session.delete(blocked)
-        db.session.commit()
+        commit('unblock_ip')
+        blocked_ip_cache.invalidate()
         flash(f'IP {ip_address} has been unblocked.', 'success')
     else:
         flash('IP was not blocked.', 'warning')
     
     return redirect(url_for('activity'))
 
+@app.route('/admin/flagged/<int:flagged_id>/label', methods=['POST'])
+def label_flagged_input(flagged_id):
+    if 'user_id' not in session:
+        flash('Please log in first.', 'danger')
+        return redirect(url_for('login'))
+
+    # Labels train the served model, so only admins may set them
+    if not is_admin(db.session.get(User, session['user_id'])):
+        abort(403)
+    flagged = db.session.get(FlaggedInput, flagged_id)
+    if flagged is None:
+        abort(404)
+    label = request.form.get('label')
+    if label not in ('malicious', 'benign'):
+        abort(400)
+
+    # Picked up by the next MODELS.online_learning run
+    flagged.label = 1 if label == 'malicious' else 0
+    flagged.labelled_at = datetime.now(timezone.utc)
+    commit('label_flagged_input')
+    flash('Label saved; the detector will learn from this input.', 'success')
+    return redirect(url_for('flagged_inputs'))
+
+@app.route('/admin/flagged')
+def flagged_inputs():
+    if 'user_id' not in session:
+        flash('Please log in first.', 'danger')
+        return redirect(url_for('login'))
+    user = db.session.get(User, session['user_id'])
+    if not is_admin(user):
+        abort(403)
+
+    # Unlabelled inputs from every login, newest first
+    query = FlaggedInput.query.filter(FlaggedInput.label.is_(None))
+    before = request.args.get('before')
+    if before:
+        before_time, before_id = decode_cursor(before)
+        if not before_id.isdigit():
+            abort(400)
+        query = query.filter(or_(
+            FlaggedInput.timestamp < before_time,
+            and_(FlaggedInput.timestamp == before_time, FlaggedInput.id < int(before_id))
+        ))
+    flagged = query.order_by(FlaggedInput.timestamp.desc(), FlaggedInput.id.desc()).limit(ACTIVITY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(flagged) > ACTIVITY_PAGE_SIZE:
+        flagged = flagged[:ACTIVITY_PAGE_SIZE]
+        next_cursor = encode_cursor(flagged[-1].timestamp, flagged[-1].id)
+
+    ist = pytz.timezone('Asia/Kolkata')
+    return render_template('flagged_inputs.html', user=user, flagged=flagged, next_cursor=next_cursor,
+                           as_utc=as_utc, ist=ist)
+
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
@@ -319,43 +822,18 @@ def logout():
 @app.route('/blocked')
 def blocked():
     ip = get_client_ip()
-    blocked = BlockedIP.query.filter_by(ip_address=ip).first()
-    reason = blocked.reason if blocked else "Unknown"
+    reason = blocked_ip_cache.lookup(ip) or "Unknown"
     return render_template('blocked.html', reason=reason), 403
 
 def get_client_ip():
     """
-    Get the real client IP address by checking various headers.
-    Returns the first non-private IP address found.
+    Client address for the current request, resolved once and cached on flask.g.
+    Proxy headers are only believed when the connection comes from TRUSTED_PROXIES.
     """
-    # Debug logging
-    print("\n=== IP Detection Debug Info ===")
-    print(f"Remote Addr: {request.remote_addr}")
-    print("All Headers:")
-    for header, value in request.headers.items():
-        print(f"{header}: {value}")
-    
-    # List of headers to check for IP address
-    headers = [
-        'X-Forwarded-For',
-        'X-Real-IP',
-        'CF-Connecting-IP',  # Cloudflare
-        'True-Client-IP',    # Akamai
-        'X-Client-IP'        # Custom
-    ]
-    
-    # Check each header
-    for header in headers:
-        ip = request.headers.get(header)
-        if ip:
-            # X-Forwarded-For can contain multiple IPs
-            if header == 'X-Forwarded-For':
-                ip = ip.split(',')[0].strip()
-            print(f"Found IP from {header}: {ip}")
-            return ip
-    
-    print("No IP found in headers, using remote_addr")
-    return request.remote_addr
+    if 'client_ip' not in g:
+        g.client_ip = client_ip_resolver.resolve(request.environ.get('REMOTE_ADDR'), request.headers)
+        logger.debug("Client IP %s (peer %s)", g.client_ip, request.environ.get('REMOTE_ADDR'))
+    return g.client_ip
 
 if __name__ == '__main__':
     app.run(debug=True)
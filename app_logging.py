@@ -0,0 +1,73 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Application log records go through a bounded in-memory queue and are written
+# to stderr by a background thread, so a request never waits on a log write.
+#
+#   LOG_LEVEL=INFO               DEBUG, INFO, WARNING, ...
+#   LOG_DEBUG_SAMPLE_RATE=0.01   fraction of DEBUG records kept when LOG_LEVEL=DEBUG
+#   LOG_QUEUE_SIZE=10000         records waiting to be written before new ones are dropped
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'
+
+_handler = None
+_listener = None
+
+
+class DropWhenFullQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DebugSampler(logging.Filter):
+    """Keeps every record above DEBUG and a random `rate` fraction of DEBUG ones."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def _start_listener():
+    global _listener
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _handler.queue = queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    _listener = logging.handlers.QueueListener(_handler.queue, stream)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Route the root logger through the queue; safe to call more than once."""
+    global _handler
+    if _handler is not None:
+        return _handler
+    _handler = DropWhenFullQueueHandler(None)
+    _handler.addFilter(DebugSampler(float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01'))))
+    _start_listener()
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.addHandler(_handler)
+    atexit.register(_stop_listener)
+    # The writer thread does not survive a fork (gunicorn --preload); start a new one in the child
+    os.register_at_fork(after_in_child=_start_listener)
+    return _handler
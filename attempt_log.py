@@ -0,0 +1,144 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptBuffer:
+    """
+    Write-behind buffer for login attempt rows.
+
+    Requests hand rows (plain dicts) to `add`, which returns immediately. A
+    background thread writes them in bulk through `write_rows` whenever
+    `max_rows` are pending or `flush_interval` seconds have passed. If a bulk
+    write fails, the rows are appended to a local spool file and replayed
+    before the next flush, and pending rows are flushed at interpreter exit,
+    so a database hiccup or a worker restart does not lose attempts.
+
+    A spooled batch that fails again is retried row by row. Rows failing with
+    one of `bad_row_errors` (the row itself is bad, e.g. its user was deleted)
+    and unreadable spool lines are moved to `<spool_path>.quarantine`, so one
+    bad row cannot hold back everything spooled after it.
+    """
+
+    def __init__(self, write_rows, spool_path, max_rows=100, flush_interval=1.0, enabled=True, bad_row_errors=()):
+        self.write_rows = write_rows
+        self.spool_path = spool_path
+        self.quarantine_path = f'{spool_path}.quarantine'
+        self.bad_row_errors = bad_row_errors
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, row):
+        if not self.enabled:
+            self.write_rows([row])
+            return
+        self._ensure_started()
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything pending now, including rows left in the spool file."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            self._replay_spool()
+            if rows:
+                try:
+                    self.write_rows(rows)
+                except Exception as e:
+                    logger.error("Bulk insert of %d login attempts failed (%s); spooling to %s", len(rows), e, self.spool_path)
+                    self._spool(rows)
+
+    def _ensure_started(self):
+        # The first buffered row starts the flusher, so it runs in the worker holding the rows
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='attempt-buffer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _spool(self, rows, path=None):
+        self._append(path or self.spool_path,
+                     [json.dumps(row, default=lambda value: {'__datetime__': value.isoformat()}) + '\n' for row in rows])
+
+    def _append(self, path, lines):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        # Claim the file first so rows spooled during the replay are kept for next time
+        replay_path = f'{self.spool_path}.{os.getpid()}.{time.time_ns()}'
+        try:
+            os.rename(self.spool_path, replay_path)
+        except FileNotFoundError:
+            return  # another worker claimed it
+        rows, unreadable = [], []
+        with open(replay_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line, object_hook=_decode_datetime)
+                except ValueError:
+                    row = None
+                if isinstance(row, dict):
+                    rows.append(row)
+                else:
+                    unreadable.append(line if line.endswith('\n') else line + '\n')
+        if unreadable:
+            logger.error("Moving %d unreadable spooled login attempts to %s", len(unreadable), self.quarantine_path)
+            self._append(self.quarantine_path, unreadable)
+        if rows:
+            try:
+                self.write_rows(rows)
+            except Exception as e:
+                logger.error("Replaying %d spooled login attempts failed (%s); retrying one by one", len(rows), e)
+                self._replay_rows(rows)
+        os.remove(replay_path)
+
+    def _replay_rows(self, rows):
+        for index, row in enumerate(rows):
+            try:
+                self.write_rows([row])
+            except self.bad_row_errors as e:
+                logger.error("Moving a spooled login attempt that cannot be written (%s) to %s", e, self.quarantine_path)
+                self._spool([row], self.quarantine_path)
+            except Exception as e:
+                # Not the row's fault; keep it and everything after it for the next replay
+                logger.error("Replaying spooled login attempts failed (%s); %d left in the spool", e, len(rows) - index)
+                self._spool(rows[index:])
+                return
+
+
+def _decode_datetime(value):
+    if '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    return value
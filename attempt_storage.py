@@ -0,0 +1,265 @@
+import argparse
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, literal, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import ClauseElement
+
+# Storage upkeep for login_attempts. On PostgreSQL the table is range
+# partitioned by timestamp (day or month, see the login_attempt_partitions
+# migration), so retention drops whole partitions instead of deleting rows;
+# elsewhere it is a plain table and old rows are deleted in small batches.
+# Hourly and daily counts per user and IP are kept in rollup tables, updated
+# in the same transaction as each bulk insert, and outlive the raw rows.
+#
+#   python attempt_storage.py                 # create upcoming partitions, apply retention
+#   python attempt_storage.py --interval 3600 # keep doing so every hour
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'login_attempts'
+DEFAULT_PARTITION = 'login_attempts_default'
+
+# Must match the value the partitioning migration ran with
+PARTITION_INTERVAL = os.getenv('ATTEMPT_PARTITION_INTERVAL', 'month')
+PARTITIONS_AHEAD = int(os.getenv('ATTEMPT_PARTITIONS_AHEAD', '3'))
+# Days of raw attempts, hourly and daily rollups to keep (0 keeps everything)
+RETENTION_DAYS = int(os.getenv('ATTEMPT_RETENTION_DAYS', '90'))
+HOURLY_RETENTION_DAYS = int(os.getenv('ATTEMPT_HOURLY_ROLLUP_RETENTION_DAYS', '35'))
+DAILY_RETENTION_DAYS = int(os.getenv('ATTEMPT_DAILY_ROLLUP_RETENTION_DAYS', '0'))
+DELETE_BATCH_SIZE = int(os.getenv('ATTEMPT_DELETE_BATCH_SIZE', '5000'))
+
+
+def utc_naive(timestamp):
+    # Timestamps are stored as naive UTC
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def bucket_start(timestamp, granularity):
+    timestamp = utc_naive(timestamp)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_rows(rows, granularity):
+    """Counts of attempt rows per (user_id, ip_address, bucket), sorted by key."""
+    rollups = {}
+    for row in rows:
+        timestamp = utc_naive(row['timestamp'])
+        key = (row['user_id'], row.get('ip_address') or '', bucket_start(timestamp, granularity))
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = {
+                'user_id': key[0], 'ip_address': key[1], 'bucket': key[2],
+                'attempts': 0, 'failed': 0, 'malicious': 0, 'suspicious': 0,
+                'first_seen': timestamp, 'last_seen': timestamp
+            }
+        rollup['attempts'] += 1
+        rollup['failed'] += row.get('status') == 'Failed'
+        rollup['malicious'] += bool(row.get('is_malicious'))
+        rollup['suspicious'] += bool(row.get('is_suspicious'))
+        rollup['first_seen'] = min(rollup['first_seen'], timestamp)
+        rollup['last_seen'] = max(rollup['last_seen'], timestamp)
+    # A fixed order keeps concurrent upserts from different workers from deadlocking
+    return [rollups[key] for key in sorted(rollups)]
+
+
+def upsert_rollups(session, table, rollups):
+    if not rollups:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        statement = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        current, added = table.c, statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'ip_address', 'bucket'],
+            set_={
+                'attempts': current.attempts + added.attempts,
+                'failed': current.failed + added.failed,
+                'malicious': current.malicious + added.malicious,
+                'suspicious': current.suspicious + added.suspicious,
+                # Spooled rows can be replayed out of order
+                'first_seen': _least(added.first_seen, current.first_seen),
+                'last_seen': _greatest(added.last_seen, current.last_seen)
+            }
+        )
+        session.execute(statement, rollups)
+        return
+
+    # Other databases: update in place, insert the buckets that did not exist yet
+    for rollup in rollups:
+        key = (table.c.user_id == rollup['user_id']) & (table.c.ip_address == rollup['ip_address']) \
+            & (table.c.bucket == rollup['bucket'])
+        updated = session.execute(table.update().where(key).values(
+            attempts=table.c.attempts + rollup['attempts'],
+            failed=table.c.failed + rollup['failed'],
+            malicious=table.c.malicious + rollup['malicious'],
+            suspicious=table.c.suspicious + rollup['suspicious'],
+            first_seen=_least(rollup['first_seen'], table.c.first_seen),
+            last_seen=_greatest(rollup['last_seen'], table.c.last_seen)
+        ))
+        if updated.rowcount == 0:
+            session.execute(table.insert(), [rollup])
+
+
+def _least(a, b):
+    # LEAST/GREATEST are not available on SQLite; `a` may be a plain value
+    a = a if isinstance(a, ClauseElement) else literal(a)
+    return case((a < b, a), else_=b)
+
+
+def _greatest(a, b):
+    a = a if isinstance(a, ClauseElement) else literal(a)
+    return case((a > b, a), else_=b)
+
+
+def add_to_rollups(session, rows, hourly, daily):
+    upsert_rollups(session, hourly, rollup_rows(rows, 'hour'))
+    upsert_rollups(session, daily, rollup_rows(rows, 'day'))
+
+
+# Partitions (PostgreSQL only)
+
+def period_start(moment, interval=None):
+    moment = utc_naive(moment)
+    if (interval or PARTITION_INTERVAL) == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start, interval=None):
+    if (interval or PARTITION_INTERVAL) == 'day':
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start, interval=None):
+    return f"{TABLE}_p{start.strftime('%Y%m%d' if (interval or PARTITION_INTERVAL) == 'day' else '%Y%m')}"
+
+
+def is_partitioned(connection):
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {'table': TABLE}).scalar() is not None
+
+
+def partitions(connection):
+    """(name, upper bound) of every range partition; the default partition is left out."""
+    found = []
+    for name, bound in connection.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table)"), {'table': TABLE}):
+        match = re.search(r"TO \('([^']+)'\)", bound)
+        if match:
+            found.append((name, datetime.fromisoformat(match.group(1))))
+    return sorted(found, key=lambda partition: partition[1])
+
+
+def ensure_partitions(connection, now=None, ahead=None):
+    """Create the partitions from the current period through `ahead` periods from now."""
+    start = period_start(now or datetime.now(timezone.utc))
+    created = []
+    for _ in range((PARTITIONS_AHEAD if ahead is None else ahead) + 1):
+        end = next_period(start)
+        name = partition_name(start)
+        if connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is None:
+            _create_partition(connection, name, start, end)
+            created.append(name)
+        start = end
+    return created
+
+
+def _create_partition(connection, name, start, end):
+    bounds = {'start': start, 'end': end}
+    stray = connection.execute(text(
+        f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end"), bounds).scalar()
+    if not stray:
+        connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{start}') TO ('{end}')"))
+        return
+    # Rows that landed in the default partition would conflict with the new range; move them over
+    logger.warning("Moving %d login attempts from %s into new partition %s", stray, DEFAULT_PARTITION, name)
+    connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{start}') TO ('{end}')"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {TABLE} SELECT * FROM moved"), bounds)
+    connection.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+# Retention
+
+def drop_expired_attempts(connection, cutoff):
+    """Remove raw attempts older than `cutoff`; returns (partitions dropped, rows deleted)."""
+    if is_partitioned(connection):
+        dropped = []
+        for name, end in partitions(connection):
+            if end <= cutoff:
+                connection.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        # Only stragglers outside every range end up in the default partition
+        deleted = connection.execute(text(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {'cutoff': cutoff}).rowcount
+        return dropped, deleted
+
+    deleted = 0
+    while True:
+        # Small batches keep each transaction and lock short on a plain table
+        batch = connection.execute(text(
+            f"DELETE FROM {TABLE} WHERE id IN (SELECT id FROM {TABLE} WHERE timestamp < :cutoff LIMIT :limit)"),
+            {'cutoff': cutoff, 'limit': DELETE_BATCH_SIZE}).rowcount
+        connection.commit()
+        deleted += batch
+        if batch < DELETE_BATCH_SIZE:
+            return [], deleted
+
+
+def prune_rollups(connection, table, cutoff):
+    return connection.execute(table.delete().where(table.c.bucket < cutoff)).rowcount
+
+
+def maintain(engine, hourly, daily, now=None):
+    now = utc_naive(now or datetime.now(timezone.utc))
+    with engine.connect() as connection:
+        if is_partitioned(connection):
+            created = ensure_partitions(connection, now)
+            connection.commit()
+            if created:
+                logger.info("Created partitions %s", ', '.join(created))
+        if RETENTION_DAYS:
+            dropped, deleted = drop_expired_attempts(connection, now - timedelta(days=RETENTION_DAYS))
+            connection.commit()
+            logger.info("Retention (%d days): dropped %d partitions%s, deleted %d rows", RETENTION_DAYS,
+                        len(dropped), f" ({', '.join(dropped)})" if dropped else '', deleted)
+        for table, days in ((hourly, HOURLY_RETENTION_DAYS), (daily, DAILY_RETENTION_DAYS)):
+            if days:
+                pruned = prune_rollups(connection, table, now - timedelta(days=days))
+                connection.commit()
+                logger.info("Pruned %d %s rows older than %d days", pruned, table.name, days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create upcoming login_attempts partitions and apply retention.')
+    parser.add_argument('--interval', type=float, default=0, help='Repeat every N seconds (default: run once)')
+    args = parser.parse_args()
+
+    from app import app, db, LoginAttemptHourly, LoginAttemptDaily
+    while True:
+        with app.app_context():
+            maintain(db.engine, LoginAttemptHourly.__table__, LoginAttemptDaily.__table__)
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
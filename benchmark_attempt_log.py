@@ -0,0 +1,75 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Compares logging login attempts with a commit per row (the old /login
+# behaviour) against the write-behind AttemptBuffer. Uses DATABASE_URL if set,
+# otherwise a throwaway SQLite file.
+#
+#   python benchmark_attempt_log.py --rows 5000
+#   DATABASE_URL=postgresql://... python benchmark_attempt_log.py
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+from app import app, db, User, LoginAttempt, AttemptBuffer, insert_login_attempts  # noqa: E402
+
+
+def attempt_row(user_id, i):
+    return dict(
+        user_id=user_id,
+        status='Failed',
+        is_malicious=False,
+        is_suspicious=True,
+        ip_address=f'198.51.100.{i % 256}',
+        timestamp=datetime.now(timezone.utc)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-request commits vs buffered attempt logging.')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--buffer-size', type=int, default=100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=f'bench-{time.time_ns()}@example.com', username='bench', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        start = time.perf_counter()
+        for i in range(args.rows):
+            db.session.add(LoginAttempt(**attempt_row(user_id, i)))
+            db.session.commit()
+        per_request = time.perf_counter() - start
+
+    buffer = AttemptBuffer(
+        insert_login_attempts,
+        os.path.join(tempfile.mkdtemp(), 'spool.jsonl'),
+        max_rows=args.buffer_size,
+        flush_interval=0.5
+    )
+    start = time.perf_counter()
+    for i in range(args.rows):
+        buffer.add(attempt_row(user_id, i))
+    enqueue = time.perf_counter() - start
+    buffer.flush()
+    buffered = time.perf_counter() - start
+
+    with app.app_context():
+        stored = LoginAttempt.query.filter_by(user_id=user_id).count()
+        database = db.engine.url.render_as_string(hide_password=True)
+    if stored != 2 * args.rows:
+        raise SystemExit(f"Expected {2 * args.rows} rows, found {stored}")
+
+    print(f"Database: {database}")
+    print(f"Commit per request: {args.rows / per_request:10.0f} rows/s  ({per_request / args.rows * 1e3:.3f}ms per login)")
+    print(f"Buffered flush:     {args.rows / buffered:10.0f} rows/s  ({enqueue / args.rows * 1e6:.1f}us per login on the request path)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import ipaddress
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from blocklist import BlockListCache, utcnow
+
+# Builds a block list of random IPv4/IPv6 prefixes, some of them temporary
+# blocks that have already expired, checks longest-prefix matches against a
+# brute-force scan on a sample, and times lookups.
+#
+#   python benchmark_blocklist.py --prefixes 100000
+
+
+def random_networks(count, rng):
+    networks = set()
+    while len(networks) < count:
+        if rng.random() < 0.8:
+            prefix = rng.choice([16, 20, 24, 24, 24, 28, 32, 32])
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+        else:
+            prefix = rng.choice([32, 48, 56, 64, 64, 128])
+            address = ipaddress.IPv6Address(rng.getrandbits(128))
+        networks.add(ipaddress.ip_network(f'{address}/{prefix}', strict=False))
+    return list(networks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CIDR block list lookups.')
+    parser.add_argument('--prefixes', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--verify', type=int, default=500, help='Lookups checked against a brute-force scan')
+    parser.add_argument('--expired', type=float, default=0.2, help='Fraction of blocks that have expired')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    networks = random_networks(args.prefixes, rng)
+    now = utcnow()
+    # Expired rows are still present, as between a block running out and the sweeper reloading the cache
+    expires = [now - timedelta(hours=1) if rng.random() < args.expired else rng.choice([None, now + timedelta(days=1)])
+               for _ in networks]
+    rows = [(str(network), f'block {i}', expires_at) for i, (network, expires_at) in enumerate(zip(networks, expires))]
+    active = [network for network, expires_at in zip(networks, expires) if expires_at is None or expires_at > now]
+
+    version_path = os.path.join(tempfile.mkdtemp(), 'blocklist.version')
+    cache = BlockListCache(lambda: rows, version_path, ttl=3600)
+    start = time.perf_counter()
+    cache.lookup('127.0.0.1')
+    print(f"Loaded {len(rows)} prefixes in {time.perf_counter() - start:.2f}s "
+          f"({len(cache._tries[4].values) + len(cache._tries[6].values)} trie nodes)")
+
+    # Half the probes fall inside a blocked prefix, half are random
+    probes = []
+    for _ in range(args.lookups):
+        if rng.random() < 0.5:
+            network = rng.choice(networks)
+            offset = rng.getrandbits(network.max_prefixlen - network.prefixlen) if network.prefixlen < network.max_prefixlen else 0
+            probes.append(str(network.network_address + offset))
+        else:
+            probes.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+
+    for probe in probes[:args.verify]:
+        address = ipaddress.ip_address(probe)
+        covering = [n for n in active if n.version == address.version and address in n]
+        expected = str(max(covering, key=lambda n: n.prefixlen)) if covering else None
+        found = cache.match(probe)
+        if (found[0] if found else None) != expected:
+            raise SystemExit(f"Mismatch for {probe}: expected {expected}, got {found}")
+    print(f"Verified {args.verify} lookups against a brute-force scan")
+
+    start = time.perf_counter()
+    hits = sum(1 for probe in probes if cache.lookup(probe))
+    elapsed = time.perf_counter() - start
+    print(f"{len(probes)} lookups ({hits} blocked): {elapsed / len(probes) * 1e6:.2f}us per lookup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# End-to-end latency benchmark for /login and the before_request hook.
+# Drives benign, failed and SQLi-payload logins drawn from MODELS/SQLiV3.csv
+# through the Flask test client at one or more concurrency levels, collects the
+# timing spans the app records for each stage (client IP, block list lookup,
+# rate limit, user lookup, password verification, model, attempt logging,
+# block, alert, render) and reports p50/p95/p99 and throughput. Results are
+# written as JSON so runs on different commits can be compared.
+#
+#   python benchmark_login.py --requests 400 --concurrency 1,8
+#   DATABASE_URL=postgresql://localhost/sentinel_bench python benchmark_login.py
+#   python benchmark_login.py --compare benchmark_results/login-abc1234.json
+#
+# Alert emails are stubbed out, and rate limits are lifted so every request
+# reaches the model. Each request comes from a random address in
+# 198.18.0.0/15, the benchmarking range, so SQLi-triggered blocks do not hit
+# later requests.
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+for limit in ('RATE_LIMIT_IP', 'RATE_LIMIT_EMAIL', 'RATE_LIMIT_SUBNET'):
+    os.environ.setdefault(limit, '1000000000')
+
+import app as application  # noqa: E402
+import timing  # noqa: E402
+from passwords import hash_password  # noqa: E402
+
+KINDS = ('benign', 'failed', 'sqli')
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    pick = lambda fraction: values[min(int(len(values) * fraction), len(values) - 1)]  # noqa: E731
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values) * 1e3,
+        'p50_ms': pick(0.50) * 1e3,
+        'p95_ms': pick(0.95) * 1e3,
+        'p99_ms': pick(0.99) * 1e3
+    }
+
+
+def load_payloads():
+    df = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1', usecols=['Sentence', 'Label'])
+    labels = pd.to_numeric(df['Label'], errors='coerce')
+    sentences = df['Sentence'].fillna('').astype(str)
+    return sentences[labels == 0].tolist(), sentences[labels == 1].tolist()
+
+
+def create_users(count):
+    users = []
+    with application.app.app_context():
+        application.db.create_all()
+        for i in range(count):
+            email = f'bench-{time.time_ns()}-{i}@example.com'
+            password = f'password-{i}'
+            application.db.session.add(application.User(email=email, username=f'bench{i}', password=hash_password(password)))
+            users.append((email, password))
+        application.db.session.commit()
+    return users
+
+
+def run_level(concurrency, requests, users, benign, sqli, weights, seed):
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(requests):
+        kind = rng.choices(KINDS, weights=weights)[0]
+        email, password = rng.choice(users)
+        if kind == 'failed':
+            password = rng.choice(benign)
+        elif kind == 'sqli':
+            password = rng.choice(sqli)
+        address = f'198.{18 + rng.randrange(2)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+        plan.append((kind, email, password, address))
+
+    totals = {kind: [] for kind in KINDS}
+    stages = {}
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+    next_index = iter(range(len(plan)))
+
+    def listener(name, seconds):
+        spans = getattr(local, 'spans', None)
+        if spans is not None:
+            spans.append((name, seconds))
+
+    def worker():
+        client = application.app.test_client()
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            kind, email, password, address = plan[index]
+            local.spans = []
+            start = time.perf_counter()
+            response = client.post('/login', data={'email': email, 'password': password},
+                                   environ_base={'REMOTE_ADDR': address})
+            elapsed = time.perf_counter() - start
+            spans, local.spans = local.spans, None
+            client.get('/logout', environ_base={'REMOTE_ADDR': address})
+            with lock:
+                totals[kind].append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                for name, seconds in spans:
+                    stages.setdefault(name, []).append(seconds)
+
+    timing.add_listener(listener)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    try:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+    finally:
+        timing.remove_listener(listener)
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(plan),
+        'duration_s': duration,
+        'throughput_rps': len(plan) / duration,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'logins': {kind: summarize(values) for kind, values in totals.items()},
+        'all_logins': summarize([value for values in totals.values() for value in values]),
+        'stages': {name: summarize(values) for name, values in sorted(stages.items())}
+    }
+
+
+def print_level(level):
+    print(f"\nconcurrency {level['concurrency']}: {level['requests']} logins in {level['duration_s']:.1f}s "
+          f"= {level['throughput_rps']:.1f}/s  statuses {level['statuses']}")
+    print(f"  {'':18s} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [(f'login {kind}', stats) for kind, stats in level['logins'].items()]
+    rows += [('login (all)', level['all_logins'])]
+    rows += [(f'  {name}', stats) for name, stats in level['stages'].items()]
+    for label, stats in rows:
+        if stats['count']:
+            print(f"  {label:18s} {stats['count']:6d} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange in p95 against {baseline_path} ({baseline['meta'].get('commit')}):")
+    previous = {level['concurrency']: level for level in baseline['levels']}
+    for level in results['levels']:
+        old = previous.get(level['concurrency'])
+        if old is None:
+            continue
+        print(f"  concurrency {level['concurrency']}: throughput {old['throughput_rps']:.1f} -> {level['throughput_rps']:.1f}/s")
+        pairs = [('login (all)', old['all_logins'], level['all_logins'])]
+        pairs += [(name, old['stages'].get(name, {'count': 0}), stats) for name, stats in level['stages'].items()]
+        for label, before, after in pairs:
+            if before['count'] and after['count']:
+                change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+                print(f"    {label:18s} {before['p95_ms']:9.2f} -> {after['p95_ms']:9.2f}ms ({change:+.0f}%)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /login end to end with per-stage latency.')
+    parser.add_argument('--requests', type=int, default=300, help='Logins per concurrency level')
+    parser.add_argument('--concurrency', default='1,8', help='Comma-separated numbers of concurrent clients')
+    parser.add_argument('--mix', default='4,4,2', help='Weights of benign, failed and SQLi logins')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON results path (default benchmark_results/login-<commit>.json)')
+    parser.add_argument('--compare', help='Earlier JSON results to compare p95 latencies against')
+    args = parser.parse_args()
+
+    weights = [float(value) for value in args.mix.split(',')]
+    if len(weights) != len(KINDS):
+        parser.error('--mix needs three weights: benign,failed,sqli')
+
+    # Alerts are counted, not sent
+    sent = []
+    application.alert_dispatcher.send = lambda *a, **kw: sent.append(a[0]) or True
+
+    benign, sqli = load_payloads()
+    users = create_users(args.users)
+    # Warm up: load the model and fill lazily built caches outside the measurement
+    run_level(1, 5, users, benign, sqli, weights, args.seed + 1)
+
+    commit = git_commit()
+    with application.app.app_context():
+        database = application.db.engine.url.render_as_string(hide_password=True)
+    results = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': database,
+            'requests': args.requests,
+            'mix': dict(zip(KINDS, weights))
+        },
+        'levels': []
+    }
+    for index, concurrency in enumerate(int(value) for value in args.concurrency.split(',')):
+        # A different seed per level so addresses blocked by earlier SQLi logins are not reused
+        level = run_level(concurrency, args.requests, users, benign, sqli, weights, args.seed + 100 * (index + 1))
+        results['levels'].append(level)
+        print_level(level)
+    print(f"\nAlerts stubbed: {len(sent)}")
+
+    output = args.output or os.path.join('benchmark_results', f"login-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
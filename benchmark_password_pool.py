@@ -0,0 +1,78 @@
+import argparse
+import statistics
+import threading
+import time
+
+import passwords
+from passwords import HashPool, HashPoolBusy, _verify, hash_password
+
+# Floods password verification from many request threads, once hashing inline
+# and once through the process pool, while a probe thread times a cheap
+# request-sized piece of work (what /blocked would do). Reports verifications
+# per second, their latency, how many were shed with HashPoolBusy (429), and
+# probe latency.
+#
+#   python benchmark_password_pool.py --threads 32 --seconds 5
+
+
+def flood(verify, threads, seconds):
+    stored = hash_password('correct horse battery staple')
+    done = {'ok': 0, 'busy': 0}
+    latencies = []
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def client():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                verify(stored, 'correct horse battery staple')
+                outcome = 'ok'
+                latencies.append(time.perf_counter() - start)
+            except HashPoolBusy:
+                outcome = 'busy'
+                time.sleep(0.01)  # a rejected client backs off briefly, as with Retry-After
+            with lock:
+                done[outcome] += 1
+
+    probes = []
+
+    def probe():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            sum(i * i for i in range(2000))
+            probes.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)] + [threading.Thread(target=probe)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    probes.sort()
+    latencies.sort()
+    return (done, statistics.median(latencies), latencies[int(len(latencies) * 0.99)],
+            statistics.median(probes), probes[int(len(probes) * 0.99)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark inline vs pooled password verification under load.')
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent login requests')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=passwords.PASSWORD_POOL_SIZE or 1)
+    parser.add_argument('--max-pending', type=int, default=passwords.PASSWORD_POOL_MAX_PENDING)
+    args = parser.parse_args()
+
+    passwords.hash_pool = None
+    print(f"{args.threads} request threads for {args.seconds:.0f}s each")
+    pool = HashPool(args.workers, args.max_pending, timeout=60)
+    pool.run(_verify, hash_password(''), '')  # start the worker processes outside the measurement
+    for label, verify in (('inline', _verify), (f'pool x{args.workers}', lambda *a: pool.run(_verify, *a))):
+        done, verify_p50, verify_p99, probe_p50, probe_p99 = flood(verify, args.threads, args.seconds)
+        print(f"{label:10s} {done['ok'] / args.seconds:6.1f} verifications/s "
+              f"(p50 {verify_p50 * 1e3:6.0f}ms, p99 {verify_p99 * 1e3:6.0f}ms)  {done['busy']:6d} shed with 429  "
+              f"probe p50 {probe_p50 * 1e3:5.2f}ms, p99 {probe_p99 * 1e3:6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from loadtest import percentile
+
+# Throughput of the scoring sidecar (scoring_service.py). Starts it under
+# gunicorn (or uses --url), then posts batches of strings drawn from
+# MODELS/SQLiV3.csv mixed with plain emails and passwords over keep-alive
+# connections, and reports strings/sec and request latency per framing.
+#
+#   python benchmark_scoring_service.py --batch 100 --concurrency 4
+#   python benchmark_scoring_service.py --url http://127.0.0.1:8001 --framing json
+
+
+def load_strings(seed):
+    rng = random.Random(seed)
+    df = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1', usecols=['Sentence'])
+    sentences = [text for text in df['Sentence'].dropna().astype(str) if len(text) <= 4096]
+    # Mostly ordinary login fields, as a sidecar in front of a form would see
+    ordinary = [f'user{i}@example.com' for i in range(5000)] + [f'Passw0rd-{i}' for i in range(5000)]
+    return [rng.choice(sentences) if rng.random() < 0.3 else rng.choice(ordinary) for _ in range(100000)]
+
+
+def run(host, port, framing, batch, concurrency, seconds, strings):
+    if framing == 'msgpack':
+        encode, content_type = (lambda inputs: msgpack.packb({'inputs': inputs})), 'application/msgpack'
+    else:
+        encode, content_type = (lambda inputs: json.dumps({'inputs': inputs})), 'application/json'
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def client(offset):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        position = offset
+        while time.monotonic() < stop:
+            inputs = strings[position:position + batch]
+            position = (position + batch) % (len(strings) - batch)
+            body = encode(inputs)
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/v1/score', body=body,
+                                   headers={'Content-Type': content_type, 'Accept': content_type})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=60)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[status] = errors.get(status, 0) + 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i * len(strings) // concurrency,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'strings_per_s': len(latencies) * batch / duration,
+        'requests_per_s': len(latencies) / duration,
+        'p50': percentile(latencies, 0.50) if latencies else 0.0,
+        'p95': percentile(latencies, 0.95) if latencies else 0.0,
+        'errors': errors
+    }
+
+
+def warm_up(host, port, batch, concurrency, strings):
+    """Score every string once so each framing is measured against the same warm verdict cache."""
+    def client(offset):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        for start in range(offset * batch, len(strings), batch * concurrency):
+            connection.request('POST', '/v1/score', body=json.dumps({'inputs': strings[start:start + batch]}),
+                               headers={'Content-Type': 'application/json'})
+            connection.getresponse().read()
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def wait_for_server(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            connection.request('GET', '/healthz')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit("scoring service did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure strings/sec through the scoring service.')
+    parser.add_argument('--url', help='Test an already running service instead of starting gunicorn')
+    parser.add_argument('--framing', default='json,msgpack', help='Comma-separated: json, msgpack')
+    parser.add_argument('--batch', type=int, default=100, help='Strings per request')
+    parser.add_argument('--concurrency', type=int, default=4, help='Keep-alive client connections')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', default='2', help='WEB_CONCURRENCY for the started service')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    framings = [framing for framing in args.framing.split(',') if framing != 'msgpack' or msgpack is not None]
+    strings = load_strings(args.seed)
+
+    process = None
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        env = dict(os.environ, WEB_CONCURRENCY=args.workers, BIND=f'{host}:{port}')
+        process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'scoring_service:app'],
+                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if process:
+            wait_for_server(host, port, process)
+        warm_up(host, port, args.batch, args.concurrency, strings)
+        print(f"{args.batch} strings per request, {args.concurrency} connections")
+        print(f"{'framing':>8} {'strings/s':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}  errors")
+        for framing in framings:
+            result = run(host, port, framing, args.batch, args.concurrency, args.seconds, strings)
+            print(f"{framing:>8} {result['strings_per_s']:10.0f} {result['requests_per_s']:8.1f} "
+                  f"{result['p50'] * 1e3:8.1f} {result['p95'] * 1e3:8.1f}  {result['errors'] or ''}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import heapq
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+
+logger = logging.getLogger(__name__)
+
+def to_naive_utc(value):
+    # The DateTime columns are stored without a timezone and hold UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_network(value):
+    """Parse an address or CIDR block, or return None if `value` is neither."""
+    try:
+        return ipaddress.ip_network(value.strip(), strict=False)
+    except (AttributeError, ValueError):
+        return None
+
+
+def address_key(value):
+    """(IP version, integer address) for `value`, or None if it is not an address."""
+    # inet_pton is several times faster than ipaddress.ip_address on the hot path
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, value), 'big')
+        except (OSError, TypeError, ValueError):
+            continue
+    return None
+
+
+def format_network(network):
+    # Single hosts are stored as plain addresses, as before CIDR support
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+
+class PrefixTrie:
+    """
+    Binary trie over address bits for longest-prefix matching.
+
+    Nodes live in flat arrays (child indices per bit and a value slot), so a
+    lookup walks at most one node per prefix bit no matter how many prefixes
+    are stored, and memory stays at a few bytes per node.
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.children = (array('i', [0]), array('i', [0]))
+        self.values = [None]
+
+    def insert(self, network, value):
+        node = 0
+        address = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (address >> (self.bits - 1 - i)) & 1
+            child = self.children[bit][node]
+            if child == 0:
+                child = len(self.values)
+                self.children[0].append(0)
+                self.children[1].append(0)
+                self.values.append(None)
+                self.children[bit][node] = child
+            node = child
+        self.values[node] = value
+
+    def matches(self, address):
+        """Values of every stored prefix containing integer `address`, shortest first."""
+        children, values = self.children, self.values
+        found = []
+        node = 0
+        shift = self.bits
+        while True:
+            if values[node] is not None:
+                found.append(values[node])
+            shift -= 1
+            if shift < 0:
+                break
+            node = children[(address >> shift) & 1][node]
+            if node == 0:
+                break
+        return found
+
+
+class BlockListCache:
+    """
+    In-memory copy of the blocked_ips table for the before_request hook.
+
+    Entries may be single addresses or IPv4/IPv6 CIDR blocks; lookups return
+    the most specific unexpired block covering the client.
+
+    `loader` returns (ip_address, reason, expires_at) rows and is only called
+    when the cache is stale. Every worker watches a shared version file:
+    changing the block list in one worker rewrites the file, and the others
+    reload on their next lookup. A TTL bounds staleness if the file is not
+    shared, e.g. across hosts.
+    """
+
+    def __init__(self, loader, version_path, ttl=30):
+        self.loader = loader
+        self.version_path = version_path
+        self.ttl = ttl
+        self._tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self._exact = {}
+        self._version = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        try:
+            stat = os.stat(self.version_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _refresh_if_stale(self):
+        version = self._current_version()
+        loaded_at = self._loaded_at
+        if loaded_at is not None and version == self._version and time.monotonic() - loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is not loaded_at:
+                return  # another thread reloaded while we waited
+            tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+            exact = {}
+            for ip_address, reason, expires_at in self.loader():
+                entry = (ip_address, reason, to_naive_utc(expires_at))
+                network = parse_network(ip_address)
+                if network is None:
+                    # Not an address (e.g. a garbled header value); match it verbatim
+                    exact[ip_address] = entry
+                else:
+                    tries[network.version].insert(network, entry)
+            self._tries, self._exact = tries, exact
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def match(self, ip_address):
+        """Return (blocked network, reason) covering `ip_address`, or None."""
+        self._refresh_if_stale()
+        candidates = []
+        if ip_address in self._exact:
+            candidates.append(self._exact[ip_address])
+        else:
+            key = address_key(ip_address)
+            if key is not None:
+                candidates = self._tries[key[0]].matches(key[1])
+        if not candidates:
+            return None
+        now = utcnow()
+        for network, reason, expires_at in reversed(candidates):
+            if expires_at is None or expires_at > now:
+                return network, reason
+        return None
+
+    def lookup(self, ip_address):
+        """Return the block reason for `ip_address`, or None if it is not blocked."""
+        found = self.match(ip_address)
+        return found[1] if found else None
+
+    def invalidate(self):
+        """Force a reload here and signal the other workers to reload too."""
+        directory = os.path.dirname(self.version_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.blocklist-', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, self.version_path)
+        self._loaded_at = None
+
+    def mark_stale(self):
+        """Reload on the next lookup, in this worker only."""
+        self._loaded_at = None
+
+
+class BlockExpirySweeper:
+    """
+    Background thread that retires temporary blocks as they expire.
+
+    Upcoming expiry times are kept in a min-heap, so the thread sleeps until
+    the next one instead of polling the table. When blocks expire it calls
+    `on_expire` so the block list cache drops them (lookups already ignore
+    expired entries in between). Every `refresh` seconds it refills the heap
+    through `load_upcoming(after, limit)`, which picks up blocks set by other
+    workers, and calls `purge(before)` to delete rows whose block ended more
+    than `history` seconds ago. Both are range queries on the expires_at
+    index. Until they are purged, expired rows count towards escalating the
+    next block of the same address.
+    """
+
+    def __init__(self, load_upcoming, purge, on_expire, history=30 * 86400, refresh=300, limit=10000):
+        self.load_upcoming = load_upcoming
+        self.purge = purge
+        self.on_expire = on_expire
+        self.history = history
+        self.refresh = refresh
+        self.limit = limit
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.stats = {'expired': 0, 'purged': 0, 'errors': 0}
+
+    def schedule(self, expires_at):
+        """Wake up at `expires_at` (a UTC datetime) as well."""
+        expires_at = to_naive_utc(expires_at)
+        with self._lock:
+            heapq.heappush(self._heap, expires_at)
+            earliest = self._heap[0] == expires_at
+        self.start()
+        if earliest:
+            self._wakeup.set()
+
+    def start(self):
+        # Only the block list loader and schedule() call this, and both run in workers,
+        # never in the preloading master
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='block-expiry', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        next_refresh = 0
+        while True:
+            if time.monotonic() >= next_refresh:
+                self._refill()
+                next_refresh = time.monotonic() + self.refresh
+            self._expire_due()
+            with self._lock:
+                until_next = (self._heap[0] - utcnow()).total_seconds() if self._heap else self.refresh
+            self._wakeup.wait(max(0, min(until_next, next_refresh - time.monotonic())))
+            self._wakeup.clear()
+
+    def _refill(self):
+        try:
+            upcoming = [to_naive_utc(expires_at) for expires_at in self.load_upcoming(utcnow(), self.limit)]
+            self.stats['purged'] += self.purge(utcnow() - timedelta(seconds=self.history))
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("Block expiry refresh failed: %s", e)
+            return
+        with self._lock:
+            # Beyond the loaded window a later refresh picks the rest up
+            horizon = upcoming[-1] if len(upcoming) >= self.limit else None
+            scheduled = [expires_at for expires_at in self._heap if horizon is None or expires_at <= horizon]
+            self._heap = sorted(set(upcoming + scheduled))
+
+    def _expire_due(self):
+        now = utcnow()
+        expired = set()
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                # The same time can be both scheduled here and loaded from the table
+                expired.add(heapq.heappop(self._heap))
+        if expired:
+            self.stats['expired'] += len(expired)
+            try:
+                self.on_expire()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error("Block expiry callback failed: %s", e)
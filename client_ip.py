@@ -0,0 +1,52 @@
+import ipaddress
+
+# Peers allowed to tell us the client address: loopback and private ranges,
+# which is where load balancers and reverse proxies connect from.
+DEFAULT_TRUSTED_PROXIES = '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7'
+
+
+def _parse_address(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+class ClientIPResolver:
+    """
+    Works out the client address from the socket peer and proxy headers.
+
+    Headers are only believed when the peer is a trusted proxy. With
+    X-Forwarded-For the hops are read right to left, skipping trusted
+    proxies, and the first untrusted hop is the client, so a client cannot
+    spoof its address by sending its own X-Forwarded-For. With a single-value
+    header such as CF-Connecting-IP, the header is used as is.
+    """
+
+    def __init__(self, trusted_proxies=DEFAULT_TRUSTED_PROXIES, header='X-Forwarded-For'):
+        self.trusted = [ipaddress.ip_network(network.strip(), strict=False)
+                        for network in trusted_proxies.split(',') if network.strip()]
+        self.header = header
+
+    def is_trusted(self, address):
+        return address is not None and any(address in network for network in self.trusted)
+
+    def resolve(self, remote_addr, headers):
+        peer = _parse_address(remote_addr or '')
+        if not self.is_trusted(peer):
+            return remote_addr
+        value = headers.get(self.header)
+        if not value:
+            return remote_addr
+        if self.header.lower() != 'x-forwarded-for':
+            address = _parse_address(value)
+            return str(address) if address else remote_addr
+        client = remote_addr
+        for hop in reversed(value.split(',')):
+            address = _parse_address(hop)
+            if address is None:
+                break  # garbage from an untrusted party; keep the last address we could vouch for
+            client = str(address)
+            if not self.is_trusted(address):
+                break
+        return client
@@ -0,0 +1,50 @@
+import os
+import sys
+
+# Serving modes, picked with WEB_WORKER_CLASS:
+#   gthread (default)  threads per worker; the faster mode for the login workload, which is
+#                      bound by password hashing and model scoring
+#   gevent             one event loop per worker with thousands of greenlets, for holding many
+#                      slow or idle connections open; database, SMTP and block list I/O yield,
+#                      model scoring runs in the hub's thread pool and password hashing in the
+#                      process pool (see serving.py / passwords.py). It does not raise login
+#                      throughput: in loadtest.py it served fewer req/s than gthread, at a
+#                      higher p95
+#   sync               one request per worker at a time, the old behaviour
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('WEB_THREADS', '8'))
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+# Seconds an idle keep-alive connection is held open (gthread and gevent; sync closes every connection)
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+# Import the app once in the master so workers share its pages copy-on-write. Not with gevent,
+# which has to patch the standard library before the app is imported.
+preload_app = os.getenv('WEB_PRELOAD', '0' if worker_class == 'gevent' else '1') != '0'
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # psycopg2 is a C extension that blocks the event loop unless told to wait cooperatively
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning("psycogreen is not installed; PostgreSQL queries will block the gevent loop")
+        else:
+            patch_psycopg()
+
+
+def post_worker_init(worker):
+    # Load the model before the first request (its arrays are memory-mapped, so every worker
+    # shares them) and log what this worker holds on its own
+    if os.getenv('MODEL_WARM_START', '1') != '0':
+        for name in ('MODELS.random_forest_model', 'MODELS.logistic_regression_model'):
+            module = sys.modules.get(name)
+            if module is not None:
+                try:
+                    module.load_model()
+                except FileNotFoundError as e:
+                    worker.log.warning("Model not loaded at startup: %s", e)
+    from memory_report import process_memory, format_memory
+    worker.log.info("Worker %s memory after startup: %s", worker.pid, format_memory(process_memory()))
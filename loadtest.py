@@ -0,0 +1,202 @@
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import pandas as pd
+
+# Load test for the serving modes in gunicorn.conf.py. For each mode it starts
+# gunicorn against a throwaway SQLite database (or DATABASE_URL), then drives a
+# mix of /blocked page views and benign, wrong-password and SQLi logins at
+# increasing concurrency. It reports requests/sec and latency percentiles per
+# level and the best throughput whose p95 stays under --p95-ms.
+#
+#   python loadtest.py --modes sync,gthread,gevent --concurrency 4,16,64
+#   python loadtest.py --url http://127.0.0.1:8000   # an already running server
+#
+# Requests carry random X-Forwarded-For addresses so that blocks triggered by
+# SQLi payloads do not lock the load generator itself out.
+
+SETUP = """
+from app import app, db, User
+from passwords import hash_password
+with app.app_context():
+    db.create_all()
+    if not User.query.filter_by(email='load@example.com').first():
+        db.session.add(User(email='load@example.com', username='load', password=hash_password('load-password')))
+        db.session.commit()
+"""
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Workload:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        df = pd.read_csv('MODELS/SQLiV3.csv', encoding='latin1', usecols=['Sentence', 'Label'])
+        df = df[pd.to_numeric(df['Label'], errors='coerce').isin([0, 1])]
+        self.benign = df[df['Label'].astype(float) == 0]['Sentence'].dropna().astype(str).tolist()
+        self.sqli = df[df['Label'].astype(float) == 1]['Sentence'].dropna().astype(str).tolist()
+
+    def next_request(self):
+        kind = self.rng.choices(['page', 'login', 'failed', 'sqli'], weights=[4, 2, 3, 1])[0]
+        if kind == 'page':
+            return kind, 'GET', '/blocked', None
+        password = {'login': 'load-password',
+                    'failed': self.rng.choice(self.benign),
+                    'sqli': self.rng.choice(self.sqli)}[kind]
+        body = urllib.parse.urlencode({'email': 'load@example.com', 'password': password})
+        return kind, 'POST', '/login', body
+
+    def client_ip(self):
+        return f'10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}'
+
+
+def run_level(host, port, concurrency, seconds, workload):
+    latencies = []
+    page_latencies = []
+    errors = {}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        while time.monotonic() < stop:
+            with lock:
+                kind, method, path, body = workload.next_request()
+                ip = workload.client_ip()
+            headers = {'X-Forwarded-For': ip}
+            if body:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=60)
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if kind == 'page':
+                    page_latencies.append(elapsed)
+                if not isinstance(status, int) or status >= 500:
+                    errors[status] = errors.get(status, 0) + 1
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    latencies.sort()
+    page_latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'page_p95': percentile(page_latencies, 0.95) if page_latencies else 0.0,
+        'errors': errors
+    }
+
+
+def wait_for_server(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/blocked')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit("gunicorn did not start in time")
+
+
+def start_server(mode, port, env):
+    env = dict(env, WEB_WORKER_CLASS=mode, BIND=f'127.0.0.1:{port}')
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def report(label, levels, p95_ms):
+    print(f"\n{label}")
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'/blocked p95':>13}  errors")
+    for level in levels:
+        print(f"{level['concurrency']:11d} {level['rps']:8.1f} {level['p50'] * 1e3:8.1f} "
+              f"{level['p95'] * 1e3:8.1f} {level['p99'] * 1e3:8.1f} {level['page_p95'] * 1e3:13.1f}  {level['errors'] or ''}")
+    within = [level for level in levels if level['p95'] * 1e3 <= p95_ms and not level['errors']]
+    best = max((level['rps'] for level in within), default=0.0)
+    print(f"Best throughput with p95 <= {p95_ms:.0f}ms: {best:.1f} req/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the app in each serving mode.')
+    parser.add_argument('--modes', default='sync,gthread,gevent', help='WEB_WORKER_CLASS values to compare')
+    parser.add_argument('--url', help='Test an already running server instead of starting gunicorn')
+    parser.add_argument('--concurrency', default='4,16,64', help='Comma-separated client counts')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each concurrency level')
+    parser.add_argument('--p95-ms', type=float, default=500, help='Latency budget for the summary')
+    parser.add_argument('--workers', default='2', help='WEB_CONCURRENCY for started servers')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workload = Workload(args.seed)
+    levels = [int(value) for value in args.concurrency.split(',')]
+
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        results = [run_level(url.hostname, url.port or 80, level, args.seconds, workload) for level in levels]
+        report(args.url, results, args.p95_ms)
+        return
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'loadtest.db'))
+    env.update({
+        'WEB_CONCURRENCY': args.workers,
+        # Keep throttling out of the measurement
+        'RATE_LIMIT_IP': '1000000000', 'RATE_LIMIT_EMAIL': '1000000000', 'RATE_LIMIT_SUBNET': '1000000000',
+        # Alerts go to a closed local port so no mail leaves the machine
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': '9', 'MAIL_USE_TLS': '0',
+        'BLOCKLIST_VERSION_FILE': os.path.join(workdir, 'blocklist.version'),
+        'ATTEMPT_SPOOL_FILE': os.path.join(workdir, 'spool.jsonl')
+    })
+    subprocess.run([sys.executable, '-c', SETUP], env=env, check=True, stdout=subprocess.DEVNULL)
+
+    summary = {}
+    for mode in args.modes.split(','):
+        process = start_server(mode, args.port, env)
+        try:
+            wait_for_server('127.0.0.1', args.port, process)
+            results = [run_level('127.0.0.1', args.port, level, args.seconds, workload) for level in levels]
+        finally:
+            process.terminate()
+            process.wait()
+        summary[mode] = report(f"WEB_WORKER_CLASS={mode}", results, args.p95_ms)
+
+    print("\nSummary (req/s within the p95 budget): " +
+          ', '.join(f'{mode} {rps:.1f}' for mode, rps in summary.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# Per-process memory from /proc/<pid>/smaps_rollup (Linux). USS, the pages only
+# this process holds, is what each extra gunicorn worker really costs; pages
+# shared with other workers (memory-mapped model arrays, the preloaded
+# interpreter) count once for the whole box.
+
+
+def process_memory(pid='self'):
+    """RSS, PSS, USS and shared bytes of a process, or None where /proc has no smaps_rollup."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    kib = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[0].endswith(':') and parts[2] == 'kB':
+            kib[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': kib.get('Rss', 0) * 1024,
+        'pss': kib.get('Pss', 0) * 1024,
+        'uss': (kib.get('Private_Clean', 0) + kib.get('Private_Dirty', 0)) * 1024,
+        'shared': (kib.get('Shared_Clean', 0) + kib.get('Shared_Dirty', 0)) * 1024,
+    }
+
+
+def format_memory(memory):
+    if memory is None:
+        return 'n/a (no /proc/self/smaps_rollup)'
+    return ', '.join(f'{kind.upper()} {value / (1 << 20):.1f} MB' for kind, value in memory.items())
+
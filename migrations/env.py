@@ -1,4 +1,5 @@
 import logging
+import re
 from logging.config import fileConfig
 
 from flask import current_app
@@ -94,6 +95,18 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
+    # login_attempts partitions on PostgreSQL (see attempt_storage.py) are not
+    # models; without this autogenerate would emit DROP TABLE for each of them
+    def include_object(object, name, type_, reflected, compare_to):
+        table = object if type_ == 'table' else getattr(object, 'table', None)
+        if reflected and compare_to is None and table is not None and \
+                re.fullmatch(r'login_attempts_(p\d+|default)', table.name):
+            return False
+        return True
+
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
+
     connectable = get_engine()
 
     with connectable.connect() as connection:
@@ -0,0 +1,39 @@
+"""Add prefix_length to blocked_ips for CIDR blocks
+
+Revision ID: 9e2f4a7c1b3d
+Revises: 5c0b493904a3
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+import ipaddress
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e2f4a7c1b3d'
+down_revision = '5c0b493904a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blocked_ips', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('prefix_length', sa.Integer(), nullable=True))
+
+    # Existing rows are single hosts, or values that are not addresses at all
+    # (e.g. a garbled header), which keep a NULL prefix_length as BlockedIP expects
+    bind = op.get_bind()
+    for row_id, ip_address in bind.execute(sa.text("SELECT id, ip_address FROM blocked_ips")).fetchall():
+        try:
+            network = ipaddress.ip_network(ip_address.strip(), strict=False)
+        except (AttributeError, ValueError):
+            continue
+        bind.execute(sa.text("UPDATE blocked_ips SET prefix_length = :prefix_length WHERE id = :id"),
+                     {'prefix_length': network.prefixlen, 'id': row_id})
+
+
+def downgrade():
+    with op.batch_alter_table('blocked_ips', schema=None) as batch_op:
+        batch_op.drop_column('prefix_length')
@@ -0,0 +1,26 @@
+"""Clear login attempt payloads stored before redaction; some of them are passwords
+
+Revision ID: a6c4e2b9d713
+Revises: f3a9d6e2c815
+Create Date: 2026-10-20 10:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c4e2b9d713'
+down_revision = 'f3a9d6e2c815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier versions stored whichever field scored highest, often the password, verbatim.
+    # Labels stay; attempts without a payload are simply left out of online learning.
+    op.execute("UPDATE login_attempts SET payload = NULL WHERE payload IS NOT NULL")
+
+
+def downgrade():
+    # The cleared payloads cannot be restored
+    pass
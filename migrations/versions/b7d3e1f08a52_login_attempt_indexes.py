@@ -0,0 +1,27 @@
+"""Composite indexes for the activity dashboard
+
+Revision ID: b7d3e1f08a52
+Revises: 9e2f4a7c1b3d
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e1f08a52'
+down_revision = '9e2f4a7c1b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.create_index('ix_login_attempts_user_id_timestamp', ['user_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_login_attempts_ip_address_timestamp', ['ip_address', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.drop_index('ix_login_attempts_ip_address_timestamp')
+        batch_op.drop_index('ix_login_attempts_user_id_timestamp')
@@ -0,0 +1,52 @@
+"""Flagged login inputs in their own table, so logins naming no account are kept too
+
+Revision ID: c3e8f1a5b7d2
+Revises: a6c4e2b9d713
+Create Date: 2026-10-21 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f1a5b7d2'
+down_revision = 'a6c4e2b9d713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('flagged_inputs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('ip_address', sa.String(length=50), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('field', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('label', sa.Integer(), nullable=True),
+        sa.Column('labelled_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_flagged_inputs_timestamp', 'flagged_inputs', ['timestamp'], unique=False)
+    op.create_index('ix_flagged_inputs_labelled_at', 'flagged_inputs', ['labelled_at'], unique=False)
+
+    # Payloads were cleared by a6c4e2b9d713, so the columns hold no data worth moving
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.drop_index('ix_login_attempts_labelled_at')
+        batch_op.drop_column('labelled_at')
+        batch_op.drop_column('label')
+        batch_op.drop_column('payload')
+
+
+def downgrade():
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payload', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('label', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('labelled_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_login_attempts_labelled_at', ['labelled_at'], unique=False)
+
+    op.drop_index('ix_flagged_inputs_labelled_at', table_name='flagged_inputs')
+    op.drop_index('ix_flagged_inputs_timestamp', table_name='flagged_inputs')
+    op.drop_table('flagged_inputs')
@@ -0,0 +1,32 @@
+"""Flagged input and user-confirmed label on login attempts
+
+Revision ID: d41a6c2e9f07
+Revises: b7d3e1f08a52
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a6c2e9f07'
+down_revision = 'b7d3e1f08a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payload', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('label', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('labelled_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_login_attempts_labelled_at', ['labelled_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+        batch_op.drop_index('ix_login_attempts_labelled_at')
+        batch_op.drop_column('labelled_at')
+        batch_op.drop_column('label')
+        batch_op.drop_column('payload')
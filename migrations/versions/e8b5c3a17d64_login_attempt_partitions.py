@@ -0,0 +1,185 @@
+"""Hourly and daily attempt rollups; partition login_attempts by time on PostgreSQL
+
+Revision ID: e8b5c3a17d64
+Revises: d41a6c2e9f07
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b5c3a17d64'
+down_revision = 'd41a6c2e9f07'
+branch_labels = None
+depends_on = None
+
+# Read once here; attempt_storage.py must run with the same ATTEMPT_PARTITION_INTERVAL
+INTERVAL = os.getenv('ATTEMPT_PARTITION_INTERVAL', 'month')
+PARTITIONS_AHEAD = int(os.getenv('ATTEMPT_PARTITIONS_AHEAD', '3'))
+
+ROLLUPS = {'login_attempt_rollups_hourly': 'hour', 'login_attempt_rollups_daily': 'day'}
+
+COLUMNS = ('id, user_id, status, timestamp, is_malicious, is_suspicious, ip_address, '
+           'payload, label, labelled_at')
+
+
+def create_rollup(name):
+    op.create_table(name,
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('ip_address', sa.String(length=50), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('malicious', sa.Integer(), nullable=False),
+        sa.Column('suspicious', sa.Integer(), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'ip_address', 'bucket')
+    )
+    op.create_index(f'ix_{name}_bucket', name, ['bucket'], unique=False)
+
+
+def backfill_rollup(name, granularity, dialect):
+    if dialect == 'postgresql':
+        bucket = f"date_trunc('{granularity}', timestamp)"
+    else:
+        # Same text SQLAlchemy stores for a DateTime on SQLite
+        bucket = f"strftime('{'%Y-%m-%d %H' if granularity == 'hour' else '%Y-%m-%d 00'}:00:00.000000', timestamp)"
+    op.execute(
+        f"INSERT INTO {name} (user_id, ip_address, bucket, attempts, failed, malicious, suspicious, first_seen, last_seen) "
+        f"SELECT user_id, coalesce(ip_address, ''), {bucket}, count(*), "
+        f"sum(CASE WHEN status = 'Failed' THEN 1 ELSE 0 END), "
+        f"sum(CASE WHEN is_malicious THEN 1 ELSE 0 END), sum(CASE WHEN is_suspicious THEN 1 ELSE 0 END), "
+        f"min(timestamp), max(timestamp) "
+        f"FROM login_attempts WHERE timestamp IS NOT NULL GROUP BY user_id, coalesce(ip_address, ''), {bucket}"
+    )
+
+
+def period_start(moment):
+    if INTERVAL == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start):
+    if INTERVAL == 'day':
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_login_attempts():
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT min(timestamp) FROM login_attempts")).scalar()
+    now = datetime.utcnow()
+
+    # The old table keeps its data until it has been copied; its sequence moves to the new table
+    op.execute("ALTER SEQUENCE login_attempts_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE login_attempts RENAME TO login_attempts_unpartitioned")
+    op.execute("ALTER TABLE login_attempts_unpartitioned RENAME CONSTRAINT login_attempts_pkey TO login_attempts_unpartitioned_pkey")
+    for index in ('ix_login_attempts_user_id_timestamp', 'ix_login_attempts_ip_address_timestamp',
+                  'ix_login_attempts_labelled_at'):
+        op.execute(f"DROP INDEX {index}")
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE login_attempts (
+            id INTEGER NOT NULL DEFAULT nextval('login_attempts_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            status VARCHAR(50) NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            is_malicious BOOLEAN,
+            is_suspicious BOOLEAN,
+            ip_address VARCHAR(50),
+            payload TEXT,
+            label INTEGER,
+            labelled_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE login_attempts_id_seq OWNED BY login_attempts.id")
+    op.execute("CREATE TABLE login_attempts_default PARTITION OF login_attempts DEFAULT")
+
+    start = period_start(oldest or now)
+    last = period_start(now)
+    for _ in range(PARTITIONS_AHEAD):
+        last = next_period(last)
+    while start <= last:
+        end = next_period(start)
+        name = f"login_attempts_p{start.strftime('%Y%m%d' if INTERVAL == 'day' else '%Y%m')}"
+        op.execute(f"CREATE TABLE {name} PARTITION OF login_attempts FOR VALUES FROM ('{start}') TO ('{end}')")
+        start = end
+
+    op.execute(f"INSERT INTO login_attempts ({COLUMNS}) "
+               f"SELECT id, user_id, status, coalesce(timestamp, now() AT TIME ZONE 'utc'), is_malicious, "
+               f"is_suspicious, ip_address, payload, label, labelled_at FROM login_attempts_unpartitioned")
+    op.execute("DROP TABLE login_attempts_unpartitioned")
+
+    # Created on the parent, so every partition gets them
+    op.create_index('ix_login_attempts_user_id_timestamp', 'login_attempts', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_login_attempts_ip_address_timestamp', 'login_attempts', ['ip_address', 'timestamp'], unique=False)
+    op.create_index('ix_login_attempts_labelled_at', 'login_attempts', ['labelled_at'], unique=False)
+    op.create_index('ix_login_attempts_timestamp', 'login_attempts', ['timestamp'], unique=False)
+
+
+def unpartition_login_attempts():
+    op.execute("ALTER SEQUENCE login_attempts_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE login_attempts RENAME TO login_attempts_partitioned")
+    op.execute("ALTER TABLE login_attempts_partitioned RENAME CONSTRAINT login_attempts_pkey TO login_attempts_partitioned_pkey")
+    for index in ('ix_login_attempts_user_id_timestamp', 'ix_login_attempts_ip_address_timestamp',
+                  'ix_login_attempts_labelled_at', 'ix_login_attempts_timestamp'):
+        op.execute(f"DROP INDEX {index}")
+
+    op.execute("""
+        CREATE TABLE login_attempts (
+            id INTEGER NOT NULL DEFAULT nextval('login_attempts_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            status VARCHAR(50) NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE,
+            is_malicious BOOLEAN,
+            is_suspicious BOOLEAN,
+            ip_address VARCHAR(50),
+            payload TEXT,
+            label INTEGER,
+            labelled_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE login_attempts_id_seq OWNED BY login_attempts.id")
+    op.execute(f"INSERT INTO login_attempts ({COLUMNS}) SELECT {COLUMNS} FROM login_attempts_partitioned")
+    # Drops every partition with it
+    op.execute("DROP TABLE login_attempts_partitioned")
+
+    op.create_index('ix_login_attempts_user_id_timestamp', 'login_attempts', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_login_attempts_ip_address_timestamp', 'login_attempts', ['ip_address', 'timestamp'], unique=False)
+    op.create_index('ix_login_attempts_labelled_at', 'login_attempts', ['labelled_at'], unique=False)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        partition_login_attempts()
+    else:
+        with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+            batch_op.create_index('ix_login_attempts_timestamp', ['timestamp'], unique=False)
+
+    # After partitioning, which gives rows without a timestamp one, so the rollups count them too
+    for name, granularity in ROLLUPS.items():
+        create_rollup(name)
+        backfill_rollup(name, granularity, dialect)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        unpartition_login_attempts()
+    else:
+        with op.batch_alter_table('login_attempts', schema=None) as batch_op:
+            batch_op.drop_index('ix_login_attempts_timestamp')
+
+    for name in ROLLUPS:
+        op.drop_index(f'ix_{name}_bucket', table_name=name)
+        op.drop_table(name)
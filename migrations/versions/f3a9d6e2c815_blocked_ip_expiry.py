@@ -0,0 +1,28 @@
+"""Offence count and expires_at index for temporary blocks
+
+Revision ID: f3a9d6e2c815
+Revises: e8b5c3a17d64
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d6e2c815'
+down_revision = 'e8b5c3a17d64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blocked_ips', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('offences', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.create_index('ix_blocked_ips_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('blocked_ips', schema=None) as batch_op:
+        batch_op.drop_index('ix_blocked_ips_expires_at')
+        batch_op.drop_column('offences')
@@ -0,0 +1,125 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Method passed to werkzeug's generate_password_hash, e.g. "scrypt" or "pbkdf2:sha256:600000".
+# Stored hashes made with other parameters are upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+
+# Hashing runs in a process pool per web worker; PASSWORD_POOL_SIZE=0 hashes in the request thread
+PASSWORD_POOL_SIZE = int(os.getenv('PASSWORD_POOL_SIZE', str(os.cpu_count() or 1)))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv('PASSWORD_POOL_MAX_PENDING', '32'))
+PASSWORD_POOL_TIMEOUT = float(os.getenv('PASSWORD_POOL_TIMEOUT', '10'))
+
+_method_prefix = None
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hash pool is saturated; callers should answer 429."""
+
+
+class HashPool:
+    """
+    Runs password hashing in a bounded pool of worker processes.
+
+    At most `max_pending` jobs may be queued or running; beyond that `run`
+    raises HashPoolBusy straight away instead of queueing, so a login flood
+    is shed rather than piling up behind the CPU. Jobs that take longer than
+    `timeout` seconds are treated the same way.
+    """
+
+    def __init__(self, workers, max_pending=32, timeout=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.stats = {'completed': 0, 'rejected': 0, 'timed_out': 0}
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise HashPoolBusy(f'{self.max_pending} password hashes already pending')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            self.stats['timed_out'] += 1
+            raise HashPoolBusy(f'password hash took longer than {self.timeout}s')
+        except BrokenProcessPool:
+            # A worker process died; start a fresh pool next time and hash this one inline
+            with self._lock:
+                self._executor = None
+            result = fn(*args)
+        self.stats['completed'] += 1
+        return result
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork, so each gunicorn worker owns its pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    # spawn: children must not inherit the app's threads or open connections
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+
+hash_pool = HashPool(PASSWORD_POOL_SIZE, PASSWORD_POOL_MAX_PENDING, PASSWORD_POOL_TIMEOUT) if PASSWORD_POOL_SIZE > 0 else None
+
+
+def _run(fn, *args):
+    if hash_pool is None:
+        return fn(*args)
+    return hash_pool.run(fn, *args)
+
+
+def _hash(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def _verify(stored_hash, password):
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if needs_rehash(stored_hash):
+        return True, _hash(password)
+    return True, None
+
+
+def hash_password(password):
+    return _run(_hash, password)
+
+
+def current_method_prefix():
+    """The "method:params" prefix werkzeug writes for PASSWORD_HASH_METHOD, with defaults filled in."""
+    global _method_prefix
+    if _method_prefix is None:
+        _method_prefix = _hash('').split('$', 1)[0]
+    return _method_prefix
+
+
+def needs_rehash(stored_hash):
+    return stored_hash.split('$', 1)[0] != current_method_prefix()
+
+
+def verify_password(stored_hash, password):
+    """
+    Check `password` against `stored_hash`, paying for the slow hash exactly once.
+
+    Returns (valid, new_hash). `new_hash` is a fresh hash with the current
+    parameters when the password is valid but was stored with older ones,
+    otherwise None. Raises HashPoolBusy when the hash pool is saturated.
+    """
+    return _run(_verify, stored_hash, password)
@@ -0,0 +1,143 @@
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+
+
+def window_position(window, now=None):
+    """Index of the fixed window `now` falls in, and the fraction of it already elapsed."""
+    index, offset = divmod(time.time() if now is None else now, window)
+    return int(index), offset / window
+
+
+class SlidingWindowCounter:
+    """
+    Per-key "events in the last `window` seconds" in O(1) time and memory.
+
+    Each key keeps only the count for the current fixed window and the one
+    before it; the sliding count weights the previous window by how much of it
+    still overlaps the last `window` seconds. At most `max_keys` keys are held
+    and the least recently hit key is evicted first, so memory stays bounded
+    no matter how many distinct IPs or emails are seen.
+    """
+
+    def __init__(self, window=60, max_keys=1000000):
+        self.window = window
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Record one event for `key` and return its sliding count."""
+        index, elapsed = window_position(self.window, now)
+        with self._lock:
+            previous, current = self._roll(self._counts.get(key), index)
+            current += 1
+            self._counts[key] = (index, previous, current)
+            self._counts.move_to_end(key)
+            if len(self._counts) > self.max_keys:
+                self._counts.popitem(last=False)
+                self.evictions += 1
+        return previous * (1 - elapsed) + current
+
+    def count(self, key, now=None):
+        index, elapsed = window_position(self.window, now)
+        previous, current = self._roll(self._counts.get(key), index)
+        return previous * (1 - elapsed) + current
+
+    def __len__(self):
+        return len(self._counts)
+
+    @staticmethod
+    def _roll(entry, index):
+        if entry is None:
+            return 0, 0
+        entry_index, previous, current = entry
+        if entry_index == index:
+            return previous, current
+        if entry_index == index - 1:
+            return current, 0
+        return 0, 0
+
+
+class RedisSlidingWindowCounter:
+    """
+    The same counter kept in a Redis-compatible server so every worker shares it.
+
+    Each (key, window) pair is one integer that expires after two windows;
+    configure the server with a maxmemory and an LRU eviction policy to bound
+    memory. Requires the optional `redis` package.
+    """
+
+    def __init__(self, url, window=60, prefix='ratelimit'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.window = window
+        self.prefix = prefix
+
+    def hit(self, key, now=None):
+        index, elapsed = window_position(self.window, now)
+        current_key = f'{self.prefix}:{key}:{index}'
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(self.window * 2))
+        pipe.get(f'{self.prefix}:{key}:{index - 1}')
+        current, _, previous = pipe.execute()
+        return int(previous or 0) * (1 - elapsed) + int(current)
+
+    def count(self, key, now=None):
+        index, elapsed = window_position(self.window, now)
+        current, previous = self.client.mget(f'{self.prefix}:{key}:{index}', f'{self.prefix}:{key}:{index - 1}')
+        return int(previous or 0) * (1 - elapsed) + int(current or 0)
+
+
+def subnet_key(ip_address):
+    """The /24 (IPv4) or /64 (IPv6) network containing `ip_address`, or None."""
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f'{address}/{prefix}', strict=False))
+
+
+class LoginRateLimiter:
+    """
+    Login velocity per client IP, per email and per IP/24 over one sliding window.
+
+    `record` counts an attempt and returns the current counts together with
+    `pressure`, the largest count as a fraction of its limit. `exceeded`
+    returns the (scope, key) whose limit was passed, checking the narrowest
+    scope first.
+    """
+
+    def __init__(self, window=60, ip_limit=20, email_limit=10, subnet_limit=100, max_keys=1000000, redis_url=None):
+        self.window = window
+        self.limits = {'ip': ip_limit, 'email': email_limit, 'subnet': subnet_limit}
+        if redis_url:
+            self.counter = RedisSlidingWindowCounter(redis_url, window)
+        else:
+            # One table for all three scopes so max_keys bounds the total
+            self.counter = SlidingWindowCounter(window, max_keys)
+
+    def record(self, ip_address, email, now=None):
+        keys = {
+            'ip': ip_address,
+            'email': email.strip().lower() if email else None,
+            'subnet': subnet_key(ip_address) if ip_address else None
+        }
+        velocity = {'keys': keys}
+        pressure = 0.0
+        for scope, key in keys.items():
+            count = self.counter.hit(f'{scope}:{key}', now) if key else 0
+            velocity[scope] = count
+            pressure = max(pressure, count / self.limits[scope])
+        velocity['pressure'] = pressure
+        return velocity
+
+    def exceeded(self, velocity):
+        for scope in ('ip', 'email', 'subnet'):
+            if velocity[scope] > self.limits[scope]:
+                return scope, velocity['keys'][scope]
+        return None
@@ -0,0 +1,134 @@
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from flask import Flask, Response, abort, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from MODELS.random_forest_model import score_inputs, load_model, loaded_version, verdict
+import metrics
+from app_logging import configure_logging
+from serving import run_cpu_bound
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Standalone JSON scoring API for other services, sharing the login page's
+# model loader, prefilter and verdict cache. Run it next to the app with
+#
+#   gunicorn -c gunicorn.conf.py scoring_service:app
+#
+# POST /v1/score with {"inputs": ["...", ...]} and get back one
+# {"probability", "verdict"} per input, in order. Requests and responses may
+# also be msgpack (Content-Type / Accept: application/msgpack) when the
+# msgpack package is installed.
+
+load_dotenv()
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+SCORING_MAX_INPUTS = int(os.getenv('SCORING_MAX_INPUTS', '1000'))
+SCORING_MAX_INPUT_CHARS = int(os.getenv('SCORING_MAX_INPUT_CHARS', '4096'))
+# Set SCORING_TOKEN to require "Authorization: Bearer <token>"
+SCORING_TOKEN = os.getenv('SCORING_TOKEN')
+
+app = Flask(__name__)
+# Bodies above this are refused with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('SCORING_MAX_BYTES', str(1 << 20)))
+
+scored_strings = metrics.Counter('sentinel_scored_strings_total', 'Strings scored by verdict.', ['verdict'])
+batch_seconds = metrics.Histogram('sentinel_score_batch_duration_seconds', 'Time to score one request.')
+batch_sizes = metrics.Histogram('sentinel_score_batch_size', 'Strings per scoring request.',
+                                buckets=(1, 10, 50, 100, 250, 500, 1000, 5000))
+metrics.Gauge('sentinel_model_info', 'Model version serving requests (1 once loaded).',
+              lambda: [((loaded_version() or 'not loaded',), 1 if loaded_version() else 0)], ['model_version'])
+
+
+def wants_msgpack():
+    accept = request.accept_mimetypes
+    if request.mimetype in MSGPACK_TYPES and not accept.provided:
+        return True
+    return any(accept[mimetype] > accept['application/json'] for mimetype in MSGPACK_TYPES)
+
+
+def respond(body, status=200):
+    if msgpack is not None and wants_msgpack():
+        return Response(msgpack.packb(body), status=status, mimetype='application/msgpack')
+    return jsonify(body), status
+
+
+def error(status, message):
+    return respond({'error': message}, status)
+
+
+@app.errorhandler(HTTPException)
+def http_error(e):
+    return error(e.code, e.description)
+
+
+def read_inputs():
+    if request.mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            abort(415, 'msgpack is not installed on this server')
+        try:
+            body = msgpack.unpackb(request.get_data(), raw=False)
+        except (ValueError, msgpack.UnpackException):
+            abort(400, 'Body is not valid msgpack')
+    elif request.mimetype == 'application/json':
+        body = request.get_json(silent=True)
+        if body is None:
+            abort(400, 'Body is not valid JSON')
+    else:
+        abort(415, 'Send application/json or application/msgpack')
+
+    inputs = body.get('inputs') if isinstance(body, dict) else body
+    if not isinstance(inputs, list) or not all(isinstance(text, str) for text in inputs):
+        abort(400, 'Expected {"inputs": [string, ...]}')
+    if len(inputs) > SCORING_MAX_INPUTS:
+        abort(413, f'At most {SCORING_MAX_INPUTS} inputs per request')
+    if any(len(text) > SCORING_MAX_INPUT_CHARS for text in inputs):
+        abort(413, f'Inputs are limited to {SCORING_MAX_INPUT_CHARS} characters')
+    return inputs
+
+
+@app.route('/v1/score', methods=['POST'])
+def score():
+    if SCORING_TOKEN and request.headers.get('Authorization') != f'Bearer {SCORING_TOKEN}':
+        abort(401, 'Missing or wrong bearer token')
+    inputs = read_inputs()
+
+    started = time.perf_counter()
+    # Off the event loop under gevent, like the login check
+    probabilities = run_cpu_bound(score_inputs, inputs).tolist() if inputs else []
+    batch_seconds.observe((), time.perf_counter() - started)
+    batch_sizes.observe((), len(inputs))
+
+    results = []
+    for probability in probabilities:
+        result = verdict(probability)
+        scored_strings.inc((result,))
+        results.append({'probability': probability, 'verdict': result})
+    return respond({'model_version': loaded_version(), 'results': results})
+
+
+@app.route('/healthz')
+def healthz():
+    load_model()
+    return respond({'status': 'ok', 'model_version': loaded_version()})
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if SCORING_TOKEN and request.headers.get('Authorization') != f'Bearer {SCORING_TOKEN}':
+        abort(401, 'Missing or wrong bearer token')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+if __name__ == '__main__':
+    app.run(port=int(os.getenv('PORT', '8001')))
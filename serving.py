@@ -0,0 +1,23 @@
+import sys
+
+
+def gevent_patched():
+    """True when running under gevent's monkey patching (e.g. gunicorn -k gevent)."""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def run_cpu_bound(fn, *args):
+    """
+    Call `fn` so that it does not stall other requests.
+
+    Under gevent the call runs on the hub's native thread pool, so greenlets
+    waiting on I/O keep being scheduled while it computes. With thread or
+    sync workers it just runs inline.
+    """
+    if gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
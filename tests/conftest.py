@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import pytest
+
+# A PostgreSQL DATABASE_URL given by the caller is only used by test_migrations_postgres.py
+POSTGRES_URL = os.environ.get('DATABASE_URL') if os.environ.get('DATABASE_URL', '').startswith('postgresql') else None
+
+# app reads its configuration at import time, so it is set before any test module imports it
+_tmp = tempfile.mkdtemp()
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    'BLOCKLIST_VERSION_FILE': os.path.join(_tmp, 'blocklist.version'),
+    'ATTEMPT_SPOOL_FILE': os.path.join(_tmp, 'login_attempts.spool.jsonl'),
+    'ATTEMPT_BUFFERING': '0',
+    'STORE_FLAGGED_INPUTS': '1',
+    'ADMIN_EMAILS': 'admin@example.com',
+    'MODEL_RELOAD_INTERVAL': '0',
+})
+
+
+@pytest.fixture
+def app_module():
+    import app as app_module
+    app_module.app.config['TESTING'] = True
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        app_module.db.session.add_all([
+            app_module.User(email='owner@example.com', username='owner', password='x'),
+            app_module.User(email='admin@example.com', username='admin', password='x'),
+        ])
+        app_module.db.session.commit()
+    yield app_module
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+    app_module.blocked_ip_cache.mark_stale()
+
+
+def logged_in(app_module, email):
+    with app_module.app.app_context():
+        user_id = app_module.User.query.filter_by(email=email).one().id
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+@pytest.fixture
+def client(app_module):
+    return logged_in(app_module, 'owner@example.com')
+
+
+@pytest.fixture
+def admin_client(app_module):
+    return logged_in(app_module, 'admin@example.com')
+
+
+@pytest.fixture
+def postgres_url():
+    if POSTGRES_URL is None:
+        pytest.skip('set DATABASE_URL=postgresql://... to run the PostgreSQL migration tests')
+    return POSTGRES_URL
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+
+from attempt_log import AttemptBuffer
+
+
+class BadRow(Exception):
+    pass
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def write_rows(self, rows):
+        if self.down:
+            raise ConnectionError('database is down')
+        if any(row.get('user_id') == 'deleted' for row in rows):
+            raise BadRow('foreign key violation')
+        self.rows.extend(rows)
+
+
+def make_buffer(tmp_path, table):
+    return AttemptBuffer(table.write_rows, str(tmp_path / 'spool.jsonl'), bad_row_errors=(BadRow,))
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+def test_failed_flush_is_replayed_with_datetimes(tmp_path):
+    table = FakeTable()
+    buffer = make_buffer(tmp_path, table)
+    when = datetime(2024, 5, 1, 12, 30)
+    table.down = True
+    buffer.add({'ip_address': '203.0.113.7', 'timestamp': when})
+    buffer.flush()
+    assert table.rows == []
+    assert len(read_lines(buffer.spool_path)) == 1
+
+    table.down = False
+    buffer.flush()
+    assert table.rows == [{'ip_address': '203.0.113.7', 'timestamp': when}]
+    assert not (tmp_path / 'spool.jsonl').exists()
+
+
+def test_bad_row_is_quarantined_and_the_rest_written(tmp_path):
+    table = FakeTable()
+    buffer = make_buffer(tmp_path, table)
+    buffer._spool([{'id': 1}, {'id': 2, 'user_id': 'deleted'}, {'id': 3}])
+    buffer.flush()
+    assert table.rows == [{'id': 1}, {'id': 3}]
+    assert [json.loads(line) for line in read_lines(buffer.quarantine_path)] == [{'id': 2, 'user_id': 'deleted'}]
+    assert not (tmp_path / 'spool.jsonl').exists()
+
+
+def test_unreadable_lines_are_quarantined(tmp_path):
+    table = FakeTable()
+    buffer = make_buffer(tmp_path, table)
+    with open(buffer.spool_path, 'w') as f:
+        f.write('{"id": 1}\n{"id": 2, "timest\n42\n{"id": 3}\n')
+    buffer.flush()
+    assert table.rows == [{'id': 1}, {'id': 3}]
+    assert read_lines(buffer.quarantine_path) == ['{"id": 2, "timest\n', '42\n']
+    assert [path.name for path in tmp_path.iterdir()] == ['spool.jsonl.quarantine']
+
+
+def test_outage_keeps_rows_in_the_spool(tmp_path):
+    table = FakeTable()
+    buffer = make_buffer(tmp_path, table)
+    buffer._spool([{'id': 1}, {'id': 2}])
+    table.down = True
+    buffer.flush()
+    assert [json.loads(line) for line in read_lines(buffer.spool_path)] == [{'id': 1}, {'id': 2}]
+    assert not (tmp_path / 'spool.jsonl.quarantine').exists()
+    assert [path.name for path in tmp_path.iterdir()] == ['spool.jsonl']
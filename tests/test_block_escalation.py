@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import pytest
+
+from app import app, db, BlockedIP, block_ip, utcnow, BLOCK_PERMANENT_AFTER, BLOCK_MAX_SECONDS
+
+
+def offend(ip_address, times, **kwargs):
+    """Block `ip_address` `times` times, letting each block run out before the next."""
+    with app.app_context():
+        for _ in range(times):
+            block_ip(ip_address, 'test', **kwargs)
+            blocked = BlockedIP.query.filter_by(ip_address=ip_address).one()
+            if blocked.expires_at is not None:
+                blocked.expires_at = utcnow() - timedelta(seconds=1)
+                db.session.commit()
+        block_ip(ip_address, 'test', **kwargs)
+        blocked = BlockedIP.query.filter_by(ip_address=ip_address).one()
+        duration = None if blocked.expires_at is None else blocked.expires_at - utcnow()
+        return blocked.offences, duration
+
+
+def test_repeat_offences_escalate(app_module):
+    offences, first = offend('198.51.100.7', 0, base_seconds=60)
+    assert offences == 1 and first <= timedelta(seconds=60)
+    offences, second = offend('198.51.100.8', 1, base_seconds=60)
+    assert offences == 2 and second > timedelta(seconds=60)
+
+
+def test_model_blocks_become_permanent(app_module):
+    offences, duration = offend('198.51.100.7', BLOCK_PERMANENT_AFTER, base_seconds=60)
+    assert offences == BLOCK_PERMANENT_AFTER + 1
+    assert duration is None
+
+
+@pytest.mark.parametrize('key', ['203.0.113.0/24', '2001:db8:1:2::/64', '198.51.100.7'])
+def test_rate_limit_blocks_stay_temporary(app_module, key):
+    offences, duration = offend(key, BLOCK_PERMANENT_AFTER + 2, base_seconds=60, can_be_permanent=False)
+    assert offences == BLOCK_PERMANENT_AFTER + 3
+    assert duration is not None and duration <= timedelta(seconds=BLOCK_MAX_SECONDS)
+
+
+def test_active_block_is_not_shortened(app_module):
+    with app.app_context():
+        block_ip('198.51.100.7', 'manual')
+        block_ip('198.51.100.7', 'rate limit', base_seconds=60, can_be_permanent=False)
+        blocked = BlockedIP.query.filter_by(ip_address='198.51.100.7').one()
+        assert blocked.expires_at is None and blocked.reason == 'manual'
@@ -0,0 +1,33 @@
+import pytest
+
+from app import app, BlockedIP
+
+
+def blocked_addresses():
+    with app.app_context():
+        return {block.ip_address for block in BlockedIP.query.all()}
+
+
+@pytest.mark.parametrize('network', ['0.0.0.0/0', '10.0.0.0/8', '203.0.113.0/23', '::/0', '2001:db8::/32'])
+def test_rejects_broad_networks(app_module, client, network):
+    response = client.post(f'/block_ip/{network}', follow_redirects=True)
+    assert b'too broad to block' in response.data
+    assert blocked_addresses() == set()
+    assert app_module.blocked_ip_cache.match('203.0.113.7') is None
+
+
+@pytest.mark.parametrize('network, stored', [
+    ('203.0.113.0/24', '203.0.113.0/24'),
+    ('198.51.100.7', '198.51.100.7'),
+    ('2001:db8:1::/48', '2001:db8:1::/48'),
+])
+def test_blocks_narrow_networks(client, network, stored):
+    response = client.post(f'/block_ip/{network}')
+    assert response.status_code == 302
+    assert blocked_addresses() == {stored}
+
+
+def test_requires_login(client):
+    response = app.test_client().post('/block_ip/203.0.113.0/24')
+    assert response.status_code == 302
+    assert blocked_addresses() == set()
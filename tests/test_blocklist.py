@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import pytest
+
+from blocklist import BlockListCache, PrefixTrie, parse_network, utcnow
+
+
+def make_cache(tmp_path, rows):
+    return BlockListCache(lambda: list(rows), str(tmp_path / 'blocklist.version'), ttl=3600)
+
+
+def test_trie_returns_every_covering_prefix_shortest_first():
+    trie = PrefixTrie(32)
+    for network in ('10.0.0.0/8', '10.1.0.0/16', '10.1.2.3/32', '192.168.0.0/16'):
+        trie.insert(parse_network(network), network)
+    assert trie.matches(int(parse_network('10.1.2.3').network_address)) == ['10.0.0.0/8', '10.1.0.0/16', '10.1.2.3/32']
+    assert trie.matches(int(parse_network('10.2.0.1').network_address)) == ['10.0.0.0/8']
+    assert trie.matches(int(parse_network('172.16.0.1').network_address)) == []
+
+
+@pytest.mark.parametrize('client, expected', [
+    ('203.0.113.7', ('203.0.113.7', 'host')),
+    ('203.0.113.8', ('203.0.113.0/24', 'subnet')),
+    ('203.0.114.1', None),
+    ('2001:db8:1::5', ('2001:db8:1::/48', 'v6 subnet')),
+    ('2001:db8:2::5', None),
+    ('not-an-ip', ('not-an-ip', 'garbage')),
+    ('::ffff:203.0.113.7', None),
+])
+def test_most_specific_block_wins(tmp_path, client, expected):
+    cache = make_cache(tmp_path, [
+        ('203.0.113.0/24', 'subnet', None),
+        ('203.0.113.7', 'host', None),
+        ('2001:db8:1::/48', 'v6 subnet', None),
+        ('not-an-ip', 'garbage', None),
+    ])
+    assert cache.match(client) == expected
+
+
+def test_expired_block_falls_back_to_broader_one(tmp_path):
+    past = utcnow() - timedelta(minutes=1)
+    future = utcnow() + timedelta(hours=1)
+    cache = make_cache(tmp_path, [
+        ('203.0.113.0/24', 'subnet', future),
+        ('203.0.113.7', 'host', past),
+        ('198.51.100.7', 'expired', past),
+    ])
+    assert cache.lookup('203.0.113.7') == 'subnet'
+    assert cache.lookup('198.51.100.7') is None
+
+
+def test_invalidate_reloads_other_caches(tmp_path):
+    rows = []
+    cache = make_cache(tmp_path, rows)
+    other = BlockListCache(lambda: list(rows), cache.version_path, ttl=3600)
+    cache.invalidate()
+    assert other.lookup('203.0.113.7') is None
+    rows.append(('203.0.113.7', 'host', None))
+    assert other.lookup('203.0.113.7') is None  # still within its TTL and the version is unchanged
+    cache.invalidate()
+    assert other.lookup('203.0.113.7') == 'host'
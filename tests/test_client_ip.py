@@ -0,0 +1,38 @@
+import pytest
+
+from client_ip import ClientIPResolver
+
+
+@pytest.mark.parametrize('remote_addr, forwarded, expected', [
+    # Untrusted peers cannot choose their address
+    ('198.51.100.7', '1.2.3.4', '198.51.100.7'),
+    # The rightmost untrusted hop is the client
+    ('10.0.0.2', '203.0.113.7', '203.0.113.7'),
+    ('10.0.0.2', '1.2.3.4, 203.0.113.7, 10.0.0.1', '203.0.113.7'),
+    ('127.0.0.1', '2001:db8::1', '2001:db8::1'),
+    # Only proxies in the chain: the leftmost one we can vouch for
+    ('10.0.0.2', '192.168.1.5, 10.0.0.1', '192.168.1.5'),
+    # Garbage stops the walk at the last parsed address
+    ('10.0.0.2', 'evil, 10.0.0.1', '10.0.0.1'),
+    ('10.0.0.2', 'garbage', '10.0.0.2'),
+    ('10.0.0.2', None, '10.0.0.2'),
+])
+def test_x_forwarded_for(remote_addr, forwarded, expected):
+    headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+    assert ClientIPResolver().resolve(remote_addr, headers) == expected
+
+
+@pytest.mark.parametrize('remote_addr, value, expected', [
+    ('10.0.0.2', '203.0.113.7', '203.0.113.7'),
+    ('10.0.0.2', 'garbage', '10.0.0.2'),
+    ('198.51.100.7', '203.0.113.7', '198.51.100.7'),
+])
+def test_single_value_header(remote_addr, value, expected):
+    resolver = ClientIPResolver(header='CF-Connecting-IP')
+    assert resolver.resolve(remote_addr, {'CF-Connecting-IP': value}) == expected
+
+
+def test_custom_trusted_proxies():
+    resolver = ClientIPResolver(trusted_proxies='198.51.100.0/24')
+    assert resolver.resolve('198.51.100.7', {'X-Forwarded-For': '203.0.113.7'}) == '203.0.113.7'
+    assert resolver.resolve('10.0.0.2', {'X-Forwarded-For': '203.0.113.7'}) == '10.0.0.2'
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from MODELS import compiled_model, fast_vectorizer
+from MODELS.train_model import load_dataset
+
+# Inputs the slice never saw: empty, only unknown tokens, and known tokens mixed with unknown ones
+EXTRA_TEXTS = ['', 'zzqxv qqxyzzy', "' or 1=1 -- zzqxv", 'user@example.com', 'SELECT * FROM users']
+
+
+@pytest.fixture(scope='module')
+def fitted(tmp_path_factory):
+    sentences, labels = load_dataset()
+    # Every 20th row keeps both classes in a slice that fits in a couple of seconds
+    texts = sentences.fillna('').iloc[::20].tolist()
+    y = labels.iloc[::20].to_numpy()
+    vectorizer = TfidfVectorizer(max_features=2000)
+    X = vectorizer.fit_transform(texts)
+    forest = RandomForestClassifier(n_estimators=10, random_state=42).fit(X, y)
+    logreg = LogisticRegression(max_iter=1000, random_state=42).fit(X, y)
+
+    path = tmp_path_factory.mktemp('compiled') / compiled_model.COMPILED_MODEL_NAME
+    arrays = {**compiled_model.export_forest(forest), **compiled_model.export_logistic(logreg),
+              **fast_vectorizer.export_vectorizer(vectorizer)}
+    path.write_bytes(compiled_model.dumps(arrays))
+    compiled_forest, compiled_logreg = compiled_model.load(str(path))
+    return {
+        'texts': texts[:500] + EXTRA_TEXTS,
+        'vectorizer': vectorizer, 'forest': forest, 'logreg': logreg,
+        'fast': fast_vectorizer.load(str(path)),
+        'compiled_forest': compiled_forest, 'compiled_logreg': compiled_logreg,
+    }
+
+
+def test_fast_vectorizer_is_bit_identical(fitted):
+    X = fitted['vectorizer'].transform(fitted['texts'])
+    X_fast = fitted['fast'].transform(fitted['texts'])
+    assert np.array_equal(X.indptr, X_fast.indptr)
+    assert np.array_equal(X.indices, X_fast.indices)
+    assert np.array_equal(X.data, X_fast.data)
+
+
+@pytest.mark.parametrize('text', ['', 'zzqxv qqxyzzy'])
+def test_fast_vectorizer_empty_rows(fitted, text):
+    assert fitted['fast'].transform_row(text) == ([], [])
+
+
+@pytest.mark.parametrize('model', ['forest', 'logreg'])
+def test_compiled_matches_sklearn(fitted, model):
+    X = fitted['vectorizer'].transform(fitted['texts'])
+    expected = fitted[model].predict_proba(X)
+    compiled = fitted[f'compiled_{model}']
+    assert np.abs(compiled.predict_proba(X) - expected).max() <= 1e-9
+    rows = [compiled.predict_row(X.indices[X.indptr[i]:X.indptr[i + 1]], X.data[X.indptr[i]:X.indptr[i + 1]])
+            for i in range(X.shape[0])]
+    assert np.abs(np.array(rows) - expected[:, 1]).max() <= 1e-9
+
+
+def test_unmapped_arrays_match(fitted, tmp_path, monkeypatch):
+    path = tmp_path / compiled_model.COMPILED_MODEL_NAME
+    path.write_bytes(compiled_model.dumps(compiled_model.export_forest(fitted['forest'])))
+    mapped, _ = compiled_model.load(str(path))
+    monkeypatch.setattr(compiled_model, 'MODEL_MMAP', False)
+    copied, _ = compiled_model.load(str(path))
+    X = fitted['vectorizer'].transform(fitted['texts'])
+    assert np.array_equal(mapped.predict_proba(X), copied.predict_proba(X))
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from app import app, db, FlaggedInput
+from MODELS import random_forest_model
+from MODELS.online_learning import fetch_labelled
+
+
+@pytest.fixture(autouse=True)
+def scripted_model(app_module, monkeypatch):
+    # Anything with a quote scores as an injection; the real model is not needed to test storage
+    monkeypatch.setattr(random_forest_model.server, 'score_fields',
+                        lambda texts: [0.95 if "'" in text else 0.05 for text in texts])
+    monkeypatch.setattr(app_module, 'send_email', lambda *args, **kwargs: None)
+
+
+def stored():
+    with app.app_context():
+        return [(flagged.user_id, flagged.field, flagged.payload) for flagged in FlaggedInput.query.order_by(FlaggedInput.id)]
+
+
+def test_unknown_account_injection_is_stored_redacted(client):
+    response = app.test_client().post('/login', data={'email': "bob@mail.com' or 1=1--", 'password': 'hunter2'},
+                                      environ_base={'REMOTE_ADDR': '198.51.100.9'})
+    assert response.status_code == 200
+    assert stored() == [(None, 'email', "x@x.x' or 1=1--")]
+
+
+def test_password_injection_keeps_only_its_sql_skeleton(client):
+    app.test_client().post('/login', data={'email': 'owner@example.com', 'password': "' or 'abc'='abc --"},
+                           environ_base={'REMOTE_ADDR': '198.51.100.10'})
+    [(user_id, field, payload)] = stored()
+    assert user_id is not None and field == 'password'
+    assert payload == "' or 'x'='x --"
+
+
+def test_clean_login_stores_nothing(client):
+    app.test_client().post('/login', data={'email': 'nobody@example.com', 'password': 'hunter2'},
+                           environ_base={'REMOTE_ADDR': '198.51.100.11'})
+    assert stored() == []
+
+
+def test_admin_label_reaches_online_learning(client, admin_client):
+    app.test_client().post('/login', data={'email': "x' union select 1--", 'password': 'hunter2'},
+                           environ_base={'REMOTE_ADDR': '198.51.100.12'})
+    page = admin_client.get('/admin/flagged')
+    assert page.status_code == 200
+    assert b"x&#39; union select 1--" in page.data
+    with app.app_context():
+        flagged_id = FlaggedInput.query.one().id
+
+    assert client.post(f'/admin/flagged/{flagged_id}/label', data={'label': 'malicious'}).status_code == 403
+    assert client.get('/admin/flagged').status_code == 403
+    assert admin_client.post(f'/admin/flagged/{flagged_id}/label', data={'label': 'malicious'}).status_code == 302
+
+    with app.app_context():
+        [row] = fetch_labelled(db.session, FlaggedInput, None)
+        assert (row.payload, row.label) == ("x' union select 1--", 1)
+        assert fetch_labelled(db.session, FlaggedInput, datetime(2100, 1, 1)) == []
+    assert b'No flagged inputs waiting' in admin_client.get('/admin/flagged').data
@@ -0,0 +1,22 @@
+import os
+import stat
+
+from MODELS import model_registry
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_published_versions_are_world_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, 'REGISTRY_DIR', str(tmp_path / 'artifacts'))
+    monkeypatch.setattr(model_registry, 'CURRENT_FILE', str(tmp_path / 'artifacts' / 'CURRENT'))
+    version = model_registry.publish({'model.pkl': b'model'}, {})
+    model_registry.promote(version)
+
+    directory = model_registry.version_dir(version)
+    assert mode(directory) == 0o755
+    assert {name: mode(os.path.join(directory, name)) for name in os.listdir(directory)} == \
+        {'model.pkl': 0o644, model_registry.MANIFEST_NAME: 0o644}
+    assert mode(model_registry.CURRENT_FILE) == 0o644
+    assert model_registry.active_version() == version
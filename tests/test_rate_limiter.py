@@ -0,0 +1,52 @@
+import pytest
+
+from rate_limiter import LoginRateLimiter, SlidingWindowCounter, subnet_key
+
+
+def test_previous_window_is_weighted_by_overlap():
+    counter = SlidingWindowCounter(window=60)
+    for _ in range(10):
+        counter.hit('ip:a', now=600)
+    assert counter.count('ip:a', now=630) == 10
+    assert counter.count('ip:a', now=690) == 5  # half of the previous window still overlaps
+    assert counter.hit('ip:a', now=690) == 6
+    assert counter.count('ip:a', now=780) == 0
+
+
+def test_least_recently_hit_key_is_evicted():
+    counter = SlidingWindowCounter(window=60, max_keys=2)
+    counter.hit('a', now=0)
+    counter.hit('b', now=0)
+    counter.hit('a', now=1)
+    counter.hit('c', now=2)
+    assert len(counter) == 2 and counter.evictions == 1
+    assert counter.count('b', now=3) == 0
+    assert counter.count('a', now=3) == 2
+
+
+@pytest.mark.parametrize('ip_address, expected', [
+    ('203.0.113.7', '203.0.113.0/24'),
+    ('2001:db8:1:2:3::4', '2001:db8:1:2::/64'),
+    ('not-an-ip', None),
+])
+def test_subnet_key(ip_address, expected):
+    assert subnet_key(ip_address) == expected
+
+
+def test_narrowest_exceeded_scope_is_reported():
+    limiter = LoginRateLimiter(window=60, ip_limit=3, email_limit=2, subnet_limit=5)
+    velocities = [limiter.record('203.0.113.7', 'Bob@Example.com ', now=0) for _ in range(3)]
+    assert velocities[0]['pressure'] == 0.5
+    # The email limit goes first; emails are normalised before counting
+    assert [limiter.exceeded(v) for v in velocities] == [None, None, ('email', 'bob@example.com')]
+
+    for i in range(3):
+        velocity = limiter.record(f'203.0.113.{10 + i}', f'user{i}@example.com', now=1)
+    assert limiter.exceeded(velocity) == ('subnet', '203.0.113.0/24')
+    assert limiter.exceeded(limiter.record('198.51.100.1', 'other@example.com', now=1)) is None
+
+
+def test_ip_limit():
+    limiter = LoginRateLimiter(window=60, ip_limit=2, email_limit=100, subnet_limit=100)
+    results = [limiter.exceeded(limiter.record('203.0.113.7', f'user{i}@example.com', now=0)) for i in range(3)]
+    assert results == [None, None, ('ip', '203.0.113.7')]
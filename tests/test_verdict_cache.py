@@ -0,0 +1,45 @@
+from MODELS.verdict_cache import VerdictCache
+
+
+def test_misses_then_hits():
+    cache = VerdictCache()
+    found, keys = cache.get_many('v1', ['a', 'b'])
+    assert found == [None, None]
+    cache.put_many('v1', keys, [0.25, 0.0])
+    found, _ = cache.get_many('v1', ['b', 'a', 'c'])
+    assert found == [0.0, 0.25, None]  # a cached zero is a hit, not a miss
+    assert cache.stats['hits'] == 2 and cache.stats['misses'] == 3
+
+
+def test_new_model_empties_the_cache():
+    cache = VerdictCache()
+    _, keys = cache.get_many('v1', ['a'])
+    cache.put_many('v1', keys, [0.9])
+    found, _ = cache.get_many('v2', ['a'])
+    assert found == [None] and cache.stats['invalidations'] == 1
+
+
+def test_results_from_a_replaced_model_are_dropped():
+    cache = VerdictCache()
+    _, old_keys = cache.get_many('v1', ['a'])
+    cache.get_many('v2', ['b'])
+    cache.put_many('v1', old_keys, [0.9])
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerdictCache(max_entries=2)
+    _, keys = cache.get_many('v1', ['a', 'b'])
+    cache.put_many('v1', keys, [0.1, 0.2])
+    cache.get_many('v1', ['a'])
+    _, keys = cache.get_many('v1', ['c'])
+    cache.put_many('v1', keys, [0.3])
+    found, _ = cache.get_many('v1', ['a', 'b', 'c'])
+    assert found == [0.1, None, 0.3] and cache.stats['evictions'] == 1
+
+
+def test_keys_do_not_contain_the_input():
+    cache = VerdictCache()
+    key = cache.key('v1', 'hunter2')
+    assert b'hunter2' not in key and len(key) == 16
+    assert key != VerdictCache().key('v1', 'hunter2')  # per-process secret
@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+
+# Named timing spans around the stages of a request (block list lookup,
+# password hashing, model scoring, ...). Spans cost one perf_counter pair when
+# nobody listens; listeners such as the benchmark suite receive
+# (name, seconds) for every finished span in the thread that ran it.
+_listeners = []
+
+
+def add_listener(listener):
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    _listeners.remove(listener)
+
+
+def record(name, seconds):
+    for listener in _listeners:
+        listener(name, seconds)
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)